@@ -0,0 +1,114 @@
+# Measures the cost of matching paths against .cafignore patterns, and how much of a snapshot
+# pruning ignored directories saves.
+# Run with: PYTHONPATH=libcaf python benchmarks/ignore.py [--paths N] [--rounds N]
+import argparse
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf.constants import DEFAULT_REPO_DIR, IGNORE_FILE
+from libcaf.ignore import IgnoreMatcher, translate_pattern
+from libcaf.repository import Repository
+
+PATTERNS = [
+    'node_modules/',
+    'build/',
+    'dist/',
+    '.venv/',
+    '__pycache__/',
+    '*.pyc',
+    '*.o',
+    '*.so',
+    '*.log',
+    '*.tmp',
+    '.cache/',
+    'coverage/',
+    '/target',
+    'docs/_build/',
+    '**/generated/**',
+    '!important.log',
+]
+
+
+def measure(label: str, func, rounds: int, count: int, unit: str) -> None:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    elapsed = (time.perf_counter() - start) / rounds
+
+    print(f'{label:<24} {elapsed * 1000:>10.2f} ms {elapsed / count * 1e9:>10.0f} ns per {unit}')
+
+
+def synthetic_paths(count: int) -> list[tuple[str, bool]]:
+    names = ['src', 'lib', 'node_modules', 'build', 'tests', 'docs', 'generated', 'pkg']
+    suffixes = ['.py', '.pyc', '.js', '.log', '.o', '.txt']
+    paths = []
+    for index in range(count):
+        depth = index % 5 + 1
+        directory = '/'.join(names[(index // 7 + level) % len(names)] for level in range(depth))
+        paths.append((f'{directory}/file{index}{suffixes[index % len(suffixes)]}', False))
+        paths.append((directory, True))
+
+    return paths
+
+
+def per_pattern_matcher(patterns: list[str]):
+    # One regex per pattern, tried from the last one, the way a naive matcher would
+    compiled = [(re.compile(regex if anchored else f'(?:.*/)?{regex}', re.DOTALL), negated, directory_only)
+                for regex, negated, directory_only, anchored in filter(None, map(translate_pattern, patterns))][::-1]
+
+    def matches(path: str, is_dir: bool) -> bool:
+        for regex, negated, directory_only in compiled:
+            if (is_dir or not directory_only) and regex.fullmatch(path):
+                return not negated
+        return False
+
+    return matches
+
+
+def build_tree(root: Path, packages: int, files: int) -> None:
+    for package in range(packages):
+        for directory in ('src', 'node_modules/dep/lib'):
+            path = root / f'pkg{package}' / directory
+            path.mkdir(parents=True)
+            for index in range(files):
+                (path / f'file{index}.js').write_text(f'{package} {directory} {index}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--paths', type=int, default=100000)
+    parser.add_argument('--packages', type=int, default=20)
+    parser.add_argument('--files', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    paths = synthetic_paths(args.paths)
+    print(f'{len(PATTERNS)} patterns, {len(paths)} paths, {args.rounds} rounds, per round:')
+    measure('compile', lambda: IgnoreMatcher(PATTERNS), args.rounds, len(PATTERNS), 'pattern')
+
+    matcher = IgnoreMatcher(PATTERNS)
+    naive = per_pattern_matcher(PATTERNS)
+    assert all(matcher.matches(path, is_dir) == naive(path, is_dir) for path, is_dir in paths)
+    measure('combined regex', lambda: [matcher.matches(path, is_dir) for path, is_dir in paths],
+            args.rounds, len(paths), 'path')
+    measure('regex per pattern', lambda: [naive(path, is_dir) for path, is_dir in paths], args.rounds, len(paths),
+            'path')
+
+    print(f'\nsnapshot of {args.packages} packages with {args.files} source and {args.files} node_modules files each:')
+    for label, ignore in (('without .cafignore', None), ('with .cafignore', 'node_modules/\n')):
+        with tempfile.TemporaryDirectory() as directory:
+            repo = Repository(Path(directory), DEFAULT_REPO_DIR)
+            repo.init()
+            build_tree(repo.working_dir, args.packages, args.files)
+            if ignore is not None:
+                (repo.working_dir / IGNORE_FILE).write_text(ignore)
+
+            start = time.perf_counter()
+            repo.save_directory_tree(repo.working_dir)
+            print(f'{label:<24} {(time.perf_counter() - start) * 1000:>10.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
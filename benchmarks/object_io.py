@@ -0,0 +1,64 @@
+# Measures the read and write system calls, and the time, spent saving and loading a large tree and a commit.
+# Run with: PYTHONPATH=libcaf python benchmarks/object_io.py [--records N] [--rounds N]
+import argparse
+import hashlib
+import tempfile
+import time
+from pathlib import Path
+
+from libcaf import Commit, Tree, TreeRecord, TreeRecordType, hash_object, load_commit, load_tree, save_commit, \
+    save_tree
+
+
+def io_counters() -> tuple[int, int]:
+    counters = dict(line.split(': ') for line in Path('/proc/self/io').read_text().splitlines())
+    return int(counters['syscr']), int(counters['syscw'])
+
+
+def measure(label: str, func, rounds: int) -> None:
+    reads, writes = io_counters()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    elapsed = time.perf_counter() - start
+    end_reads, end_writes = io_counters()
+
+    print(f'{label:<12} {(end_reads - reads) / rounds:>10.0f} reads {(end_writes - writes) / rounds:>10.0f} writes '
+          f'{elapsed / rounds * 1000:>10.2f} ms')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    records = {}
+    for index in range(args.records):
+        name = f'file{index:06}.txt'
+        records[name] = TreeRecord(TreeRecordType.BLOB, hashlib.sha1(name.encode()).hexdigest(), name)
+    tree = Tree(records)
+    tree_hash = hash_object(tree)
+    commit = Commit(tree_hash, 'Benchmark', 'Benchmark commit', 1234567890, None)
+    commit_hash = hash_object(commit)
+
+    print(f'tree with {args.records} records, {args.rounds} rounds, per round:')
+    with tempfile.TemporaryDirectory() as directory:
+        def fresh_store(save, value):
+            def run():
+                root = Path(tempfile.mkdtemp(dir=directory))
+                save(root, value)
+            return run
+
+        measure('save_tree', fresh_store(save_tree, tree), args.rounds)
+        measure('save_commit', fresh_store(save_commit, commit), args.rounds)
+
+        root = Path(directory) / 'store'
+        save_tree(root, tree)
+        save_commit(root, commit)
+        measure('load_tree', lambda: load_tree(root, tree_hash), args.rounds)
+        measure('load_commit', lambda: load_commit(root, commit_hash), args.rounds)
+
+
+if __name__ == '__main__':
+    main()
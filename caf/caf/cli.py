@@ -32,6 +32,20 @@ def cli():
                     'type': str,
                     'help': 'name of the default branch (default: "main")',
                     'default': 'main'
+                },
+                'compress': {
+                    'type': None,
+                    'help': 'store objects zlib-compressed',
+                    'default': False,
+                    'flag': True,
+                    'short_flag': 'z'
+                },
+                'chunking': {
+                    'type': None,
+                    'help': 'split large files into content-defined chunks',
+                    'default': False,
+                    'flag': True,
+                    'short_flag': 'k'
                 }
             },
             'help': 'initialize a new CAF repository'
@@ -56,11 +70,72 @@ def cli():
                 'message': {
                     'type': str,
                     'help': 'Commit message'
+                },
+                'jobs': {
+                    'type': int,
+                    'help': 'number of files hashed and stored in parallel, 0 for one per core',
+                    'default': 1
                 }
             },
             'help': 'Create a new commit'
         },
 
+        'checkout': {
+            'func': cli_commands.checkout,
+            'args': {
+                **_repo_args,
+                'commit': {
+                    'type': str,
+                    'help': 'Hash of the commit to check out'
+                },
+                'jobs': {
+                    'type': int,
+                    'help': 'number of files written in parallel, 0 for one per core',
+                    'default': 0
+                },
+                'force': {
+                    'type': None,
+                    'help': 'overwrite local changes and untracked files in the way',
+                    'default': False,
+                    'flag': True,
+                    'short_flag': 'f'
+                }
+            },
+            'help': 'Update the working directory to match a commit'
+        },
+
+        'sparse': {
+            'func': cli_commands.sparse,
+            'args': {
+                **_repo_args,
+                'patterns': {
+                    'type': str,
+                    'help': 'Directories to keep in the working directory, none to show the current ones',
+                    'nargs': '*'
+                },
+                'jobs': {
+                    'type': int,
+                    'help': 'number of files written in parallel, 0 for one per core',
+                    'default': 0
+                },
+                'disable': {
+                    'type': None,
+                    'help': 'check out every directory again',
+                    'default': False,
+                    'flag': True,
+                    'short_flag': 'd'
+                },
+                'force': {
+                    'type': None,
+                    'help': 'overwrite local changes and untracked files in the way',
+                    'default': False,
+                    'flag': True,
+                    'short_flag': 'f'
+                }
+            },
+            'help': 'Limit the working directory to a set of directories'
+        },
+
         'hash_file': {
             'func': cli_commands.hash_file,
             'args': {
@@ -124,6 +199,38 @@ def cli():
             'help': 'List all branches'
         },
 
+        'repack': {
+            'func': cli_commands.repack,
+            'args': {
+                **_repo_args
+            },
+            'help': 'Move loose objects into a pack file'
+        },
+
+        'fsck': {
+            'func': cli_commands.fsck,
+            'args': {
+                **_repo_args
+            },
+            'help': 'Verify every stored object against its hash'
+        },
+
+        'status': {
+            'func': cli_commands.status,
+            'args': {
+                **_repo_args
+            },
+            'help': 'Show files changed in the working directory since HEAD'
+        },
+
+        'fsmonitor': {
+            'func': cli_commands.fsmonitor,
+            'args': {
+                **_repo_args
+            },
+            'help': 'Watch the working directory so commits only walk what changed'
+        },
+
         'log': {
             'func': cli_commands.log,
             'args': {
@@ -165,7 +272,7 @@ def cli():
                 command_sub.add_argument(f'--{arg_name}', type=arg_type, help=f'{arg_help} (default: %(default)s)',
                                          default=arg_default)
             else:
-                command_sub.add_argument(arg_name, type=arg_type, help=arg_help)
+                command_sub.add_argument(arg_name, type=arg_type, help=arg_help, nargs=arg_info.get('nargs'))
 
     command_args = parser.parse_args()
     if command_args.command is None:
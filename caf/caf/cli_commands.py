@@ -3,8 +3,8 @@ from datetime import datetime
 from pathlib import Path
 
 from libcaf.constants import DEFAULT_BRANCH
-from libcaf.repository import (AddedDiff, ModifiedDiff, MovedFromDiff, MovedToDiff, RemovedDiff,
-                               Repository, RepositoryError)
+from libcaf.repository import (AddedDiff, AddedFile, ModifiedDiff, ModifiedFile, MovedFromDiff, MovedToDiff,
+                               RemovedDiff, RemovedFile, Repository, RepositoryError)
 
 from libcaf import hash_file
 
@@ -27,9 +27,11 @@ def _repo_from_cli_kwargs(kwargs) -> Repository:
 def init(**kwargs) -> int:
     repo = _repo_from_cli_kwargs(kwargs)
     default_branch = kwargs.get('default_branch', DEFAULT_BRANCH)
+    compress = kwargs.get('compress', False)
+    chunking = kwargs.get('chunking', False)
 
     try:
-        repo.init(default_branch)
+        repo.init(default_branch, compress, chunking)
         print(f"Initialized empty CAF repository in {repo.repo_path()} on branch {default_branch}")
         return 0
     except FileExistsError:
@@ -120,8 +122,9 @@ def commit(**kwargs):
 
         author = kwargs.get('author')
         message = kwargs.get('message')
+        jobs = kwargs.get('jobs', 1)
 
-        commit_hash = repo.create_commit(author, message)
+        commit_hash = repo.create_commit(author, message, jobs)
 
         print (f"Commit created successfully:\n"
               f"Hash: {commit_hash}\n"
@@ -140,6 +143,141 @@ def commit(**kwargs):
 
     return 0
 
+def checkout(**kwargs) -> int:
+    try:
+        repo = _repo_from_cli_kwargs(kwargs)
+        if not repo.exists():
+            raise RepositoryError(f"No repository found at {repo.repo_path()}")
+
+        commit_hash = kwargs.get('commit')
+        repo.checkout(commit_hash, kwargs.get('jobs', 0), kwargs.get('force', False))
+
+        print(f"HEAD is now at {commit_hash}")
+
+    except Exception as e:
+        print_error(f"Error executing checkout command: {e}")
+        return -1
+
+    return 0
+
+def sparse(**kwargs) -> int:
+    try:
+        repo = _repo_from_cli_kwargs(kwargs)
+        if not repo.exists():
+            raise RepositoryError(f"No repository found at {repo.repo_path()}")
+
+        patterns = kwargs.get('patterns') or []
+        jobs = kwargs.get('jobs', 0)
+        force = kwargs.get('force', False)
+
+        if kwargs.get('disable', False):
+            repo.set_sparse_patterns([], jobs, force)
+            print("Sparse checkout disabled.")
+        elif patterns:
+            repo.set_sparse_patterns(patterns, jobs, force)
+            print(f"Sparse checkout set to: {', '.join(repo.sparse_patterns())}")
+        elif current := repo.sparse_patterns():
+            for pattern in current:
+                print(pattern)
+        else:
+            print("Sparse checkout is not enabled.")
+
+    except Exception as e:
+        print_error(f"Error executing sparse command: {e}")
+        return -1
+
+    return 0
+
+def repack(**kwargs) -> int:
+    try:
+        repo = _repo_from_cli_kwargs(kwargs)
+        if not repo.exists():
+            raise RepositoryError(f"No repository found at {repo.repo_path()}")
+
+        packed = repo.repack()
+
+        if packed:
+            print(f"Packed {packed} objects.")
+        else:
+            print("Nothing to repack.")
+
+    except Exception as e:
+        print_error(f"Error executing repack command: {e}")
+        return -1
+
+    return 0
+
+def fsck(**kwargs) -> int:
+    try:
+        repo = _repo_from_cli_kwargs(kwargs)
+        if not repo.exists():
+            raise RepositoryError(f"No repository found at {repo.repo_path()}")
+
+        report = repo.fsck()
+
+    except Exception as e:
+        print_error(f"Error executing fsck command: {e}")
+        return -1
+
+    for object_hash in report.legacy:
+        print(f"Legacy format object: {object_hash}")
+
+    if report.corrupt:
+        for object_hash in report.corrupt:
+            print_error(f"Corrupt object: {object_hash}")
+        return -1
+
+    print("All objects verified.")
+    return 0
+
+def status(**kwargs) -> int:
+    try:
+        repo = _repo_from_cli_kwargs(kwargs)
+        if not repo.exists():
+            raise RepositoryError(f"No repository found at {repo.repo_path()}")
+
+        found = False
+        for change in repo.status():
+            found = True
+            match change:
+                case AddedFile(path):
+                    print(f"Added: {path}", flush=True)
+                case ModifiedFile(path):
+                    print(f"Modified: {path}", flush=True)
+                case RemovedFile(path):
+                    print(f"Removed: {path}", flush=True)
+
+        if not found:
+            print("No changes detected in the working tree.")
+
+    except Exception as e:
+        print_error(f"Error executing status command: {e}")
+        return -1
+
+    return 0
+
+def fsmonitor(**kwargs) -> int:
+    try:
+        repo = _repo_from_cli_kwargs(kwargs)
+        if not repo.exists():
+            raise RepositoryError(f"No repository found at {repo.repo_path()}")
+
+        monitor = repo.fsmonitor()
+
+    except Exception as e:
+        print_error(f"Error executing fsmonitor command: {e}")
+        return -1
+
+    print(f"Watching {repo.working_dir} for changes, press Ctrl+C to stop.", flush=True)
+    try:
+        monitor.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        monitor.close()
+
+    return 0
+
 def log(**kwargs) -> int:
     try:
         repo = _repo_from_cli_kwargs(kwargs)
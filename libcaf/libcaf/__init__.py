@@ -1,7 +1,9 @@
 import ctypes
+import io
+import mmap
 import os
 from pathlib import Path
-from typing import IO, Tuple, overload
+from typing import IO, Iterable, Tuple, overload
 
 import _libcaf
 from _libcaf import (
@@ -10,7 +12,14 @@ from _libcaf import (
     Blob,
     TreeRecord,
     Tree,
-    TreeRecordType
+    TreeRecordType,
+    ObjectId,
+    StoreConfig,
+    StoreStats,
+    get_lock_timeout_ms,
+    set_lock_timeout_ms,
+    get_store_stats,
+    reset_store_stats
 )
 
 
@@ -20,6 +29,9 @@ def hash_file(filename: str | Path) -> str:
 
     return _libcaf.hash_file(filename)
 
+def hash_files(paths: Iterable[str | Path], workers: int = 0) -> list[str | ValueError]:
+    return _libcaf.hash_files([str(path) for path in paths], workers)
+
 def open_content_for_reading(root_dir, hash_value:str) -> IO:
     if isinstance(root_dir, Path):
         root_dir = str(root_dir)
@@ -28,13 +40,41 @@ def open_content_for_reading(root_dir, hash_value:str) -> IO:
 
     return os.fdopen(fd, 'r')
 
+def map_content(root_dir: str | Path, hash_value: str) -> memoryview:
+    if isinstance(root_dir, Path):
+        root_dir = str(root_dir)
+
+    fd = _libcaf.open_content_for_reading(root_dir, hash_value)
+
+    # The mapping outlives the descriptor and is released with the last view of it
+    try:
+        if os.fstat(fd).st_size == 0:
+            return memoryview(b'')
+        return memoryview(mmap.mmap(fd, 0, access=mmap.ACCESS_READ))
+    finally:
+        os.close(fd)
+
+class _PendingContentIO(io.FileIO):
+    # Raw file over a temporary object; closing it publishes the object under its hash
+    def __init__(self, fd: int):
+        super().__init__(fd, 'w', closefd=False)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        try:
+            _libcaf.close_content_for_saving(self.fileno())
+        finally:
+            super().close()
+
 def open_content_for_saving(root_dir, hash_value: str) -> IO:
     if isinstance(root_dir, Path):
         root_dir = str(root_dir)
 
     fd = _libcaf.open_content_for_saving(root_dir, hash_value)
 
-    return os.fdopen(fd, 'w')
+    return io.TextIOWrapper(io.BufferedWriter(_PendingContentIO(fd)))
 
 def delete_content(root_dir: str | Path, hash_value: str) -> None:
     if isinstance(root_dir, Path):
@@ -42,6 +82,24 @@ def delete_content(root_dir: str | Path, hash_value: str) -> None:
 
     _libcaf.delete_content(root_dir, hash_value)
 
+def load_store_config(root_dir: str | Path) -> StoreConfig:
+    if isinstance(root_dir, Path):
+        root_dir = str(root_dir)
+
+    return _libcaf.load_store_config(root_dir)
+
+def save_store_config(root_dir: str | Path, config: StoreConfig) -> None:
+    if isinstance(root_dir, Path):
+        root_dir = str(root_dir)
+
+    _libcaf.save_store_config(root_dir, config)
+
+def content_exists(root_dir: str | Path, hash_value: str) -> bool:
+    if isinstance(root_dir, Path):
+        root_dir = str(root_dir)
+
+    return _libcaf.content_exists(root_dir, hash_value)
+
 def save_file_content(root_dir: str | Path, file_path: str | Path) -> Blob:
     if isinstance(root_dir, Path):
         root_dir = str(root_dir)
@@ -51,11 +109,48 @@ def save_file_content(root_dir: str | Path, file_path: str | Path) -> Blob:
 
     return _libcaf.save_file_content(root_dir, file_path)
 
-def save_commit(root_dir: str | Path, commit) -> None:
+def save_files_content(root_dir: str | Path, paths: Iterable[str | Path], workers: int = 0) -> list[Blob | ValueError]:
+    if isinstance(root_dir, Path):
+        root_dir = str(root_dir)
+
+    return _libcaf.save_files_content(root_dir, [str(path) for path in paths], workers)
+
+def checkout_files(root_dir: str | Path, hashes: Iterable[str], paths: Iterable[str | Path],
+                   workers: int = 0) -> list[bool | ValueError]:
+    if isinstance(root_dir, Path):
+        root_dir = str(root_dir)
+
+    return _libcaf.checkout_files(root_dir, list(hashes), [str(path) for path in paths], workers)
+
+def verify_content(root_dir: str | Path, hash_value: str) -> bool:
+    if isinstance(root_dir, Path):
+        root_dir = str(root_dir)
+
+    return _libcaf.verify_content(root_dir, hash_value)
+
+def is_legacy_object(root_dir: str | Path, hash_value: str) -> bool:
+    if isinstance(root_dir, Path):
+        root_dir = str(root_dir)
+
+    return _libcaf.is_legacy_object(root_dir, hash_value)
+
+def list_objects(root_dir: str | Path) -> list[str]:
+    if isinstance(root_dir, Path):
+        root_dir = str(root_dir)
+
+    return _libcaf.list_objects(root_dir)
+
+def repack(root_dir: str | Path, delta_bases: dict[str, str] | None = None) -> int:
+    if isinstance(root_dir, Path):
+        root_dir = str(root_dir)
+
+    return _libcaf.repack(root_dir, delta_bases or {})
+
+def save_commit(root_dir: str | Path, commit) -> str:
     if isinstance(root_dir, Path):
         root_dir = str(root_dir)
 
-    _libcaf.save_commit(root_dir, commit)
+    return _libcaf.save_commit(root_dir, commit)
 
 def load_commit(root_dir: str | Path, hash_value) -> Commit:
     if isinstance(root_dir, Path):
@@ -65,11 +160,11 @@ def load_commit(root_dir: str | Path, hash_value) -> Commit:
 
     return commit
 
-def save_tree(root_dir: str | Path, tree: Tree) -> None:
+def save_tree(root_dir: str | Path, tree: Tree) -> str:
     if isinstance(root_dir, Path):
         root_dir = str(root_dir)
 
-    _libcaf.save_tree(root_dir, tree)
+    return _libcaf.save_tree(root_dir, tree)
 
 def load_tree(root_dir: str | Path, hash_value) -> Tree:
     if isinstance(root_dir, Path):
@@ -82,17 +177,35 @@ def load_tree(root_dir: str | Path, hash_value) -> Tree:
 
 __all__ = [
     'hash_file',
+    'hash_files',
     'save_file_content',
+    'save_files_content',
+    'checkout_files',
     'save_commit',
     'load_commit',
     'save_tree',
     'load_tree',
     'open_content_for_reading',
+    'map_content',
     'delete_content',
+    'content_exists',
+    'verify_content',
+    'is_legacy_object',
+    'list_objects',
+    'repack',
+    'load_store_config',
+    'save_store_config',
     'Commit',
     'hash_object',
     'Blob',
     'TreeRecord',
     'Tree',
-    'TreeRecordType'
+    'TreeRecordType',
+    'ObjectId',
+    'StoreConfig',
+    'StoreStats',
+    'get_lock_timeout_ms',
+    'set_lock_timeout_ms',
+    'get_store_stats',
+    'reset_store_stats'
 ]
@@ -0,0 +1,73 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Sequence
+
+import libcaf
+from libcaf import Blob, Commit, Tree
+from libcaf.constants import DEFAULT_BRANCH
+from libcaf.repository import Diff, FileStatus, Repository
+
+DEFAULT_MAX_WORKERS = 4
+
+
+# Runs Repository and object store operations on a bounded thread pool. The blocking
+# bindings release the GIL, so the event loop keeps serving other coroutines meanwhile.
+# At most max_concurrency operations are in flight; the rest wait without taking a worker
+class AsyncRepository:
+    def __init__(self, repo: Repository, max_workers: int = DEFAULT_MAX_WORKERS, max_concurrency: int | None = None):
+        self.repo = repo
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='caf-aio')
+        self._limit = asyncio.Semaphore(max_concurrency or max_workers)
+
+    async def __aenter__(self) -> 'AsyncRepository':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def _run(self, func, *args, **kwargs):
+        async with self._limit:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def init(self, default_branch: str = DEFAULT_BRANCH, compress: bool = False, chunking: bool = False) -> None:
+        await self._run(self.repo.init, default_branch, compress, chunking)
+
+    async def save_file_content(self, file: Path) -> Blob:
+        return await self._run(self.repo.save_file_content, file)
+
+    async def save_directory_tree(self, path: Path, workers: int = 1) -> str:
+        return await self._run(self.repo.save_directory_tree, path, workers)
+
+    async def create_commit(self, author: str, message: str, workers: int = 1) -> str:
+        return await self._run(self.repo.create_commit, author, message, workers)
+
+    async def checkout(self, commit_hash: str, workers: int = 0, force: bool = False) -> None:
+        await self._run(self.repo.checkout, commit_hash, workers, force)
+
+    async def status(self) -> list[FileStatus]:
+        # The whole walk runs on a worker, so only the finished result reaches the event loop
+        return await self._run(lambda: list(self.repo.status()))
+
+    async def load_commit(self, commit_hash: str) -> Commit:
+        return await self._run(libcaf.load_commit, self.repo.objects_dir(), commit_hash)
+
+    async def load_tree(self, tree_hash: str) -> Tree:
+        return await self._run(libcaf.load_tree, self.repo.objects_dir(), tree_hash)
+
+    async def get_commit_history(self, start_commit: str = None) -> AsyncIterator[tuple[str, Commit]]:
+        # Commits are loaded one at a time, so callers can stop early on long histories
+        history = self.repo.get_commit_history(start_commit)
+        while (entry := await self._run(next, history, None)) is not None:
+            yield entry
+
+    async def diff_commits(self, commit_hash1: str, commit_hash2: str) -> Sequence[Diff]:
+        return await self._run(self.repo.diff_commits, commit_hash1, commit_hash2)
+
+    async def repack(self) -> int:
+        return await self._run(self.repo.repack)
@@ -6,3 +6,7 @@ HEAD_FILE = Path('HEAD')
 DEFAULT_BRANCH = Path('main')
 REFS_DIR = Path('refs')
 HEADS_DIR = Path('heads')
+INDEX_FILE = Path('index')
+FSMONITOR_SOCKET = Path('fsmonitor.sock')
+IGNORE_FILE = Path('.cafignore')
+SPARSE_FILE = Path('sparse')
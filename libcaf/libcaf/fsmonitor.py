@@ -0,0 +1,225 @@
+import ctypes
+import json
+import os
+import select
+import socket
+import struct
+import threading
+import uuid
+from pathlib import Path
+
+from libcaf.constants import IGNORE_FILE
+from libcaf.ignore import IgnoreMatcher
+from libcaf.walk import relative_join
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_ONLYDIR | IN_DONT_FOLLOW)
+
+POLL_INTERVAL = 0.2
+QUERY_TIMEOUT = 5
+
+_EVENT = struct.Struct('iIII')
+
+
+class FSMonitorError(Exception):
+    pass
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch, libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        raise FSMonitorError('inotify is not available on this platform')
+
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+# Watches the working tree with inotify and answers queries on a Unix socket. Every change
+# marks the directory that holds the changed entry with a new sequence number, and a query
+# carrying the token of an earlier answer gets back the directories changed since then.
+# Tokens from another monitor instance, or from before a kernel queue overflow, get None,
+# meaning the whole tree has to be walked. Ignored paths are neither watched nor reported
+class FileSystemMonitor:
+    def __init__(self, working_dir: Path, repo_dir: Path, socket_path: Path):
+        self._libc = _load_libc()
+        self.working_dir = working_dir
+        self.socket_path = socket_path
+        self._skip_name = repo_dir.name
+        self._ignore = IgnoreMatcher.from_file(working_dir / IGNORE_FILE)
+        self._instance = uuid.uuid4().hex
+        self._sequence = 0
+        self._reset_sequence = 0
+        self._changes: dict[str, int] = {}
+        self._watches: dict[int, str] = {}
+        self._paths: dict[str, int] = {}
+
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise FSMonitorError(f'inotify_init1 failed: {os.strerror(errno)}')
+
+        try:
+            self._watch_tree('')
+            if socket_path.exists():
+                socket_path.unlink()
+            self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._server.bind(str(socket_path))
+            self._server.listen()
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def serve(self, stop: threading.Event | None = None) -> None:
+        while stop is None or not stop.is_set():
+            readable, _, _ = select.select([self._fd, self._server], [], [], POLL_INTERVAL)
+            if self._fd in readable:
+                self._read_events()
+            if self._server in readable:
+                connection, _ = self._server.accept()
+                with connection:
+                    self._answer(connection)
+
+    def close(self) -> None:
+        self._server.close()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        os.close(self._fd)
+
+    def _mark(self, directory: str) -> None:
+        self._sequence += 1
+        self._changes[directory] = self._sequence
+
+    def _watch_tree(self, directory: str) -> None:
+        # Directories that appear are new to the last snapshot as well, so all of them are marked
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            if current and self._ignore.matches(current, True):
+                continue
+            path = self.working_dir / current if current else self.working_dir
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                continue  # Removed before it could be watched, its parent is already marked
+
+            self._watches[wd] = current
+            self._paths[current] = wd
+            self._mark(current)
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.name != self._skip_name and entry.is_dir(follow_symlinks=False):
+                            stack.append(relative_join(current, entry.name))
+            except OSError:
+                pass
+
+    def _unwatch_tree(self, directory: str) -> None:
+        for path in [p for p in self._paths if p == directory or p.startswith(directory + '/')]:
+            wd = self._paths.pop(path)
+            self._watches.pop(wd, None)
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _read_events(self) -> None:
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                return
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0'))
+                offset += _EVENT.size + length
+                self._handle_event(wd, mask, name)
+
+    def _handle_event(self, wd: int, mask: int, name: str) -> None:
+        if mask & IN_Q_OVERFLOW:
+            self._sequence += 1
+            self._reset_sequence = self._sequence
+            return
+
+        directory = self._watches.get(wd)
+        if directory is None:
+            return
+        if mask & IN_IGNORED:
+            del self._watches[wd]
+            if self._paths.get(directory) == wd:
+                del self._paths[directory]
+            return
+        if name == self._skip_name:
+            return
+
+        path = relative_join(directory, name)
+        if path == IGNORE_FILE.name:
+            # Snapshots walk everything after a rule change, the new rules may uncover directories
+            self._ignore = IgnoreMatcher.from_file(self.working_dir / IGNORE_FILE)
+            self._watch_tree('')
+        elif self._ignore.matches(path, bool(mask & IN_ISDIR)):
+            return
+
+        self._mark(directory)
+        if mask & IN_ISDIR:
+            if mask & (IN_MOVED_FROM | IN_DELETE):
+                self._unwatch_tree(path)
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._watch_tree(path)
+
+    def _answer(self, connection: socket.socket) -> None:
+        connection.settimeout(QUERY_TIMEOUT)
+        try:
+            request = json.loads(_receive_all(connection) or b'{}')
+        except (OSError, ValueError):
+            return
+
+        # Changes that completed before the query are already queued in the kernel
+        self._read_events()
+
+        changed = None
+        instance, _, sequence = str(request.get('token', '')).partition(':')
+        if instance == self._instance and sequence.isdigit() and int(sequence) >= self._reset_sequence:
+            changed = [d for d, s in self._changes.items() if s > int(sequence)]
+
+        response = {'token': f'{self._instance}:{self._sequence}', 'changed': changed}
+        try:
+            connection.sendall(json.dumps(response).encode())
+        except OSError:
+            pass
+
+
+def _receive_all(connection: socket.socket) -> bytes:
+    chunks = []
+    while chunk := connection.recv(65536):
+        chunks.append(chunk)
+
+    return b''.join(chunks)
+
+
+# Asks a running monitor for the directories changed since token. Returns the new token with
+# the changed directories, or None for them when the whole tree has to be walked. Returns
+# None when no monitor is listening
+def query_fsmonitor(socket_path: Path, token: str) -> tuple[str, list[str] | None] | None:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(QUERY_TIMEOUT)
+            connection.connect(str(socket_path))
+            connection.sendall(json.dumps({'token': token}).encode())
+            connection.shutdown(socket.SHUT_WR)
+            response = json.loads(_receive_all(connection))
+            return response['token'], response['changed']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
@@ -0,0 +1,109 @@
+import hashlib
+import re
+from pathlib import Path
+from typing import Iterable
+
+
+def _translate_segment(segment: str) -> str:
+    regex = []
+    i = 0
+    while i < len(segment):
+        char = segment[i]
+        if char == '*':
+            regex.append('[^/]*')
+        elif char == '?':
+            regex.append('[^/]')
+        elif char == '\\' and i + 1 < len(segment):
+            i += 1
+            regex.append(re.escape(segment[i]))
+        elif char == '[' and (end := segment.find(']', i + 2)) != -1:
+            body = segment[i + 1:end]
+            # Like wildcards, negated classes never match a slash
+            if body[0] in '!^':
+                body = '^/' + body[1:]
+            regex.append('[' + body.replace('[', '\\[') + ']')
+            i = end
+        else:
+            regex.append(re.escape(char))
+        i += 1
+
+    return ''.join(regex)
+
+
+# Turns one gitignore-style pattern into a regex. Patterns with a slash before the end are
+# anchored and match the '/'-separated path relative to the working directory, the rest match
+# the name of an entry at any depth. Returns the regex, whether it is negated, whether it only
+# matches directories and whether it is anchored, or None for blank lines and comments
+def translate_pattern(line: str) -> tuple[str, bool, bool, bool] | None:
+    pattern = line.rstrip('\n')
+    if not pattern.endswith('\\ '):
+        pattern = pattern.rstrip()
+    if not pattern or pattern.startswith('#'):
+        return None
+
+    negated = pattern.startswith('!')
+    if negated or pattern.startswith('\\!') or pattern.startswith('\\#'):
+        pattern = pattern[1:]
+
+    directory_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+    if not pattern:
+        return None
+
+    anchored = '/' in pattern
+    segments = pattern.lstrip('/').split('/')
+
+    regex = []
+    for i, segment in enumerate(segments):
+        last = i == len(segments) - 1
+        if segment == '**':
+            regex.append('.*' if last else '(?:.*/)?')
+        else:
+            regex.append(_translate_segment(segment) + ('' if last else '/'))
+
+    return ''.join(regex), negated, directory_only, anchored
+
+
+# Matches paths against a list of gitignore-style patterns, where the last matching pattern
+# decides. For each entry kind, name patterns and anchored patterns are compiled into one regex
+# each, with later patterns as earlier alternatives, so at most two match calls find the
+# deciding pattern
+class IgnoreMatcher:
+    def __init__(self, patterns: Iterable[str] = (), source_hash: str = ''):
+        # source_hash identifies the ignore file the patterns came from, '' when there is none
+        self.source_hash = source_hash
+        translated = [t for t in map(translate_pattern, patterns) if t is not None]
+        self._negated = [negated for _, negated, _, _ in translated]
+
+        def compile_kind(directories: bool, anchored: bool) -> re.Pattern | None:
+            alternatives = [f'(?P<p{i}>{regex})' for i, (regex, _, directory_only, is_anchored)
+                            in reversed(list(enumerate(translated)))
+                            if is_anchored == anchored and (directories or not directory_only)]
+            return re.compile('|'.join(alternatives), re.DOTALL) if alternatives else None
+
+        self._file_regexes = (compile_kind(False, False), compile_kind(False, True))
+        self._dir_regexes = (compile_kind(True, False), compile_kind(True, True))
+
+    @classmethod
+    def from_file(cls, ignore_file: Path) -> 'IgnoreMatcher':
+        try:
+            data = ignore_file.read_bytes()
+        except FileNotFoundError:
+            return cls()
+
+        # Bytes that are not UTF-8 decode the way os.scandir decodes such names, so they still match
+        return cls(data.decode(errors='surrogateescape').splitlines(), hashlib.sha1(data).hexdigest())
+
+    def __bool__(self) -> bool:
+        return bool(self._negated)
+
+    def matches(self, path: str, is_dir: bool) -> bool:
+        name_regex, path_regex = self._dir_regexes if is_dir else self._file_regexes
+
+        deciding = -1
+        if name_regex is not None and (match := name_regex.fullmatch(path.rpartition('/')[2])):
+            deciding = int(match.lastgroup[1:])
+        if path_regex is not None and (match := path_regex.fullmatch(path)):
+            deciding = max(deciding, int(match.lastgroup[1:]))
+
+        return deciding >= 0 and not self._negated[deciding]
@@ -0,0 +1,150 @@
+import os
+import struct
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+INDEX_MAGIC = b'CAFI'
+INDEX_VERSION = 3
+
+_HEADER = struct.Struct('<4sBqII')
+_PATH_LENGTH = struct.Struct('<H')
+_ENTRY = struct.Struct('<qqqQI20s')
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    mtime_ns: int
+    ctime_ns: int
+    size: int
+    inode: int
+    mode: int
+    hash: str
+
+    @classmethod
+    def from_stat(cls, st: os.stat_result, hash_value: str) -> 'IndexEntry':
+        return cls(st.st_mtime_ns, st.st_ctime_ns, st.st_size, st.st_ino, st.st_mode, hash_value)
+
+    def matches(self, st: os.stat_result) -> bool:
+        return (self.mtime_ns == st.st_mtime_ns and self.ctime_ns == st.st_ctime_ns and self.size == st.st_size
+                and self.inode == st.st_ino and self.mode == st.st_mode)
+
+
+def filesystem_time_ns(directory: Path) -> int:
+    # File timestamps come from the filesystem clock, which is coarser than time.time_ns(),
+    # so the current time is read back from a freshly created file instead
+    fd, name = tempfile.mkstemp(dir=directory, prefix='.index-')
+    try:
+        return os.fstat(fd).st_mtime_ns
+    finally:
+        os.close(fd)
+        os.unlink(name)
+
+
+# Stat cache for the working tree: a path whose stat still matches its entry keeps the
+# recorded blob hash without reading the file. timestamp_ns is the filesystem time at
+# which the snapshot that produced the entries started. A file modified at or after that
+# time may have changed again within the same timestamp tick, so such racy entries are
+# never trusted and the file is rehashed.
+# trees holds the stat and tree hash of every snapshotted directory, with '' for the working
+# directory itself, fsmonitor_token is where the file-system monitor's change feed stood
+# when that snapshot started and ignore_hash identifies the ignore rules the trees were built with
+class Index:
+    def __init__(self, entries: dict[str, IndexEntry] | None = None, timestamp_ns: int = 0,
+                 trees: dict[str, IndexEntry] | None = None, fsmonitor_token: str = '', ignore_hash: str = ''):
+        self.entries = entries if entries is not None else {}
+        self.timestamp_ns = timestamp_ns
+        self.trees = trees if trees is not None else {}
+        self.fsmonitor_token = fsmonitor_token
+        self.ignore_hash = ignore_hash
+
+    def lookup(self, path: str, st: os.stat_result) -> str | None:
+        return self._lookup(self.entries, path, st)
+
+    def lookup_tree(self, path: str, st: os.stat_result) -> str | None:
+        # A directory's mtime moves whenever an entry is added, removed or renamed in it
+        return self._lookup(self.trees, path, st)
+
+    def _lookup(self, entries: dict[str, IndexEntry], path: str, st: os.stat_result) -> str | None:
+        entry = entries.get(path)
+        if entry is None or not entry.matches(st):
+            return None
+        if entry.mtime_ns >= self.timestamp_ns:
+            return None
+
+        return entry.hash
+
+    def record(self, path: str, st: os.stat_result, hash_value: str) -> None:
+        self.entries[path] = IndexEntry.from_stat(st, hash_value)
+
+    def record_tree(self, path: str, st: os.stat_result, hash_value: str) -> None:
+        self.trees[path] = IndexEntry.from_stat(st, hash_value)
+
+    @classmethod
+    def load(cls, index_file: Path) -> 'Index':
+        # The index is only a cache, so a missing or unreadable one is treated as empty
+        try:
+            data = index_file.read_bytes()
+            magic, version, timestamp_ns, entry_count, tree_count = _HEADER.unpack_from(data)
+            if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                return cls()
+
+            offset = _HEADER.size
+            fsmonitor_token, offset = _unpack_path(data, offset)
+            ignore_hash, offset = _unpack_path(data, offset)
+            entries, offset = _unpack_entries(data, offset, entry_count)
+            trees, offset = _unpack_entries(data, offset, tree_count)
+        except (OSError, struct.error, UnicodeDecodeError):
+            return cls()
+
+        return cls(entries, timestamp_ns, trees, fsmonitor_token, ignore_hash)
+
+    def save(self, index_file: Path) -> None:
+        parts = [_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.timestamp_ns, len(self.entries), len(self.trees))]
+        _pack_path(parts, self.fsmonitor_token)
+        _pack_path(parts, self.ignore_hash)
+        _pack_entries(parts, self.entries)
+        _pack_entries(parts, self.trees)
+
+        # Written to a temporary file and renamed, so readers never see a partial index
+        fd, name = tempfile.mkstemp(dir=index_file.parent, prefix='.index-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(b''.join(parts))
+            os.replace(name, index_file)
+        except BaseException:
+            os.unlink(name)
+            raise
+
+
+def _pack_path(parts: list[bytes], path: str) -> None:
+    encoded = path.encode()
+    parts.append(_PATH_LENGTH.pack(len(encoded)))
+    parts.append(encoded)
+
+
+def _pack_entries(parts: list[bytes], entries: dict[str, IndexEntry]) -> None:
+    for path, entry in entries.items():
+        _pack_path(parts, path)
+        parts.append(_ENTRY.pack(entry.mtime_ns, entry.ctime_ns, entry.size, entry.inode, entry.mode,
+                                 bytes.fromhex(entry.hash)))
+
+
+def _unpack_path(data: bytes, offset: int) -> tuple[str, int]:
+    (path_length,) = _PATH_LENGTH.unpack_from(data, offset)
+    offset += _PATH_LENGTH.size
+    if offset + path_length > len(data):
+        raise struct.error('truncated index')
+
+    return data[offset:offset + path_length].decode(), offset + path_length
+
+
+def _unpack_entries(data: bytes, offset: int, count: int) -> tuple[dict[str, IndexEntry], int]:
+    entries = {}
+    for _ in range(count):
+        path, offset = _unpack_path(data, offset)
+        mtime_ns, ctime_ns, size, inode, mode, raw_hash = _ENTRY.unpack_from(data, offset)
+        offset += _ENTRY.size
+        entries[path] = IndexEntry(mtime_ns, ctime_ns, size, inode, mode, raw_hash.hex())
+
+    return entries, offset
@@ -1,14 +1,21 @@
 from pathlib import Path
+import os
 import shutil
 
 import libcaf
-from libcaf.constants import OBJECTS_SUBDIR, DEFAULT_BRANCH, REFS_DIR, HEADS_DIR, HEAD_FILE
-from libcaf import Blob, TreeRecord, Commit, TreeRecordType, Tree, save_tree, hash_object, save_commit, load_commit, \
-    load_tree
-from collections import deque
+from libcaf.constants import OBJECTS_SUBDIR, DEFAULT_BRANCH, REFS_DIR, HEADS_DIR, HEAD_FILE, \
+    INDEX_FILE, FSMONITOR_SOCKET, IGNORE_FILE, SPARSE_FILE
+from libcaf.fsmonitor import FileSystemMonitor, query_fsmonitor
+from libcaf.ignore import IgnoreMatcher
+from libcaf.index import Index, filesystem_time_ns
+from libcaf.sparse import SparseCone
+from libcaf.walk import relative_join, walk_post_order
+from libcaf import Blob, TreeRecord, Commit, TreeRecordType, Tree, save_tree, save_commit, load_commit, \
+    load_tree, StoreConfig, save_store_config
+from collections import defaultdict
 from datetime import datetime
 from dataclasses import dataclass, field
-from typing import Any, Sequence, Optional
+from typing import Any, Callable, Iterator, Sequence, Optional
 
 
 @dataclass
@@ -43,6 +50,34 @@ class MovedFromDiff(Diff):
     moved_from: MovedToDiff
 
 
+@dataclass
+class FileStatus:
+    path: str
+
+
+@dataclass
+class AddedFile(FileStatus):
+    pass
+
+
+@dataclass
+class ModifiedFile(FileStatus):
+    pass
+
+
+@dataclass
+class RemovedFile(FileStatus):
+    pass
+
+
+# Objects that do not match their names. Legacy objects are trees and commits written before
+# the canonical format, which still load but were named by a hash of their fields
+@dataclass
+class FsckReport:
+    corrupt: list[str] = field(default_factory=list)
+    legacy: list[str] = field(default_factory=list)
+
+
 class RepositoryError(Exception):
     pass
 
@@ -64,6 +99,15 @@ class Repository:
     def head_file(self) -> Path:
         return self.repo_path() / HEAD_FILE
 
+    def index_file(self) -> Path:
+        return self.repo_path() / INDEX_FILE
+
+    def fsmonitor_socket(self) -> Path:
+        return self.repo_path() / FSMONITOR_SOCKET
+
+    def sparse_file(self) -> Path:
+        return self.repo_path() / SPARSE_FILE
+
     def exists(self) -> bool:
         return self.repo_path().exists()
 
@@ -81,11 +125,13 @@ class Repository:
 
         return _verify_repo
 
-    def init(self, default_branch: str = DEFAULT_BRANCH) -> None:
+    def init(self, default_branch: str = DEFAULT_BRANCH, compress: bool = False, chunking: bool = False) -> None:
         repo_path = self.repo_path()
 
         repo_path.mkdir(parents=True)
         self.objects_dir().mkdir()
+        if compress or chunking:
+            save_store_config(self.objects_dir(), StoreConfig(compression=compress, chunking=chunking))
         heads_dir = self.heads_dir()
         heads_dir.mkdir(parents=True)
 
@@ -106,6 +152,57 @@ class Repository:
     def save_file_content(self, file: Path) -> Blob:
         return libcaf.save_file_content(self.objects_dir(), file)
 
+    @requires_repo
+    def repack(self) -> int:
+        return libcaf.repack(self.objects_dir(), self._delta_bases())
+
+    def _delta_bases(self) -> dict[str, str]:
+        # Each older version of a file is deltified against the next newer version at the same path
+        bases = {}
+        newer_versions = {}
+        visited = set()
+
+        for _, commit in self.get_commit_history():
+            stack = [(commit.treeHash, '')]
+            while stack:
+                tree_hash, prefix = stack.pop()
+                if (tree_hash, prefix) in visited:
+                    continue
+                visited.add((tree_hash, prefix))
+
+                for name, record in load_tree(self.objects_dir(), tree_hash).get_records().items():
+                    path = f'{prefix}/{name}'
+                    if record.type == TreeRecordType.TREE:
+                        stack.append((record.hash, path))
+                        continue
+
+                    newer = newer_versions.get(path)
+                    if newer is not None and newer != record.hash:
+                        bases.setdefault(record.hash, newer)
+                    newer_versions[path] = record.hash
+
+        return bases
+
+    @requires_repo
+    def fsmonitor(self) -> FileSystemMonitor:
+        return FileSystemMonitor(self.working_dir, self.repo_dir, self.fsmonitor_socket())
+
+    @requires_repo
+    def fsck(self) -> FsckReport:
+        report = FsckReport()
+        for object_hash in libcaf.list_objects(self.objects_dir()):
+            try:
+                if libcaf.verify_content(self.objects_dir(), object_hash):
+                    continue
+                if libcaf.is_legacy_object(self.objects_dir(), object_hash):
+                    report.legacy.append(object_hash)
+                    continue
+            except ValueError:
+                pass
+            report.corrupt.append(object_hash)
+
+        return report
+
     @requires_repo
     def add_branch(self, branch_name: str) -> None:
         branch_path = self.heads_dir() / branch_name
@@ -133,58 +230,515 @@ class Repository:
         return [x.name for x in self.heads_dir().iterdir() if x.is_file()]
 
     @requires_repo
-    def save_directory_tree(self, path: Path) -> str:
+    def save_directory_tree(self, path: Path, workers: int = 1) -> str:
         if not path.is_dir():
             raise ValueError(f"{path} is not a directory")
 
-        stack = deque([path])
+        # Entries outside the snapshotted directory are carried over, unless they were racy
+        # against the index they came from
+        # Trees are only kept while the ignore rules and sparse cone they were built with still hold,
+        # and never for the root or the other ancestors of the directory, whose trees it changes
+        previous = Index.load(self.index_file())
+        ignore, cone, rules_hash = self._walk_rules()
+        same_rules = previous.ignore_hash == rules_hash
+        prefix = path.relative_to(self.working_dir).as_posix()
+        root_key = '' if prefix == '.' else prefix
+        key_prefix = f'{root_key}/' if root_key else ''
+        index = Index({p: e for p, e in previous.entries.items()
+                       if root_key and not (p + '/').startswith(key_prefix) and e.mtime_ns < previous.timestamp_ns},
+                      filesystem_time_ns(self.repo_path()),
+                      {p: e for p, e in previous.trees.items()
+                       if root_key and same_rules and p and not (p + '/').startswith(key_prefix)
+                       and not key_prefix.startswith(p + '/')},
+                      previous.fsmonitor_token,
+                      rules_hash)
+
+        changed = None if root_key else self._changed_directories(previous, index)
+        if not same_rules:
+            changed = None
         hashes = {}
+        reused = set()
+        unchanged = self._unchanged_directories(previous) if changed is None and same_rules else None
+        root_stat = os.stat(path)
+
+        def descend(relative_path: str, entry: os.DirEntry | None) -> bool:
+            # A directory with no change below it since the last snapshot keeps its tree hash. The
+            # monitor says which directories changed, otherwise their fingerprints are compared.
+            # Stats are taken before the directory is listed, so they never hide a later change
+            key = key_prefix + relative_path if relative_path else root_key
+            st = entry.stat() if entry is not None else root_stat
+            if changed is not None:
+                if relative_path in changed:
+                    return True
+            elif unchanged is None or not unchanged(key, st):
+                return True
+
+            tree = previous.trees.get(key)
+            if tree is None or not libcaf.content_exists(self.objects_dir(), tree.hash):
+                return True
+
+            hashes[relative_path] = tree.hash
+            reused.add(key)
+            return False
+
+        head_records = self._head_records() if cone else None
+
+        if descend('', None):
+            # Ignored directories, and directories outside the sparse cone, are pruned before they are opened
+            def skip(relative_path: str, entry: os.DirEntry) -> bool:
+                if entry.name == self.repo_dir.name:
+                    return True
+                is_dir = entry.is_dir()
+                return ignore.matches(key_prefix + relative_path, is_dir) or \
+                    (is_dir and not cone.includes_dir(key_prefix + relative_path))
+
+            directories = walk_post_order(path, skip, descend)
+            if workers != 1:
+                directories = list(directories)
+                blob_hashes = self._save_files_parallel(directories, key_prefix, workers, previous, index)
+                blob_hash_of = lambda _, key: blob_hashes[key]
+            else:
+                blob_hash_of = lambda entry, key: self._save_indexed_file(entry, key, previous, index)
+
+            # Directories come in post-order, so every subtree is saved before its parent
+            for relative_dir, files, subdirs in directories:
+                tree_records = {}
+                for entry in files:
+                    blob_hash = blob_hash_of(entry, key_prefix + relative_join(relative_dir, entry.name))
+                    tree_records[entry.name] = TreeRecord(TreeRecordType.BLOB, blob_hash, entry.name)
+                for entry in subdirs:
+                    # Subtrees are dropped once their parent holds them, so only the current path stays in memory
+                    relative_path = relative_join(relative_dir, entry.name)
+                    subtree_hash = hashes.pop(relative_path)
+                    index.record_tree(key_prefix + relative_path, entry.stat(), subtree_hash)
+                    tree_records[entry.name] = TreeRecord(TreeRecordType.TREE, subtree_hash, entry.name)
+                key = key_prefix + relative_dir if relative_dir else root_key
+                if not cone.contains(key):
+                    self._add_out_of_cone(tree_records, head_records(key), key, cone)
+                hashes[relative_dir] = save_tree(self.objects_dir(), Tree(tree_records))
+
+        tree_hash = hashes['']
+        index.record_tree(root_key, root_stat, tree_hash)
+        self._carry_over_reused(previous, index, reused)
+        index.save(self.index_file())
+
+        return tree_hash
+
+    def _walk_rules(self, cone: SparseCone | None = None) -> tuple[IgnoreMatcher, SparseCone, str]:
+        # The ignore rules and sparse cone that prune walks, and a hash identifying both
+        ignore = IgnoreMatcher.from_file(self.working_dir / IGNORE_FILE)
+        if cone is None:
+            cone = SparseCone.from_file(self.sparse_file())
+
+        return ignore, cone, f'{ignore.source_hash}:{cone.source_hash}' if cone else ignore.source_hash
+
+    def _head_records(self):
+        # Returns a lookup of the records HEAD's tree holds for a directory. Trees are loaded
+        # along the path on first use, so only the directories asked about are read
+        head = self.head_commit()
+        root_tree = load_commit(self.objects_dir(), head).treeHash if head else None
+        records = {'': load_tree(self.objects_dir(), root_tree).get_records() if root_tree else {}}
+
+        def records_of(key: str) -> dict[str, TreeRecord]:
+            if key not in records:
+                parent, _, name = key.rpartition('/')
+                record = records_of(parent).get(name)
+                records[key] = load_tree(self.objects_dir(), record.hash).get_records() \
+                    if record is not None and record.type == TreeRecordType.TREE else {}
+            return records[key]
+
+        return records_of
+
+    def _add_out_of_cone(self, tree_records: dict[str, TreeRecord], head_records: dict[str, TreeRecord],
+                         key: str, cone: SparseCone) -> None:
+        # Subtrees outside the cone are never on disk, so their hashes come from HEAD unread.
+        # Ancestors of the cone that are gone from disk keep only what lies outside the cone
+        for name, record in head_records.items():
+            path = relative_join(key, name)
+            if name in tree_records or record.type != TreeRecordType.TREE or cone.contains(path):
+                continue
+
+            if not cone.includes_dir(path):
+                tree_records[name] = record
+                continue
+
+            subtree_records = {}
+            self._add_out_of_cone(subtree_records, load_tree(self.objects_dir(), record.hash).get_records(),
+                                  path, cone)
+            if subtree_records:
+                subtree_hash = save_tree(self.objects_dir(), Tree(subtree_records))
+                tree_records[name] = TreeRecord(TreeRecordType.TREE, subtree_hash, name)
+
+    def _changed_directories(self, previous: Index, index: Index) -> set[str] | None:
+        # Directories changed since the last snapshot together with all their ancestors, or None
+        # when no file-system monitor can tell and the whole tree has to be walked
+        response = query_fsmonitor(self.fsmonitor_socket(), previous.fsmonitor_token)
+        if response is None:
+            index.fsmonitor_token = ''
+            return None
+
+        index.fsmonitor_token, changed = response
+        if changed is None:
+            return None
+
+        affected = set()
+        for directory in changed:
+            while directory not in affected:
+                affected.add(directory)
+                if not directory:
+                    break
+                directory = directory.rpartition('/')[0]
+
+        return affected
+
+    def _unchanged_directories(self, previous: Index):
+        # Returns a check that a directory and everything below it still match the previous
+        # index, using only stat calls: the directory's own stat shows that no entry was added,
+        # removed or renamed in it, and the stats of its indexed children show that none of them
+        # changed. Results are remembered, so each directory is checked at most once
+        if not previous.trees:
+            return None
+
+        files = defaultdict(list)
+        for key in previous.entries:
+            files[key.rpartition('/')[0]].append(key)
+        subdirs = defaultdict(list)
+        for key in previous.trees:
+            if key:
+                subdirs[key.rpartition('/')[0]].append(key)
+
+        working_dir = str(self.working_dir)
+        verified = {}
+
+        def unchanged(key: str, st: os.stat_result) -> bool:
+            if key in verified:
+                return verified[key]
+
+            result = previous.lookup_tree(key, st) is not None
+            try:
+                result = result and all(previous.lookup(child, os.stat(os.path.join(working_dir, child))) is not None
+                                        for child in files[key])
+                result = result and all(unchanged(child, os.stat(os.path.join(working_dir, child)))
+                                        for child in subdirs[key])
+            except OSError:
+                result = False
 
-        while stack:
-            current_path = stack.pop()
-            tree_records = {}
+            verified[key] = result
+            return result
 
-            for item in current_path.iterdir():
-                if item.name == self.repo_dir.name:
-                    continue
-                if item.is_file():
-                    blob = self.save_file_content(item)
-                    tree_records[item.name] = TreeRecord(TreeRecordType.BLOB, blob.hash, item.name)
-                elif item.is_dir():
-                    if item in hashes:  # If the directory has already been processed, use its hash
-                        subtree_hash = hashes[item]
-                        tree_records[item.name] = TreeRecord(TreeRecordType.TREE, subtree_hash, item.name)
-                    else:
-                        stack.append(current_path)
-                        stack.append(item)
-                        break
-            else:
-                tree = Tree(tree_records)
-                save_tree(self.objects_dir(), tree)
-                hashes[current_path] = hash_object(tree)
+        return unchanged
+
+    @staticmethod
+    def _carry_over_reused(previous: Index, index: Index, reused: set[str]) -> None:
+        # Nothing below a reused directory was looked at, so its entries stay as they were
+        if not reused:
+            return
+
+        def within_reused(path: str) -> bool:
+            while path:
+                path = path.rpartition('/')[0]
+                if path in reused:
+                    return True
+            return False
+
+        index.entries.update((p, e) for p, e in previous.entries.items() if within_reused(p))
+        index.trees.update((p, e) for p, e in previous.trees.items() if within_reused(p))
+
+    def _save_files_parallel(self, directories, key_prefix: str, workers: int, previous: Index,
+                             index: Index) -> dict[str, str]:
+        # Files the index cannot vouch for are hashed and stored together on the worker pool
+        blob_hashes = {}
+        pending = []
+        for relative_dir, files, _ in directories:
+            for entry in files:
+                key = key_prefix + relative_join(relative_dir, entry.name)
+                st = entry.stat()
+                blob_hash = previous.lookup(key, st)
+                if blob_hash is None or not libcaf.content_exists(self.objects_dir(), blob_hash):
+                    pending.append((entry, key, st))
+                else:
+                    index.record(key, st, blob_hash)
+                    blob_hashes[key] = blob_hash
+
+        results = libcaf.save_files_content(self.objects_dir(), [entry.path for entry, _, _ in pending], workers)
+        for (_, key, st), result in zip(pending, results):
+            if isinstance(result, Exception):
+                raise result
+            index.record(key, st, result.hash)
+            blob_hashes[key] = result.hash
 
-        return hashes[path]
+        return blob_hashes
+
+    def _save_indexed_file(self, entry: os.DirEntry, key: str, previous: Index, index: Index) -> str:
+        # The DirEntry keeps its stat result, so the file is only stat'ed once per snapshot
+        st = entry.stat()
+
+        blob_hash = previous.lookup(key, st)
+        if blob_hash is None or not libcaf.content_exists(self.objects_dir(), blob_hash):
+            blob_hash = libcaf.save_file_content(self.objects_dir(), entry.path).hash
+
+        # Recorded with the stat taken before reading, so a later change never matches it
+        index.record(key, st, blob_hash)
+
+        return blob_hash
     
     @requires_repo
-    def create_commit(self, author: str, message: str) -> str:
+    def create_commit(self, author: str, message: str, workers: int = 1) -> str:
         if not author or not message:
             raise ValueError("Both 'author' and 'message' are required.")
 
-        tree_hash = self.save_directory_tree(self.working_dir)
+        tree_hash = self.save_directory_tree(self.working_dir, workers)
 
-        head_content = self.head_file().read_text().strip()
-        parent_hash = None if head_content.startswith("ref:") else head_content
+        parent_hash = self.head_commit()
 
         commit = Commit(tree_hash, author, message, int(datetime.now().timestamp()), parent_hash)
 
-        commit_hash = hash_object(commit)
-        save_commit(self.objects_dir(), commit)
+        commit_hash = save_commit(self.objects_dir(), commit)
 
         with self.head_file().open("w") as head_file:
             head_file.write(f"{commit_hash}\n")
 
         return commit_hash
     
+    @requires_repo
+    def head_commit(self) -> str | None:
+        head_content = self.head_file().read_text().strip()
+        return None if head_content.startswith("ref:") else head_content
+
+    @requires_repo
+    def status(self) -> Iterator[FileStatus]:
+        # Compares the working tree with HEAD's tree without storing anything.
+        # Changes are yielded directory by directory as they are found
+        head = self.head_commit()
+        root_tree = load_commit(self.objects_dir(), head).treeHash if head else None
+        for change, _ in self._compare_working_tree(root_tree):
+            yield change
+
+    def _compare_working_tree(self, root_tree: str | None, walked: list[str] | None = None,
+                              cone: SparseCone | None = None,
+                              keep_tracked: Callable[[str], dict[str, TreeRecord]] | None = None
+                              ) -> Iterator[tuple[FileStatus, str | None]]:
+        # Yields each difference between the working tree and root_tree, together with the blob
+        # hash the tree holds for the path (None for added files). Subtrees the monitor or their
+        # fingerprints vouch for are skipped when the index holds the tree's hash for them, and
+        # files are only hashed when the index cannot vouch for their stat. Only paths in the
+        # sparse cone (the configured one unless given) are compared. Ignored paths are left out,
+        # as snapshots leave them out, unless keep_tracked is given and either root_tree or the
+        # records keep_tracked returns for their directory track them. The keys of the
+        # directories that were listed are appended to walked
+        previous = Index.load(self.index_file())
+        ignore, cone, rules_hash = self._walk_rules(cone)
+        same_rules = previous.ignore_hash == rules_hash
+        changed = self._changed_directories(previous, Index()) if same_rules else None
+        unchanged = self._unchanged_directories(previous) if changed is None and same_rules else None
+
+        def clean(key: str, st: os.stat_result, tree_hash: str) -> bool:
+            tree = previous.trees.get(key)
+            if tree is None or tree.hash != tree_hash:
+                return False
+            if changed is not None:
+                return key not in changed
+            return unchanged is not None and unchanged(key, st)
+
+        def tracked(key: str, records: dict[str, TreeRecord], name: str) -> bool:
+            return keep_tracked is not None and (name in records or name in keep_tracked(key))
+
+        stack = [('', str(self.working_dir), root_tree, False)]
+
+        while stack:
+            key, dir_path, tree_hash, ignored_dir = stack.pop()
+            if tree_hash is not None and clean(key, os.stat(dir_path), tree_hash):
+                continue
+
+            if walked is not None:
+                walked.append(key)
+            records = load_tree(self.objects_dir(), tree_hash).get_records() if tree_hash else {}
+            if cone:
+                records = {name: record for name, record in records.items()
+                           if record.type != TreeRecordType.TREE or cone.includes_dir(relative_join(key, name))}
+            entries = []
+            with os.scandir(dir_path) as listing:
+                for entry in listing:
+                    path = relative_join(key, entry.name)
+                    if entry.name == self.repo_dir.name or (entry.is_dir() and not cone.includes_dir(path)):
+                        continue
+                    # Inside a tracked ignored directory, everything untracked is ignored too
+                    ignored = ignored_dir or ignore.matches(path, entry.is_dir())
+                    if not ignored or tracked(key, records, entry.name):
+                        entries.append((entry, ignored))
+            entries.sort(key=lambda item: item[0].name)
+
+            present = set()
+            subdirs = []
+            for entry, ignored in entries:
+                path = relative_join(key, entry.name)
+                record = records.get(entry.name)
+                if entry.is_file():
+                    present.add(entry.name)
+                    if record is None:
+                        yield AddedFile(path), None
+                    elif record.type == TreeRecordType.TREE:
+                        yield from self._removed_files(record.hash, path)
+                        yield AddedFile(path), None
+                    elif (previous.lookup(path, entry.stat()) or libcaf.hash_file(entry.path)) != record.hash:
+                        yield ModifiedFile(path), record.hash
+                elif entry.is_dir():
+                    present.add(entry.name)
+                    if record is not None and record.type != TreeRecordType.TREE:
+                        yield RemovedFile(path), record.hash
+                        record = None
+                    subdirs.append((path, entry.path, record.hash if record is not None else None, ignored))
+
+            for name, record in sorted(records.items()):
+                if name not in present:
+                    if record.type == TreeRecordType.TREE:
+                        yield from self._removed_files(record.hash, relative_join(key, name))
+                    else:
+                        yield RemovedFile(relative_join(key, name)), record.hash
+
+            stack.extend(reversed(subdirs))
+
+    def _removed_files(self, tree_hash: str, prefix: str) -> Iterator[tuple[RemovedFile, str]]:
+        for name, record in sorted(load_tree(self.objects_dir(), tree_hash).get_records().items()):
+            if record.type == TreeRecordType.TREE:
+                yield from self._removed_files(record.hash, f'{prefix}/{name}')
+            else:
+                yield RemovedFile(f'{prefix}/{name}'), record.hash
+
+    @requires_repo
+    def checkout(self, commit_hash: str, workers: int = 0, force: bool = False) -> None:
+        # Makes the working tree match the commit's tree and moves HEAD to it
+        target_tree = load_commit(self.objects_dir(), commit_hash).treeHash
+        self._switch_working_tree(target_tree, SparseCone.from_file(self.sparse_file()), workers, force)
+
+        with self.head_file().open("w") as head_file:
+            head_file.write(f"{commit_hash}\n")
+
+    @requires_repo
+    def sparse_patterns(self) -> list[str]:
+        return sorted(SparseCone.from_file(self.sparse_file()).directories)
+
+    @requires_repo
+    def set_sparse_patterns(self, patterns: Sequence[str], workers: int = 0, force: bool = False) -> None:
+        # Sets the directories of the sparse cone and makes the working tree match HEAD under
+        # it. No patterns turns sparse checkout off
+        cone = SparseCone(patterns)
+        head = self.head_commit()
+        if head:
+            self._switch_working_tree(load_commit(self.objects_dir(), head).treeHash, cone, workers, force)
+
+        if cone:
+            self.sparse_file().write_text(''.join(f'{directory}\n' for directory in sorted(cone.directories)))
+        elif self.sparse_file().exists():
+            self.sparse_file().unlink()
+
+    def _switch_working_tree(self, target_tree: str, cone: SparseCone, workers: int, force: bool) -> None:
+        # Moves the working tree from HEAD under the current sparse cone to target_tree under
+        # cone. Only the paths that differ are touched: files are written from the store on a
+        # pool of workers threads (one per core when workers <= 0), and tracked files the target
+        # lacks, or that leave the cone, are deleted. Local changes to tracked files, and
+        # untracked files in the way, stop the switch unless force is set. Other untracked
+        # files are left alone
+        head = self.head_commit()
+        head_tree = load_commit(self.objects_dir(), head).treeHash if head else None
+        current_cone = SparseCone.from_file(self.sparse_file())
+
+        # Tracked files are compared even when ignored, so they are neither rewritten
+        # nor lost like untracked ones
+        head_records = self._head_records()
+        local = list(self._compare_working_tree(head_tree, cone=current_cone, keep_tracked=head_records))
+        untracked = {change.path for change, _ in local if isinstance(change, AddedFile)}
+        if not force and (modified := [change.path for change, _ in local if not isinstance(change, AddedFile)]):
+            raise RepositoryError(f"Local changes would be overwritten: {', '.join(modified)}")
+
+        # Entries are carried over unless they were racy against the index they came from
+        previous = Index.load(self.index_file())
+        index = Index({p: e for p, e in previous.entries.items() if e.mtime_ns < previous.timestamp_ns},
+                      filesystem_time_ns(self.repo_path()),
+                      {p: e for p, e in previous.trees.items() if e.mtime_ns < previous.timestamp_ns},
+                      previous.fsmonitor_token,
+                      previous.ignore_hash)
+
+        deleted = []
+        if head_tree is not None and cone.directories != current_cone.directories:
+            deleted = [path for path in self._leaving_files(head_tree, '', current_cone, cone)
+                       if (self.working_dir / path).is_file()]
+
+        walked = []
+        written = {}
+        for change, blob_hash in self._compare_working_tree(target_tree, walked, cone, head_records):
+            if isinstance(change, AddedFile):
+                if change.path not in untracked and current_cone.includes_file(change.path):
+                    deleted.append(change.path)
+            else:
+                written[change.path] = blob_hash
+
+        # A file on disk is only ours to replace when HEAD tracks it and the current cone checked it
+        # out. Anything else, untracked or ignored, is in the way
+        def checked_out(path: str) -> bool:
+            parent, _, name = path.rpartition('/')
+            record = head_records(parent).get(name)
+            return record is not None and record.type != TreeRecordType.TREE and current_cone.includes_file(path)
+
+        # A directory the target replaces with a file is in the way while it holds such files too,
+        # since only the tracked ones below it are deleted
+        def files_below(path: str) -> Iterator[str]:
+            for dir_path, _, names in os.walk(self.working_dir / path):
+                for name in names:
+                    yield Path(dir_path, name).relative_to(self.working_dir).as_posix()
+
+        in_the_way = sorted([path for path in written
+                             if (self.working_dir / path).is_file() and not checked_out(path)] +
+                            [below for path in written if (self.working_dir / path).is_dir()
+                             for below in files_below(path) if not checked_out(below)])
+        if not force and in_the_way:
+            raise RepositoryError(f"Untracked files would be overwritten: {', '.join(in_the_way)}")
+
+        # Listed directories change below, so their trees can no longer be vouched for
+        for key in walked:
+            index.trees.pop(key, None)
+
+        for path in deleted:
+            (self.working_dir / path).unlink()
+            index.entries.pop(path, None)
+        for path in deleted:
+            parent = (self.working_dir / path).parent
+            while parent != self.working_dir:
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+                parent = parent.parent
+        # Only left when forced over the untracked files in them
+        for path in written:
+            if (self.working_dir / path).is_dir():
+                shutil.rmtree(self.working_dir / path)
+
+        for parent in {(self.working_dir / path).parent for path in written}:
+            parent.mkdir(parents=True, exist_ok=True)
+
+        paths = list(written)
+        results = libcaf.checkout_files(self.objects_dir(), [written[path] for path in paths],
+                                        [self.working_dir / path for path in paths], workers)
+        for path, result in zip(paths, results):
+            if isinstance(result, Exception):
+                raise result
+            # Written after the index timestamp, so these stay racy until the next snapshot
+            index.record(path, os.stat(self.working_dir / path), written[path])
+
+        index.save(self.index_file())
+
+    def _leaving_files(self, tree_hash: str, key: str, current_cone: SparseCone, cone: SparseCone) -> Iterator[str]:
+        # Files of the tree inside current_cone but outside cone. Only directories that
+        # current_cone lists and cone does not fully want are read
+        for name, record in sorted(load_tree(self.objects_dir(), tree_hash).get_records().items()):
+            path = relative_join(key, name)
+            if record.type == TreeRecordType.TREE:
+                if current_cone.includes_dir(path) and not cone.contains(path):
+                    yield from self._leaving_files(record.hash, path, current_cone, cone)
+            elif not cone.includes_dir(key):
+                yield path
+
     @requires_repo
     def get_commit_history(self, start_commit: str = None):
         try:
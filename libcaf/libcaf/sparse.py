@@ -0,0 +1,54 @@
+import hashlib
+from pathlib import Path
+from typing import Iterable
+
+
+# Sparse patterns in cone mode: each pattern names a directory whose whole subtree is wanted,
+# and the files directly inside the root and inside every ancestor of a named directory are
+# wanted too. Whether a directory is needed then follows from its path alone, so walks prune
+# everything outside the cone before listing it. A cone without patterns wants everything
+class SparseCone:
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.directories: set[str] = set()
+        self._ancestors: set[str] = set()
+        for line in patterns:
+            directory = line.strip().strip('/')
+            if not directory or directory.startswith('#'):
+                continue
+
+            self.directories.add(directory)
+            while directory:
+                directory = directory.rpartition('/')[0]
+                self._ancestors.add(directory)
+
+        # Identifies the cone, so trees recorded under another cone are not trusted
+        self.source_hash = hashlib.sha1('\n'.join(sorted(self.directories)).encode()).hexdigest() if self else ''
+
+    @classmethod
+    def from_file(cls, sparse_file: Path) -> 'SparseCone':
+        try:
+            return cls(sparse_file.read_text().splitlines())
+        except FileNotFoundError:
+            return cls()
+
+    def __bool__(self) -> bool:
+        return bool(self.directories)
+
+    def contains(self, path: str) -> bool:
+        # Whether path and everything below it are wanted
+        if not self:
+            return True
+
+        while path:
+            if path in self.directories:
+                return True
+            path = path.rpartition('/')[0]
+
+        return False
+
+    def includes_dir(self, path: str) -> bool:
+        # Whether a directory has to be listed, because some of its entries are wanted
+        return path in self._ancestors or self.contains(path)
+
+    def includes_file(self, path: str) -> bool:
+        return self.includes_dir(path.rpartition('/')[0])
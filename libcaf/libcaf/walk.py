@@ -0,0 +1,43 @@
+import os
+from pathlib import Path
+from typing import Callable, Iterator
+
+
+def relative_join(relative_dir: str, name: str) -> str:
+    return f'{relative_dir}/{name}' if relative_dir else name
+
+
+# Walks a directory tree once with os.scandir and yields (relative_dir, files, subdirs) for
+# every directory in post-order, so each directory comes after all of its subdirectories.
+# relative_dir is '' for the root and uses '/' separators. files and subdirs hold the
+# DirEntry objects, whose cached stat results callers can reuse. Only the directories on
+# the current path are kept open. skip and descend receive the relative path of an entry,
+# and a subdirectory that descend rejects is still listed but never opened
+def walk_post_order(root: Path,
+                    skip: Callable[[str, os.DirEntry], bool] | None = None,
+                    descend: Callable[[str, os.DirEntry], bool] | None = None
+                    ) -> Iterator[tuple[str, list[os.DirEntry], list[os.DirEntry]]]:
+    stack = [('', os.scandir(root), [], [])]
+    try:
+        while stack:
+            relative_dir, entries, files, subdirs = stack[-1]
+
+            for entry in entries:
+                relative_path = relative_join(relative_dir, entry.name)
+                if skip is not None and skip(relative_path, entry):
+                    continue
+                if entry.is_file():
+                    files.append(entry)
+                elif entry.is_dir():
+                    subdirs.append(entry)
+                    if descend is not None and not descend(relative_path, entry):
+                        continue
+                    stack.append((relative_path, os.scandir(entry.path), [], []))
+                    break
+            else:
+                entries.close()
+                stack.pop()
+                yield relative_dir, files, subdirs
+    finally:
+        for _, entries, _, _ in stack:
+            entries.close()
@@ -7,11 +7,17 @@ setup(name='libcaf',
                                      ['src/caf.cpp',
                                       'src/hashTypes.cpp',
                                       'src/object_io.cpp',
+                                      'src/compression.cpp',
+                                      'src/pack.cpp',
+                                      'src/delta.cpp',
+                                      'src/chunking.cpp',
+                                      'src/object_id.cpp',
+                                      'src/batch.cpp',
                                       'src/bind.cpp'],
                                      include_dirs=[pybind11.get_include()],
                                      language='c++',
                                      extra_compile_args=['-O3', '-Wall', '-Werror', '-std=c++17'],
-                                     extra_link_args=['-lcrypto'])],
+                                     extra_link_args=['-lcrypto', '-lz'])],
       packages=find_packages(),
       package_dir={"": "."},
       cmdclass={"build_ext": build_ext})
@@ -1,17 +1,13 @@
 #ifndef BLOB_H
 #define BLOB_H
 
-#include <string>
+#include "object_id.h"
 
 class Blob{
   public:
-    const std::string hash;
+    const ObjectId hash;
 
-    // Constructor for lvalue reference
-    Blob(const std::string& hash) : hash(hash) {}
-
-    // Constructor for rvalue reference
-    Blob(std::string&& hash) : hash(std::move(hash)) {}
+    Blob(const ObjectId& hash) : hash(hash) {}
 
 };
 
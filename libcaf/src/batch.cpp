@@ -0,0 +1,75 @@
+#include "batch.h"
+#include "caf.h"
+#include <atomic>
+#include <thread>
+#include <algorithm>
+#include <functional>
+#include <stdexcept>
+
+void run_batch(size_t count, int workers, const std::function<void(size_t)>& task);
+
+std::vector<BatchResult<std::string>> hash_files(const std::vector<std::string>& paths, int workers) {
+    std::vector<BatchResult<std::string>> results(paths.size());
+
+    run_batch(paths.size(), workers, [&](size_t index) {
+        try {
+            results[index].value = hash_file(paths[index]);
+        } catch (const std::exception& e) {
+            results[index].error = paths[index] + ": " + e.what();
+        }
+    });
+
+    return results;
+}
+
+std::vector<BatchResult<Blob>> save_files_content(const std::string& content_root_dir, const std::vector<std::string>& paths, int workers) {
+    std::vector<BatchResult<Blob>> results(paths.size());
+
+    run_batch(paths.size(), workers, [&](size_t index) {
+        try {
+            results[index].value.emplace(save_file_content(content_root_dir, paths[index]));
+        } catch (const std::exception& e) {
+            results[index].error = paths[index] + ": " + e.what();
+        }
+    });
+
+    return results;
+}
+
+std::vector<BatchResult<bool>> checkout_files(const std::string& content_root_dir, const std::vector<std::string>& hashes, const std::vector<std::string>& paths, int workers) {
+    if (hashes.size() != paths.size())
+        throw std::invalid_argument("Every path needs a content hash");
+
+    std::vector<BatchResult<bool>> results(paths.size());
+
+    run_batch(paths.size(), workers, [&](size_t index) {
+        try {
+            checkout_content(content_root_dir, hashes[index], paths[index]);
+            results[index].value = true;
+        } catch (const std::exception& e) {
+            results[index].error = paths[index] + ": " + e.what();
+        }
+    });
+
+    return results;
+}
+
+void run_batch(size_t count, int workers, const std::function<void(size_t)>& task) {
+    size_t threads = workers > 0 ? workers : std::max(1u, std::thread::hardware_concurrency());
+    threads = std::min(threads, count);
+
+    // Workers pull the next index until none are left, so slow files do not hold up a fixed share
+    std::atomic<size_t> next{0};
+    auto worker = [&]() {
+        for (size_t index = next++; index < count; index = next++)
+            task(index);
+    };
+
+    std::vector<std::thread> pool;
+    for (size_t i = 1; i < threads; ++i)
+        pool.emplace_back(worker);
+    worker();
+
+    for (auto& thread : pool)
+        thread.join();
+}
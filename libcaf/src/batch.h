@@ -0,0 +1,23 @@
+#ifndef BATCH_H
+#define BATCH_H
+
+#include <string>
+#include <vector>
+#include <optional>
+#include "Blob.h"
+
+// Outcome of one file of a batch: its value, or the error that file ran into
+template <typename T>
+struct BatchResult {
+    std::optional<T> value;
+    std::string error;
+};
+
+// All run on a pool of workers threads (one per core when workers <= 0) and
+// return results in the order of paths
+std::vector<BatchResult<std::string>> hash_files(const std::vector<std::string>& paths, int workers);
+std::vector<BatchResult<Blob>> save_files_content(const std::string& content_root_dir, const std::vector<std::string>& paths, int workers);
+// Writes the content of hashes[i] to paths[i], replacing existing files
+std::vector<BatchResult<bool>> checkout_files(const std::string& content_root_dir, const std::vector<std::string>& hashes, const std::vector<std::string>& paths, int workers);
+
+#endif // BATCH_H
@@ -3,10 +3,28 @@
 #include "caf.h"
 #include "hashTypes.h" 
 #include "object_io.h" 
+#include "pack.h"
+#include "batch.h"
 
 using namespace std;
 namespace py = pybind11;
 
+// Bindings that touch the disk or hash data run without the GIL, so other Python threads keep going
+using release_gil = py::call_guard<py::gil_scoped_release>;
+
+// Batch results become a list holding each value, or a ValueError for files that failed
+template<typename T>
+py::list batch_results_to_list(const std::vector<BatchResult<T>>& results) {
+    py::list out;
+    for (const auto& result : results) {
+        if (result.value)
+            out.append(py::cast(*result.value));
+        else
+            out.append(py::reinterpret_borrow<py::object>(PyExc_ValueError)(result.error));
+    }
+    return out;
+}
+
 template<typename R, typename... Args>
 auto make_exception_handler(R (*f)(Args...)) {
     return [f](Args... args) -> R {
@@ -30,34 +48,131 @@ auto make_exception_handler(void (*f)(Args...)) {
     };
 }
 
+// Object ids are hex at the Python edge and raw bytes inside the library
+ObjectId object_id_from_hex(const std::string& hex) {
+    ObjectId id;
+    if (!ObjectId::from_hex(hex, id))
+        throw py::value_error("Invalid object id: " + hex);
+    return id;
+}
+
 PYBIND11_MODULE(_libcaf, m) {
 
 //methods
 
     // caf
-    m.def("hash_file", make_exception_handler(hash_file));
-    m.def("hash_string", make_exception_handler(hash_string));
-    m.def("save_file_content", make_exception_handler(save_file_content));
-    m.def("open_content_for_saving", make_exception_handler(open_content_for_saving));
-    m.def("delete_content", make_exception_handler(delete_content));
-    m.def("open_content_for_reading", make_exception_handler(open_content_for_reading));
+    m.def("hash_file", make_exception_handler(hash_file), release_gil());
+    m.def("hash_string", make_exception_handler(hash_string), release_gil());
+    m.def("save_file_content", make_exception_handler(save_file_content), release_gil());
+    m.def("hash_files", [](const std::vector<std::string>& paths, int workers) {
+        std::vector<BatchResult<std::string>> results;
+        {
+            py::gil_scoped_release release;
+            results = hash_files(paths, workers);
+        }
+        return batch_results_to_list(results);
+    }, py::arg("paths"), py::arg("workers") = 0);
+    m.def("save_files_content", [](const std::string& content_root_dir, const std::vector<std::string>& paths, int workers) {
+        std::vector<BatchResult<Blob>> results;
+        {
+            py::gil_scoped_release release;
+            results = save_files_content(content_root_dir, paths, workers);
+        }
+        return batch_results_to_list(results);
+    }, py::arg("content_root_dir"), py::arg("paths"), py::arg("workers") = 0);
+    m.def("checkout_files", [](const std::string& content_root_dir, const std::vector<std::string>& hashes,
+                               const std::vector<std::string>& paths, int workers) {
+        if (hashes.size() != paths.size())
+            throw py::value_error("Every path needs a content hash");
+
+        std::vector<BatchResult<bool>> results;
+        {
+            py::gil_scoped_release release;
+            results = checkout_files(content_root_dir, hashes, paths, workers);
+        }
+        return batch_results_to_list(results);
+    }, py::arg("content_root_dir"), py::arg("hashes"), py::arg("paths"), py::arg("workers") = 0);
+    m.def("open_content_for_saving", make_exception_handler(open_content_for_saving), release_gil());
+    m.def("close_content_for_saving", make_exception_handler(close_content_for_saving), release_gil());
+    m.def("discard_content_for_saving", make_exception_handler(discard_content_for_saving), release_gil());
+    m.def("delete_content", make_exception_handler(delete_content), release_gil());
+    m.def("open_content_for_reading", make_exception_handler(open_content_for_reading), release_gil());
+    m.def("content_exists", make_exception_handler(content_exists), release_gil());
+    m.def("verify_content", make_exception_handler(verify_content), release_gil());
+    m.def("list_objects", make_exception_handler(list_objects), release_gil());
+    m.def("load_store_config", make_exception_handler(load_store_config), release_gil());
+    m.def("save_store_config", make_exception_handler(save_store_config), release_gil());
+    m.def("get_lock_timeout_ms", &get_lock_timeout_ms);
+    m.def("set_lock_timeout_ms", make_exception_handler(set_lock_timeout_ms));
+    m.def("get_store_stats", &get_store_stats);
+    m.def("reset_store_stats", &reset_store_stats);
+
+    // pack
+    m.def("repack", make_exception_handler(repack), release_gil());
 
     // hashTypes
     m.def("hash_object", py::overload_cast<const Blob&>(&hash_object), py::arg("blob"));
-    m.def("hash_object", py::overload_cast<const Tree&>(&hash_object), py::arg("tree"));
-    m.def("hash_object", py::overload_cast<const Commit&>(&hash_object), py::arg("commit"));
+    m.def("hash_object", py::overload_cast<const Tree&>(&hash_object), py::arg("tree"), release_gil());
+    m.def("hash_object", py::overload_cast<const Commit&>(&hash_object), py::arg("commit"), release_gil());
 
     // object_io
-    m.def("save_commit", &save_commit);
-    m.def("load_commit", &load_commit);
-    m.def("save_tree", &save_tree);
-    m.def("load_tree", &load_tree);
+    m.def("save_commit", &save_commit, release_gil());
+    m.def("load_commit", &load_commit, release_gil());
+    m.def("save_tree", &save_tree, release_gil());
+    m.def("load_tree", &load_tree, release_gil());
+    m.def("is_legacy_object", make_exception_handler(is_legacy_object), release_gil());
 
 //classes
 
     py::class_<Blob>(m, "Blob")
-    .def(py::init<std::string>())
-    .def_readonly("hash", &Blob::hash);
+    .def(py::init([](const std::string& hash) {
+        return Blob(object_id_from_hex(hash));
+    }))
+    .def_property_readonly("hash", [](const Blob& blob) {
+        return blob.hash.hex();
+    });
+
+    py::class_<ObjectId>(m, "ObjectId")
+    .def(py::init(&object_id_from_hex), py::arg("hex"))
+    .def_static("from_bytes", [](const py::bytes& data) {
+        std::string raw = data;
+        if (raw.size() != OBJECT_ID_SIZE)
+            throw py::value_error("Object ids are " + std::to_string(OBJECT_ID_SIZE) + " bytes long");
+        return ObjectId::from_bytes(reinterpret_cast<const unsigned char*>(raw.data()));
+    }, py::arg("data"))
+    .def("hex", &ObjectId::hex)
+    .def("__bytes__", [](const ObjectId& id) {
+        return py::bytes(reinterpret_cast<const char*>(id.data()), OBJECT_ID_SIZE);
+    })
+    .def("__str__", &ObjectId::hex)
+    .def("__repr__", [](const ObjectId& id) {
+        return "ObjectId('" + id.hex() + "')";
+    })
+    .def("__eq__", [](const ObjectId& self, const ObjectId& other) {
+        return self == other;
+    }, py::is_operator())
+    .def("__lt__", [](const ObjectId& self, const ObjectId& other) {
+        return self < other;
+    }, py::is_operator())
+    .def("__hash__", [](const ObjectId& id) {
+        return ObjectIdHash()(id);
+    });
+
+    py::class_<StoreConfig>(m, "StoreConfig")
+    .def(py::init([](bool compression, bool chunking) {
+        StoreConfig config;
+        config.compression = compression;
+        config.chunking = chunking;
+        return config;
+    }), py::arg("compression") = false, py::arg("chunking") = false)
+    .def_readwrite("compression", &StoreConfig::compression)
+    .def_readwrite("chunking", &StoreConfig::chunking);
+
+    py::class_<StoreStats>(m, "StoreStats")
+    .def_readonly("written_objects", &StoreStats::written_objects)
+    .def_readonly("skipped_writes", &StoreStats::skipped_writes)
+    .def_readonly("lock_waits", &StoreStats::lock_waits)
+    .def_readonly("lock_wait_ns", &StoreStats::lock_wait_ns);
 
     py::enum_<TreeRecord::Type>(m, "TreeRecordType")
     .value("TREE", TreeRecord::Type::TREE)
@@ -66,9 +181,13 @@ PYBIND11_MODULE(_libcaf, m) {
     .export_values();
 
     py::class_<TreeRecord>(m, "TreeRecord")
-    .def(py::init<TreeRecord::Type, std::string, std::string>())
+    .def(py::init([](TreeRecord::Type type, const std::string& hash, const std::string& name) {
+        return TreeRecord(type, object_id_from_hex(hash), name);
+    }))
     .def_readonly("type", &TreeRecord::type)
-    .def_readonly("hash", &TreeRecord::hash)
+    .def_property_readonly("hash", [](const TreeRecord& record) {
+        return record.hash.hex();
+    })
     .def_readonly("name", &TreeRecord::name)
     .def("__eq__", [](const TreeRecord &self, const TreeRecord &other) {
         return self.type == other.type && self.hash == other.hash && self.name == other.name;
@@ -79,10 +198,22 @@ PYBIND11_MODULE(_libcaf, m) {
     .def("get_records", &Tree::getRecords);
 
     py::class_<Commit>(m, "Commit")
-        .def(py::init<const string &, const string&, const string&, time_t, const std::optional<std::string>&>())
-        .def_readonly("treeHash", &Commit::treeHash)
+        .def(py::init([](const string& treeHash, const string& author, const string& message, time_t timestamp,
+                         const std::optional<std::string>& parent) {
+            std::optional<ObjectId> parent_id;
+            if (parent)
+                parent_id = object_id_from_hex(*parent);
+            return Commit(object_id_from_hex(treeHash), author, message, timestamp, parent_id);
+        }))
+        .def_property_readonly("treeHash", [](const Commit& commit) {
+            return commit.treeHash.hex();
+        })
         .def_readonly("author", &Commit::author)
         .def_readonly("message", &Commit::message)
         .def_readonly("timestamp", &Commit::timestamp)
-        .def_readonly("parent", &Commit::parent);
+        .def_property_readonly("parent", [](const Commit& commit) -> std::optional<std::string> {
+            if (!commit.parent)
+                return std::nullopt;
+            return commit.parent->hex();
+        });
 }
\ No newline at end of file
@@ -1,24 +1,88 @@
 #include "caf.h"
+#include "compression.h"
+#include "pack.h"
+#include "chunking.h"
+#include "object_id.h"
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
 #include <errno.h>
+#include <ctype.h>
 #include <sys/types.h>
 #include <sys/stat.h>
 #include <fcntl.h>
 #include <linux/limits.h>
 #include <sys/file.h>
+#include <sys/mman.h>
+#include <sys/ioctl.h>
+#include <sys/sendfile.h>
+#include <dirent.h>
+#include <linux/fs.h>
 #include <openssl/evp.h>
 #include <time.h>
 #include <tuple>
+#include <atomic>
+#include <chrono>
+#include <thread>
+#include <algorithm>
+#include <mutex>
+#include <unordered_map>
+#include <vector>
+#include <set>
+#include <optional>
 #include <iostream>
+#include <fstream>
 
 #define BUFFER_SIZE 4096
+#define INGEST_BUFFER_SIZE (1 << 20)
 #define DIR_NAME_SIZE 2
+#define TEMP_PREFIX ".tmp-"
+#define STORE_CONFIG_FILE "config"
+#define DEFAULT_LOCK_TIMEOUT_MS 10000
+#define PUBLISH_ATTEMPTS 5
+
+constexpr std::chrono::microseconds LOCK_MIN_BACKOFF(50);
+constexpr std::chrono::microseconds LOCK_MAX_BACKOFF(10000);
 
 std::string create_sub_dir(const std::string& content_root_dir, const std::string& hash);
-void lock_file_with_timeout(int fd, int operation, int timeout_sec);
-void copy_file(const std::string& src, const std::string& dest);
+void record_lock_wait(std::chrono::steady_clock::duration waited);
+void publish_content(const std::string& content_root_dir, const std::string& hash, const std::string& temp_path);
+std::string copy_and_hash(int src_fd, ObjectWriter& writer, std::vector<unsigned char>& buffer, size_t prefilled);
+void compress_temp_content(const std::string& content_root_dir, std::string& temp_path);
+std::string store_config_path(const std::string& content_root_dir);
+int open_packed_object(const std::string& content_root_dir, const PackedObject& packed);
+int open_stored_content(const std::string& content_root_dir, const std::string& content_hash);
+int assemble_chunks(const std::string& content_root_dir, const std::vector<ChunkRef>& chunks);
+void copy_fd_contents(int src_fd, int dest_fd, uint64_t size);
+Blob save_chunked_content(const std::string& content_root_dir, int src_fd, bool compressed);
+std::optional<Blob> save_file_by_clone(const std::string& content_root_dir, int src_fd);
+std::string hash_fd(int fd, size_t size);
+
+// A temporary object opened by open_content_for_saving and not yet published
+struct PendingContent {
+    std::string root_dir;
+    std::string hash;
+    std::string temp_path;
+};
+
+PendingContent take_pending_content(int fd);
+std::string content_object_path(const std::string& content_root_dir, const std::string& hash);
+
+std::string trim(const std::string& value) {
+    size_t start = value.find_first_not_of(" \t\r");
+    size_t end = value.find_last_not_of(" \t\r");
+    return start == std::string::npos ? "" : value.substr(start, end - start + 1);
+}
+
+static std::mutex config_mutex;
+static std::unordered_map<std::string, std::pair<int64_t, StoreConfig>> config_cache;
+static std::mutex pending_mutex;
+static std::unordered_map<int, PendingContent> pending_contents;
+static std::atomic<uint64_t> written_objects{0};
+static std::atomic<uint64_t> skipped_writes{0};
+static std::atomic<uint64_t> lock_waits{0};
+static std::atomic<uint64_t> lock_wait_ns{0};
+static std::atomic<int> lock_timeout_ms{DEFAULT_LOCK_TIMEOUT_MS};
 void create_content_path(const std::string& content_root_dir, const std::string& hash, std::string& output_path, size_t output_size);
 
 std::string hash_file(const std::string& filename){
@@ -60,18 +124,17 @@ std::string hash_file(const std::string& filename){
 
     EVP_MD_CTX_free(mdctx);
 
-    std::string output;
-    output.reserve(hash_len * 2);
-    for (unsigned int i = 0; i < hash_len; ++i) {
-        char hex[3];
-        sprintf(hex, "%02x", hash[i]);
-        output.append(hex);
-    }
+    std::string output(hash_len * 2, '\0');
+    encode_hex(hash, hash_len, &output[0]);
 
     return output;
 }
 
 std::string hash_string(const std::string& content){
+    return hash_bytes(content.data(), content.size());
+}
+
+std::string hash_bytes(const void* data, size_t size){
     unsigned char hash[HASH_SIZE + 1] = {0};
     EVP_MD_CTX* mdctx = EVP_MD_CTX_new();
 
@@ -84,7 +147,7 @@ std::string hash_string(const std::string& content){
         throw std::runtime_error("Failed to initialize digest");
     }
 
-    if (EVP_DigestUpdate(mdctx, content.c_str(), content.size()) != 1) {
+    if (EVP_DigestUpdate(mdctx, data, size) != 1) {
         EVP_MD_CTX_free(mdctx);
         throw std::runtime_error("Failed to update digest");
     }
@@ -97,13 +160,8 @@ std::string hash_string(const std::string& content){
 
     EVP_MD_CTX_free(mdctx);
 
-    std::string output;
-    output.reserve(hash_len * 2);
-    for (unsigned int i = 0; i < hash_len; ++i) {
-        char hex[3];
-        snprintf(hex, sizeof(hex), "%02x", hash[i]);
-        output.append(hex);
-    }
+    std::string output(hash_len * 2, '\0');
+    encode_hex(hash, hash_len, &output[0]);
 
     return output;
 }
@@ -112,36 +170,354 @@ Blob save_file_content(const std::string& content_root_dir, const std::string& f
     if (mkdir(content_root_dir.c_str(), 0755) != 0 && errno != EEXIST)
         throw std::runtime_error("Failed to create root directory");
 
-    std::string file_hash = hash_file(file_path);
+    int src_fd = open(file_path.c_str(), O_RDONLY);
+    if (src_fd < 0)
+        throw std::runtime_error("Failed to open file");
+
+    std::vector<unsigned char> buffer(INGEST_BUFFER_SIZE);
+    size_t head_size;
+    try {
+        head_size = read_full(src_fd, buffer.data(), buffer.size());
+    } catch (const std::exception& e) {
+        close(src_fd);
+        throw;
+    }
 
-    std::string content_path;
-    create_content_path(content_root_dir, file_hash, content_path, sizeof(content_path));
+    StoreConfig config = load_store_config(content_root_dir);
+    bool compressed = config.compression;
 
-    int fd = open(content_path.c_str(), O_WRONLY | O_CREAT, 0644);
+    // Small files fit in the buffer, so they are hashed before anything is written
+    if (head_size < buffer.size()) {
+        close(src_fd);
 
-    if (fd < 0)
-        throw std::runtime_error("Failed to open file");
+        std::string file_hash = hash_bytes(buffer.data(), head_size);
+        save_buffer_content(content_root_dir, file_hash, buffer.data(), head_size, compressed);
+        return Blob(ObjectId::parse(file_hash));
+    }
 
-    try{
-        lock_file_with_timeout(fd, LOCK_EX, 10);
-    } catch (const std::exception& e){
-        close(fd);
+    struct stat st;
+    if (config.chunking && fstat(src_fd, &st) == 0 && st.st_size >= CHUNKING_THRESHOLD) {
+        try {
+            if (lseek(src_fd, 0, SEEK_SET) != 0)
+                throw std::runtime_error("Failed to rewind file");
+            Blob blob = save_chunked_content(content_root_dir, src_fd, compressed);
+            close(src_fd);
+            return blob;
+        } catch (const std::exception& e) {
+            close(src_fd);
+            throw;
+        }
+    }
+
+    // Uncompressed objects are exact copies of the file, so a reflink can share its extents
+    if (!compressed && fstat(src_fd, &st) == 0 && S_ISREG(st.st_mode)) {
+        try {
+            std::optional<Blob> blob = save_file_by_clone(content_root_dir, src_fd);
+            if (blob) {
+                close(src_fd);
+                return *blob;
+            }
+        } catch (const std::exception& e) {
+            close(src_fd);
+            throw;
+        }
+    }
+
+    std::string temp_path;
+    int temp_fd;
+    try {
+        temp_fd = create_temp_content(content_root_dir, temp_path);
+    } catch (const std::exception& e) {
+        close(src_fd);
         throw;
     }
 
+    // Hash while writing to a temporary file, so the input is only read once
+    std::string file_hash;
+    try {
+        ObjectWriter writer(temp_fd, compressed);
+        file_hash = copy_and_hash(src_fd, writer, buffer, head_size);
+        writer.finish();
+    } catch (const std::exception& e) {
+        close(src_fd);
+        close(temp_fd);
+        unlink(temp_path.c_str());
+        throw;
+    }
+
+    close(src_fd);
+    close(temp_fd);
+
+    if (content_exists(content_root_dir, file_hash)) {
+        unlink(temp_path.c_str());
+        record_skipped_write();
+        return Blob(ObjectId::parse(file_hash));
+    }
+
+    publish_content(content_root_dir, file_hash, temp_path);
+    return Blob(ObjectId::parse(file_hash));
+}
+
+void save_buffer_content(const std::string& content_root_dir, const std::string& hash, const void* data, size_t size, bool compressed) {
+    if (content_exists(content_root_dir, hash)) {
+        record_skipped_write();
+        return;
+    }
+
+    std::string temp_path;
+    int temp_fd = create_temp_content(content_root_dir, temp_path);
     try {
-        copy_file(file_path, content_path);
+        ObjectWriter writer(temp_fd, compressed);
+        writer.write(data, size);
+        writer.finish();
+    } catch (const std::exception& e) {
+        close(temp_fd);
+        unlink(temp_path.c_str());
+        throw;
+    }
+    close(temp_fd);
+
+    publish_content(content_root_dir, hash, temp_path);
+}
+
+Blob save_chunked_content(const std::string& content_root_dir, int src_fd, bool compressed) {
+    // Chunks are stored as objects of their own, so unchanged parts of a
+    // large file are shared between its versions
+    std::vector<unsigned char> buffer(MAX_CHUNK_SIZE);
+    std::vector<ChunkRef> chunks;
+    StreamingHash file_hash;
+
+    size_t filled = 0;
+    bool at_end = false;
+    while (true) {
+        if (!at_end) {
+            filled += read_full(src_fd, buffer.data() + filled, buffer.size() - filled);
+            at_end = filled < buffer.size();
+        }
+        if (filled == 0)
+            break;
+
+        size_t chunk_size = find_chunk_boundary(buffer.data(), filled);
+        std::string chunk_hash = hash_bytes(buffer.data(), chunk_size);
+        file_hash.update(buffer.data(), chunk_size);
+        save_buffer_content(content_root_dir, chunk_hash, buffer.data(), chunk_size, compressed);
+        chunks.push_back(ChunkRef{chunk_hash, chunk_size});
+
+        memmove(buffer.data(), buffer.data() + chunk_size, filled - chunk_size);
+        filled -= chunk_size;
+    }
+
+    // The chunk list is stored under the hash of the whole content, like any other blob
+    std::string hash = file_hash.hex();
+    std::string list = encode_chunk_list(chunks);
+    save_buffer_content(content_root_dir, hash, list.data(), list.size(), compressed);
+    return Blob(ObjectId::parse(hash));
+}
+
+std::optional<Blob> save_file_by_clone(const std::string& content_root_dir, int src_fd) {
+    std::string temp_path;
+    int temp_fd = create_temp_content(content_root_dir, temp_path);
+
+    // The clone cannot change under us, so hashing it is the only pass over the data. Without
+    // reflinks, or for content that has to be encoded, the caller copies and hashes in one pass
+    std::string file_hash;
+    try {
+        struct stat st;
+        if (ioctl(temp_fd, FICLONE, src_fd) != 0 || is_compressed_object(temp_fd) || fstat(temp_fd, &st) != 0) {
+            close(temp_fd);
+            unlink(temp_path.c_str());
+            return std::nullopt;
+        }
+
+        file_hash = hash_fd(temp_fd, st.st_size);
+    } catch (const std::exception& e) {
+        close(temp_fd);
+        unlink(temp_path.c_str());
+        throw;
+    }
+    close(temp_fd);
+
+    if (content_exists(content_root_dir, file_hash)) {
+        unlink(temp_path.c_str());
+        record_skipped_write();
+        return Blob(ObjectId::parse(file_hash));
+    }
+
+    publish_content(content_root_dir, file_hash, temp_path);
+    return Blob(ObjectId::parse(file_hash));
+}
+
+void checkout_content(const std::string& content_root_dir, const std::string& content_hash, const std::string& dest_path) {
+    int src_fd = open_content_for_reading(content_root_dir, content_hash);
+
+    // The content goes to a temporary file beside the destination and is renamed over it,
+    // so a failed write never leaves a partial file behind
+    size_t slash = dest_path.rfind('/');
+    std::string temp_path = (slash == std::string::npos ? std::string() : dest_path.substr(0, slash + 1)) + TEMP_PREFIX + "XXXXXX";
+    int temp_fd = mkstemp(&temp_path[0]);
+    if (temp_fd < 0) {
+        close(src_fd);
+        throw std::runtime_error("Failed to create temporary file");
+    }
+
+    try {
+        struct stat st;
+        if (fstat(src_fd, &st) != 0)
+            throw std::runtime_error("Failed to stat object");
+        if (fchmod(temp_fd, 0644) != 0)
+            throw std::runtime_error("Failed to set file permissions");
+
+        // Loose objects are reflinked where the file system can share extents. Hardlinks are
+        // never used, an edit in the working tree would change the stored object with them
+        if (ioctl(temp_fd, FICLONE, src_fd) != 0)
+            copy_fd_contents(src_fd, temp_fd, st.st_size);
+
+        if (rename(temp_path.c_str(), dest_path.c_str()) != 0)
+            throw std::runtime_error(std::string("Failed to replace file: ") + strerror(errno));
+    } catch (const std::exception& e) {
+        close(src_fd);
+        close(temp_fd);
+        unlink(temp_path.c_str());
+        throw;
+    }
+
+    close(src_fd);
+    close(temp_fd);
+}
+
+std::string hash_fd(int fd, size_t size) {
+    void* data = mmap(nullptr, size, PROT_READ, MAP_PRIVATE, fd, 0);
+    if (data != MAP_FAILED) {
+        madvise(data, size, MADV_SEQUENTIAL);
+        try {
+            std::string hash = hash_bytes(data, size);
+            munmap(data, size);
+            return hash;
+        } catch (const std::exception& e) {
+            munmap(data, size);
+            throw;
+        }
+    }
+
+    StreamingHash hash;
+    std::vector<unsigned char> buffer(INGEST_BUFFER_SIZE);
+    for (off_t offset = 0; offset < static_cast<off_t>(size);) {
+        ssize_t bytes_read = pread(fd, buffer.data(), buffer.size(), offset);
+        if (bytes_read < 0 && errno == EINTR)
+            continue;
+        if (bytes_read <= 0)
+            throw std::runtime_error("Failed to read file");
+        hash.update(buffer.data(), bytes_read);
+        offset += bytes_read;
+    }
+
+    return hash.hex();
+}
+
+bool verify_content(const std::string& content_root_dir, const std::string& content_hash) {
+    int fd = open_content_for_reading(content_root_dir, content_hash);
+
+    // Objects are named by the hash of their plain content, so rehashing it in a stream checks them
+    try {
+        StreamingHash hash;
+        std::vector<unsigned char> buffer(INGEST_BUFFER_SIZE);
+        size_t bytes_read;
+        while ((bytes_read = read_full(fd, buffer.data(), buffer.size())) > 0)
+            hash.update(buffer.data(), bytes_read);
+
+        close(fd);
+        return hash.hex() == content_hash;
     } catch (const std::exception& e) {
-        unlink(content_path.c_str());
-        flock(fd, LOCK_UN);
         close(fd);
         throw;
     }
+}
 
-    flock(fd, LOCK_UN);
-    close(fd);
+std::vector<std::string> list_objects(const std::string& content_root_dir) {
+    std::vector<std::string> packed = list_packed_objects(content_root_dir);
+    std::set<std::string> hashes(packed.begin(), packed.end());
+
+    DIR* root = opendir(content_root_dir.c_str());
+    if (!root)
+        throw std::runtime_error("Failed to read objects directory");
+
+    struct dirent* sub_entry;
+    while ((sub_entry = readdir(root)) != nullptr) {
+        std::string sub_name = sub_entry->d_name;
+        if (sub_name.size() != DIR_NAME_SIZE || !isxdigit(sub_name[0]) || !isxdigit(sub_name[1]))
+            continue;
+
+        DIR* sub = opendir((content_root_dir + "/" + sub_name).c_str());
+        if (!sub)
+            continue;
+
+        struct dirent* entry;
+        while ((entry = readdir(sub)) != nullptr) {
+            std::string name = entry->d_name;
+            ObjectId id;
+            if (name.compare(0, DIR_NAME_SIZE, sub_name) == 0 && ObjectId::from_hex(name, id))
+                hashes.insert(name);
+        }
+        closedir(sub);
+    }
+    closedir(root);
+
+    return std::vector<std::string>(hashes.begin(), hashes.end());
+}
+
+StreamingHash::StreamingHash() : mdctx(EVP_MD_CTX_new()) {
+    if (!mdctx)
+        throw std::runtime_error("Failed to create EVP_MD_CTX");
+
+    if (EVP_DigestInit_ex(mdctx, EVP_sha1(), nullptr) != 1) {
+        EVP_MD_CTX_free(mdctx);
+        throw std::runtime_error("Failed to initialize digest");
+    }
+}
+
+StreamingHash::~StreamingHash() {
+    EVP_MD_CTX_free(mdctx);
+}
+
+void StreamingHash::update(const void* data, size_t size) {
+    if (EVP_DigestUpdate(mdctx, data, size) != 1)
+        throw std::runtime_error("Failed to update digest");
+}
+
+std::string StreamingHash::hex() {
+    unsigned char hash[EVP_MAX_MD_SIZE];
+    unsigned int hash_len;
+    if (EVP_DigestFinal_ex(mdctx, hash, &hash_len) != 1)
+        throw std::runtime_error("Failed to finalize digest");
+
+    std::string output(hash_len * 2, '\0');
+    encode_hex(hash, hash_len, &output[0]);
+
+    return output;
+}
+
+bool content_exists(const std::string& content_root_dir, const std::string& content_hash) {
+    PackedObject packed;
+    if (find_packed_object(content_root_dir, content_hash, packed))
+        return true;
 
-    return Blob(file_hash);
+    struct stat st;
+    return stat(content_object_path(content_root_dir, content_hash).c_str(), &st) == 0;
+}
+
+StoreStats get_store_stats() {
+    return StoreStats{written_objects.load(), skipped_writes.load(), lock_waits.load(), lock_wait_ns.load()};
+}
+
+void record_skipped_write() {
+    skipped_writes++;
+}
+
+void reset_store_stats() {
+    written_objects = 0;
+    skipped_writes = 0;
+    lock_waits = 0;
+    lock_wait_ns = 0;
 }
 
 int open_content_for_saving(const std::string& content_root_dir, const std::string& content_hash){
@@ -149,28 +525,60 @@ int open_content_for_saving(const std::string& content_root_dir, const std::stri
         throw std::runtime_error("Failed to create root directory");
     }
 
-    std::string content_path;
-    create_content_path(content_root_dir, content_hash, content_path, sizeof(content_path));
+    if (content_root_dir.empty() || content_hash.length() < 2)
+        throw std::invalid_argument("Invalid argument");
 
-    int fd = open(content_path.c_str(), O_WRONLY|O_CREAT, 0644);
+    // Writers fill a private temporary file that is only renamed into place
+    // by close_content_for_saving, so readers never observe partial objects
+    std::string temp_path;
+    int fd = create_temp_content(content_root_dir, temp_path);
 
-    if (fd < 0) {
-        throw std::runtime_error("Failed to open file");
-    }
+    std::lock_guard<std::mutex> guard(pending_mutex);
+    pending_contents[fd] = PendingContent{content_root_dir, content_hash, temp_path};
 
-    try{
-        lock_file_with_timeout(fd, LOCK_EX, 10);
-    } catch (const std::exception& e){
+    return fd;
+}
+
+void close_content_for_saving(int fd) {
+    PendingContent pending = take_pending_content(fd);
+
+    bool looks_compressed;
+    try {
+        looks_compressed = is_compressed_object(fd);
+    } catch (const std::exception& e) {
         close(fd);
+        unlink(pending.temp_path.c_str());
         throw;
     }
 
-    return fd;
+    if (close(fd) != 0) {
+        unlink(pending.temp_path.c_str());
+        throw std::runtime_error("Failed to close file");
+    }
+
+    if (content_exists(pending.root_dir, pending.hash)) {
+        unlink(pending.temp_path.c_str());
+        record_skipped_write();
+        return;
+    }
+
+    // Callers write plain content, which is encoded here for compressed stores
+    // and whenever it starts like a compressed object
+    if (looks_compressed || load_store_config(pending.root_dir).compression)
+        compress_temp_content(pending.root_dir, pending.temp_path);
+
+    publish_content(pending.root_dir, pending.hash, pending.temp_path);
+}
+
+void discard_content_for_saving(int fd) {
+    PendingContent pending = take_pending_content(fd);
+
+    close(fd);
+    unlink(pending.temp_path.c_str());
 }
 
 void delete_content(const std::string& content_root_dir, const std::string& content_hash) {
-    std::string content_path;
-    create_content_path(content_root_dir, content_hash, content_path, sizeof(content_path));
+    std::string content_path = content_object_path(content_root_dir, content_hash);
 
     int fd = open(content_path.c_str(), O_RDONLY);
     if (fd < 0)
@@ -181,7 +589,7 @@ void delete_content(const std::string& content_root_dir, const std::string& cont
     }
 
     try{
-            lock_file_with_timeout(fd, LOCK_EX, 10);
+            lock_file_with_timeout(fd, LOCK_EX, get_lock_timeout_ms());
         } catch (const std::exception& e){
             close(fd);
             throw;
@@ -195,57 +603,424 @@ void delete_content(const std::string& content_root_dir, const std::string& cont
 }
 
 int open_content_for_reading(const std::string& content_root_dir, const std::string& content_hash){
-    std::string content_path;
-    create_content_path(content_root_dir, content_hash, content_path, sizeof(content_path));
+    int fd = open_stored_content(content_root_dir, content_hash);
 
-    int fd = open(content_path.c_str(), O_RDONLY);
+    try {
+        unsigned char header[CHUNK_LIST_MAGIC_SIZE];
+        ssize_t bytes_read = pread(fd, header, sizeof(header), 0);
+        if (bytes_read < 0)
+            throw std::runtime_error("Failed to read object header");
+        if (static_cast<size_t>(bytes_read) < sizeof(header) || memcmp(header, CHUNK_LIST_MAGIC, sizeof(header)) != 0)
+            return fd;
 
-    if (fd < 0)
+        struct stat st;
+        if (fstat(fd, &st) != 0)
+            throw std::runtime_error("Failed to read object");
+
+        std::vector<unsigned char> list(st.st_size);
+        if (pread(fd, list.data(), list.size(), 0) != st.st_size)
+            throw std::runtime_error("Failed to read object");
+
+        // Content that merely starts like a chunk list is returned as it is. A chunk list is
+        // stored under the hash of the content it describes, so content stored under its own
+        // hash is a blob that happens to look like one
+        std::vector<ChunkRef> chunks;
+        if (!decode_chunk_list(list.data(), list.size(), chunks) || hash_bytes(list.data(), list.size()) == content_hash)
+            return fd;
+
+        int assembled_fd = assemble_chunks(content_root_dir, chunks);
+        close(fd);
+        return assembled_fd;
+    } catch (const std::exception& e) {
+        close(fd);
+        throw;
+    }
+}
+
+int assemble_chunks(const std::string& content_root_dir, const std::vector<ChunkRef>& chunks) {
+    int fd = create_plain_content(content_root_dir);
+
+    try {
+        for (const auto& chunk : chunks) {
+            int chunk_fd = open_stored_content(content_root_dir, chunk.hash);
+            try {
+                copy_fd_contents(chunk_fd, fd, chunk.size);
+            } catch (const std::exception& e) {
+                close(chunk_fd);
+                throw;
+            }
+            close(chunk_fd);
+        }
+    } catch (const std::exception& e) {
+        close(fd);
+        throw;
+    }
+
+    lseek(fd, 0, SEEK_SET);
+    return fd;
+}
+
+void copy_fd_contents(int src_fd, int dest_fd, uint64_t size) {
+    // copy_file_range lets the kernel share or copy extents without a round trip through
+    // user space. sendfile covers kernels that refuse it across file systems
+    loff_t offset = 0;
+    bool use_sendfile = false;
+    while (offset < static_cast<loff_t>(size)) {
+        ssize_t copied = use_sendfile ? sendfile(dest_fd, src_fd, &offset, size - offset)
+                                      : copy_file_range(src_fd, &offset, dest_fd, nullptr, size - offset, 0);
+        if (copied > 0)
+            continue;
+        if (copied == 0)
+            throw std::runtime_error("Object is shorter than expected");
+        if (errno == EINTR)
+            continue;
+        if (errno != EXDEV && errno != EINVAL && errno != ENOSYS && errno != EOPNOTSUPP)
+            throw std::runtime_error("Failed to copy object");
+        if (use_sendfile)
+            break;
+        use_sendfile = true;
+    }
+
+    std::vector<unsigned char> buffer(INGEST_BUFFER_SIZE);
+    while (offset < static_cast<loff_t>(size)) {
+        ssize_t bytes_read = pread(src_fd, buffer.data(), std::min<uint64_t>(buffer.size(), size - offset), offset);
+        if (bytes_read < 0 && errno == EINTR)
+            continue;
+        if (bytes_read < 0)
+            throw std::runtime_error("Failed to read object");
+        if (bytes_read == 0)
+            throw std::runtime_error("Object is shorter than expected");
+
+        write_all(dest_fd, buffer.data(), bytes_read);
+        offset += bytes_read;
+    }
+
+    struct stat st;
+    if (fstat(src_fd, &st) != 0 || static_cast<uint64_t>(st.st_size) != size)
+        throw std::runtime_error("Object size changed while copying");
+}
+
+int open_stored_content(const std::string& content_root_dir, const std::string& content_hash) {
+    // Packs are searched before loose objects. When both miss, the packs are
+    // searched again in case a concurrent repack just moved the object
+    PackedObject packed;
+    if (find_packed_object(content_root_dir, content_hash, packed))
+        return open_packed_object(content_root_dir, packed);
+
+    // Objects are immutable once renamed into place, so readers need no lock
+    int fd = open(content_object_path(content_root_dir, content_hash).c_str(), O_RDONLY);
+
+    if (fd < 0) {
+        if (errno == ENOENT && find_packed_object(content_root_dir, content_hash, packed, true))
+            return open_packed_object(content_root_dir, packed);
         throw std::runtime_error("Failed to open file");
+    }
 
-    try{
-        lock_file_with_timeout(fd, LOCK_EX, 10);
-    } catch (const std::exception& e){
+    try {
+        if (!is_compressed_object(fd))
+            return fd;
+    } catch (const std::exception& e) {
         close(fd);
         throw;
     }
 
+    // Compressed objects are inflated into an unnamed file so callers see plain content
+    int plain_fd = create_plain_content(content_root_dir);
+
+    try {
+        inflate_object(fd, plain_fd);
+    } catch (const std::exception& e) {
+        close(fd);
+        close(plain_fd);
+        throw;
+    }
+
+    close(fd);
+    lseek(plain_fd, 0, SEEK_SET);
+    return plain_fd;
+}
+
+int create_plain_content(const std::string& content_root_dir) {
+    // Plain content is rebuilt in an unnamed file on the store's file system, so large objects
+    // are backed by disk rather than memory. Without O_TMPFILE a temporary file is unlinked at once
+    int fd = open(content_root_dir.c_str(), O_TMPFILE | O_RDWR | O_CLOEXEC, 0600);
+    if (fd >= 0)
+        return fd;
+
+    std::string temp_path;
+    fd = create_temp_content(content_root_dir, temp_path);
+    unlink(temp_path.c_str());
     return fd;
 }
 
-void copy_file(const std::string& src, const std::string& dest) {
-    FILE* source_file = fopen(src.c_str(), "rb");
-    if (!source_file)
-        throw std::runtime_error("Failed to open source file");
+int open_packed_object(const std::string& content_root_dir, const PackedObject& packed) {
+    int fd = create_plain_content(content_root_dir);
 
-    FILE *dest_file = fopen(dest.c_str(), "wb");
-    if (!dest_file)
-    {
-        fclose(source_file);
-        throw std::runtime_error("Failed to open destination file");
+    try {
+        write_packed_object(packed, fd);
+    } catch (const std::exception& e) {
+        close(fd);
+        throw;
     }
 
-    unsigned char buffer[BUFFER_SIZE];
-    size_t bytes_read;
+    lseek(fd, 0, SEEK_SET);
+    return fd;
+}
+
+StoreConfig load_store_config(const std::string& content_root_dir) {
+    std::string config_path = store_config_path(content_root_dir);
+
+    struct stat st;
+    if (stat(config_path.c_str(), &st) != 0) {
+        if (errno == ENOENT)
+            return StoreConfig();
+        throw std::runtime_error("Failed to read store configuration");
+    }
 
-    while ((bytes_read = fread(buffer, 1, BUFFER_SIZE, source_file)) > 0)
+    // The configuration is consulted on every write, so parsed copies are
+    // cached until the file changes
     {
-        if (fwrite(buffer, 1, bytes_read, dest_file) != bytes_read)
-        {
-            fclose(source_file);
-            fclose(dest_file);
+        std::lock_guard<std::mutex> guard(config_mutex);
+        auto it = config_cache.find(config_path);
+        if (it != config_cache.end() && it->second.first == st.st_mtim.tv_sec * 1000000000LL + st.st_mtim.tv_nsec)
+            return it->second.second;
+    }
+
+    std::ifstream config_file(config_path);
+    if (!config_file)
+        throw std::runtime_error("Failed to read store configuration");
+
+    StoreConfig config;
+    std::string line;
+    while (std::getline(config_file, line)) {
+        size_t separator = line.find('=');
+        if (separator == std::string::npos)
+            continue;
+
+        std::string key = trim(line.substr(0, separator));
+        std::string value = trim(line.substr(separator + 1));
+
+        if (key == "compression") {
+            if (value == "zlib")
+                config.compression = true;
+            else if (value == "none")
+                config.compression = false;
+            else
+                throw std::runtime_error("Unknown compression in store configuration: " + value);
+        } else if (key == "chunking") {
+            if (value == "cdc")
+                config.chunking = true;
+            else if (value == "none")
+                config.chunking = false;
+            else
+                throw std::runtime_error("Unknown chunking in store configuration: " + value);
+        }
+    }
+
+    std::lock_guard<std::mutex> guard(config_mutex);
+    config_cache[config_path] = {st.st_mtim.tv_sec * 1000000000LL + st.st_mtim.tv_nsec, config};
+    return config;
+}
+
+void save_store_config(const std::string& content_root_dir, const StoreConfig& config) {
+    if (mkdir(content_root_dir.c_str(), 0755) != 0 && errno != EEXIST)
+        throw std::runtime_error("Failed to create root directory");
+
+    std::string contents = std::string("compression = ") + (config.compression ? "zlib" : "none") + "\n" +
+                           "chunking = " + (config.chunking ? "cdc" : "none") + "\n";
+
+    std::string temp_path;
+    int fd = create_temp_content(content_root_dir, temp_path);
+    try {
+        write_all(fd, contents.data(), contents.size());
+    } catch (const std::exception& e) {
+        close(fd);
+        unlink(temp_path.c_str());
+        throw;
+    }
+    close(fd);
+
+    if (rename(temp_path.c_str(), store_config_path(content_root_dir).c_str()) != 0) {
+        unlink(temp_path.c_str());
+        throw std::runtime_error("Failed to write store configuration");
+    }
+
+    std::lock_guard<std::mutex> guard(config_mutex);
+    config_cache.erase(store_config_path(content_root_dir));
+}
+
+std::string store_config_path(const std::string& content_root_dir) {
+    if (content_root_dir.empty())
+        throw std::invalid_argument("Invalid argument");
+
+    return content_root_dir + "/" + STORE_CONFIG_FILE;
+}
+
+void compress_temp_content(const std::string& content_root_dir, std::string& temp_path) {
+    int plain_fd = open(temp_path.c_str(), O_RDONLY);
+    if (plain_fd < 0) {
+        unlink(temp_path.c_str());
+        throw std::runtime_error("Failed to open file");
+    }
+
+    std::string compressed_path;
+    int compressed_fd;
+    try {
+        compressed_fd = create_temp_content(content_root_dir, compressed_path);
+    } catch (const std::exception& e) {
+        close(plain_fd);
+        unlink(temp_path.c_str());
+        throw;
+    }
+
+    try {
+        std::vector<unsigned char> buffer(INGEST_BUFFER_SIZE);
+        ObjectWriter writer(compressed_fd, true);
+
+        size_t bytes_read;
+        while ((bytes_read = read_full(plain_fd, buffer.data(), buffer.size())) > 0)
+            writer.write(buffer.data(), bytes_read);
+        writer.finish();
+    } catch (const std::exception& e) {
+        close(plain_fd);
+        close(compressed_fd);
+        unlink(temp_path.c_str());
+        unlink(compressed_path.c_str());
+        throw;
+    }
+
+    close(plain_fd);
+    close(compressed_fd);
+    unlink(temp_path.c_str());
+    temp_path = compressed_path;
+}
+
+int create_temp_content(const std::string& content_root_dir, std::string& temp_path) {
+    temp_path = content_root_dir + "/" + TEMP_PREFIX + "XXXXXX";
+
+    int fd = mkstemp(&temp_path[0]);
+    if (fd < 0)
+        throw std::runtime_error("Failed to create temporary file");
+
+    if (fchmod(fd, 0644) != 0) {
+        close(fd);
+        unlink(temp_path.c_str());
+        throw std::runtime_error("Failed to set temporary file permissions");
+    }
+
+    return fd;
+}
+
+PendingContent take_pending_content(int fd) {
+    std::lock_guard<std::mutex> guard(pending_mutex);
+
+    auto it = pending_contents.find(fd);
+    if (it == pending_contents.end())
+        throw std::invalid_argument("File descriptor was not opened for saving");
+
+    PendingContent pending = it->second;
+    pending_contents.erase(it);
+    return pending;
+}
+
+void publish_content(const std::string& content_root_dir, const std::string& hash, const std::string& temp_path) {
+    try {
+        std::string content_path;
+        create_content_path(content_root_dir, hash, content_path, sizeof(content_path));
+
+        // A repack may remove the emptied fan-out directory between creating and renaming into it
+        int attempts = 1;
+        while (rename(temp_path.c_str(), content_path.c_str()) != 0) {
+            if (errno != ENOENT || access(temp_path.c_str(), F_OK) != 0 || attempts++ == PUBLISH_ATTEMPTS)
+                throw std::runtime_error("Failed to store content");
+            create_content_path(content_root_dir, hash, content_path, sizeof(content_path));
+        }
+    } catch (const std::exception& e) {
+        unlink(temp_path.c_str());
+        throw;
+    }
+
+    written_objects++;
+}
+
+size_t read_full(int fd, void* data, size_t size) {
+    char* ptr = static_cast<char*>(data);
+    size_t total = 0;
+
+    while (total < size) {
+        ssize_t bytes_read = read(fd, ptr + total, size - total);
+        if (bytes_read < 0) {
+            if (errno == EINTR)
+                continue;
+            throw std::runtime_error("Failed to read source file");
+        }
+        if (bytes_read == 0)
+            break;
+        total += bytes_read;
+    }
+
+    return total;
+}
+
+void write_all(int fd, const void* data, size_t size) {
+    const char* ptr = static_cast<const char*>(data);
+
+    while (size > 0) {
+        ssize_t written = write(fd, ptr, size);
+        if (written < 0) {
+            if (errno == EINTR)
+                continue;
             throw std::runtime_error("Failed to write to destination file");
         }
+        ptr += written;
+        size -= written;
+    }
+}
+
+std::string copy_and_hash(int src_fd, ObjectWriter& writer, std::vector<unsigned char>& buffer, size_t prefilled) {
+    EVP_MD_CTX *mdctx = EVP_MD_CTX_new();
+    if (!mdctx)
+        throw std::runtime_error("Failed to create EVP_MD_CTX");
 
-        if (ferror(dest_file))
-        {
-            fclose(source_file);
-            fclose(dest_file);
-            throw std::runtime_error("Error while writing to destination file");
+    if (EVP_DigestInit_ex(mdctx, EVP_sha1(), nullptr) != 1) {
+        EVP_MD_CTX_free(mdctx);
+        throw std::runtime_error("Failed to initialize digest");
+    }
+
+    try {
+        size_t bytes_read = prefilled;
+        while (bytes_read > 0) {
+            if (EVP_DigestUpdate(mdctx, buffer.data(), bytes_read) != 1)
+                throw std::runtime_error("Failed to update digest");
+
+            writer.write(buffer.data(), bytes_read);
+            bytes_read = read_full(src_fd, buffer.data(), buffer.size());
         }
+    } catch (const std::exception& e) {
+        EVP_MD_CTX_free(mdctx);
+        throw;
     }
-    fclose(source_file);
-    fclose(dest_file);
+
+    unsigned char hash[EVP_MAX_MD_SIZE];
+    unsigned int hash_len;
+    if (EVP_DigestFinal_ex(mdctx, hash, &hash_len) != 1) {
+        EVP_MD_CTX_free(mdctx);
+        throw std::runtime_error("Failed to finalize digest");
+    }
+
+    EVP_MD_CTX_free(mdctx);
+
+    std::string output(hash_len * 2, '\0');
+    encode_hex(hash, hash_len, &output[0]);
+
+    return output;
+}
+
+std::string content_object_path(const std::string& content_root_dir, const std::string& hash) {
+    if (content_root_dir.empty() || hash.length() < 2)
+        throw std::invalid_argument("Invalid argument");
+
+    return content_root_dir + "/" + hash.substr(0, DIR_NAME_SIZE) + "/" + hash;
 }
 
 void create_content_path(const std::string& content_root_dir, const std::string& hash, std::string& output_path, size_t output_size) {
@@ -267,18 +1042,46 @@ std::string create_sub_dir(const std::string& content_root_dir, const std::strin
     return sub_dir_path;
 }
 
-void lock_file_with_timeout(int fd, int operation, int timeout_sec){
-    time_t start_time = time(nullptr);
+void lock_file_with_timeout(int fd, int operation, int timeout_ms){
+    if (flock(fd, operation | LOCK_NB) == 0)
+        return;
+    if (errno != EWOULDBLOCK && errno != EINTR)
+        throw std::runtime_error("Failed to acquire lock");
 
-    while (flock(fd, operation | LOCK_NB) != 0)
-    {
-        if (errno == EWOULDBLOCK)
-        {
-            if (time(nullptr) - start_time >= timeout_sec)
-                throw std::runtime_error("Failed to acquire lock");
-            sleep(1);
-        }
-        else
+    // Contended: retry with exponential backoff until the deadline passes
+    auto start_time = std::chrono::steady_clock::now();
+    auto deadline = start_time + std::chrono::milliseconds(timeout_ms);
+    auto backoff = LOCK_MIN_BACKOFF;
+
+    while (flock(fd, operation | LOCK_NB) != 0) {
+        if (errno != EWOULDBLOCK && errno != EINTR)
+            throw std::runtime_error("Failed to acquire lock");
+
+        auto now = std::chrono::steady_clock::now();
+        if (now >= deadline) {
+            record_lock_wait(now - start_time);
             throw std::runtime_error("Failed to acquire lock");
+        }
+
+        std::this_thread::sleep_for(std::min<std::chrono::steady_clock::duration>(backoff, deadline - now));
+        backoff = std::min(backoff * 2, LOCK_MAX_BACKOFF);
     }
+
+    record_lock_wait(std::chrono::steady_clock::now() - start_time);
+}
+
+void record_lock_wait(std::chrono::steady_clock::duration waited) {
+    lock_waits++;
+    lock_wait_ns += std::chrono::duration_cast<std::chrono::nanoseconds>(waited).count();
+}
+
+int get_lock_timeout_ms() {
+    return lock_timeout_ms.load();
+}
+
+void set_lock_timeout_ms(int timeout_ms) {
+    if (timeout_ms < 0)
+        throw std::invalid_argument("Lock timeout must not be negative");
+
+    lock_timeout_ms = timeout_ms;
 }
@@ -3,16 +3,85 @@
 
 #include <unistd.h>
 #include <string>
+#include <vector>
 #include <cstddef>
+#include <cstdint>
+#include <openssl/evp.h>
 #include "Blob.h"
 
 #define HASH_SIZE 40
 
+// Integers in canonical objects, packs and pack indexes are stored little-endian whatever the host order
+template <typename T>
+void append_le(std::string& buffer, T value) {
+    uint64_t bits = static_cast<uint64_t>(value);
+    for (size_t i = 0; i < sizeof(T); ++i)
+        buffer.push_back(static_cast<char>((bits >> (8 * i)) & 0xff));
+}
+
+template <typename T>
+T load_le(const unsigned char* data) {
+    uint64_t value = 0;
+    for (size_t i = 0; i < sizeof(T); ++i)
+        value |= static_cast<uint64_t>(data[i]) << (8 * i);
+    return static_cast<T>(value);
+}
+
+// Counters describing object store write activity since the last reset
+struct StoreStats {
+    uint64_t written_objects;  // objects published to the store
+    uint64_t skipped_writes;   // writes skipped because the object already existed
+    uint64_t lock_waits;       // lock acquisitions that had to wait for another holder
+    uint64_t lock_wait_ns;     // total time spent waiting for contended locks
+};
+
+// Per-store settings, kept in a configuration file inside the content root
+struct StoreConfig {
+    bool compression = false;  // store new objects zlib-compressed
+    bool chunking = false;     // split large files into content-defined chunks
+};
+
+// Incremental SHA-1 over data arriving in pieces
+class StreamingHash {
+public:
+    StreamingHash();
+    ~StreamingHash();
+
+    StreamingHash(const StreamingHash&) = delete;
+    StreamingHash& operator=(const StreamingHash&) = delete;
+
+    void update(const void* data, size_t size);
+    std::string hex();
+
+private:
+    EVP_MD_CTX* mdctx;
+};
+
 std::string hash_file(const std::string& file_path);
 std::string hash_string(const std::string& content);
+std::string hash_bytes(const void* data, size_t size);
 Blob save_file_content(const std::string& content_root_dir, const std::string& file_path);
+void save_buffer_content(const std::string& content_root_dir, const std::string& hash, const void* data, size_t size, bool compressed);
 int open_content_for_saving(const std::string& content_root_dir, const std::string& content_hash);
+void close_content_for_saving(int fd);
+void discard_content_for_saving(int fd);
 void delete_content(const std::string& content_root_dir, const std::string& content_hash);
 int open_content_for_reading(const std::string& content_root_dir, const std::string& content_hash);
+void checkout_content(const std::string& content_root_dir, const std::string& content_hash, const std::string& dest_path);
+StoreConfig load_store_config(const std::string& content_root_dir);
+void save_store_config(const std::string& content_root_dir, const StoreConfig& config);
+bool content_exists(const std::string& content_root_dir, const std::string& content_hash);
+bool verify_content(const std::string& content_root_dir, const std::string& content_hash);
+std::vector<std::string> list_objects(const std::string& content_root_dir);
+void lock_file_with_timeout(int fd, int operation, int timeout_ms);
+int get_lock_timeout_ms();
+void set_lock_timeout_ms(int timeout_ms);
+StoreStats get_store_stats();
+void reset_store_stats();
+void record_skipped_write();
+int create_temp_content(const std::string& content_root_dir, std::string& temp_path);
+int create_plain_content(const std::string& content_root_dir);
+size_t read_full(int fd, void* data, size_t size);
+void write_all(int fd, const void* data, size_t size);
 
 #endif // CAF_H
\ No newline at end of file
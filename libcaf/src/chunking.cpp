@@ -0,0 +1,105 @@
+#include "chunking.h"
+#include "object_id.h"
+#include <string.h>
+#include <array>
+#include <algorithm>
+#include <stdexcept>
+
+#define CHUNK_LIST_VERSION 1
+#define BOUNDARY_MASK ((1ULL << 20) - 1)  // about one boundary per MiB past the minimum size
+#define GEAR_WINDOW 64
+
+constexpr size_t CHUNK_LIST_HEADER_SIZE = CHUNK_LIST_MAGIC_SIZE + sizeof(uint32_t) + sizeof(uint64_t) + sizeof(uint32_t);
+constexpr size_t CHUNK_LIST_ENTRY_SIZE = OBJECT_ID_SIZE + sizeof(uint64_t);
+
+std::array<uint64_t, 256> make_gear_table();
+
+// Random values per byte for the gear hash. They are generated from a fixed
+// seed because boundaries must never change between versions of the store
+static const std::array<uint64_t, 256> gear_table = make_gear_table();
+
+std::array<uint64_t, 256> make_gear_table() {
+    std::array<uint64_t, 256> table;
+    uint64_t state = 0x9e3779b97f4a7c15ULL;
+    for (auto& value : table) {
+        state += 0x9e3779b97f4a7c15ULL;
+        uint64_t mixed = state;
+        mixed = (mixed ^ (mixed >> 30)) * 0xbf58476d1ce4e5b9ULL;
+        mixed = (mixed ^ (mixed >> 27)) * 0x94d049bb133111ebULL;
+        value = mixed ^ (mixed >> 31);
+    }
+    return table;
+}
+
+size_t find_chunk_boundary(const unsigned char* data, size_t size) {
+    if (size <= MIN_CHUNK_SIZE)
+        return size;
+
+    size_t limit = std::min<size_t>(size, MAX_CHUNK_SIZE);
+
+    // Each shift drops the oldest byte, so the hash only depends on the last
+    // GEAR_WINDOW bytes and warming up just before the minimum size is enough
+    uint64_t hash = 0;
+    for (size_t i = MIN_CHUNK_SIZE - GEAR_WINDOW; i < limit; ++i) {
+        hash = (hash << 1) + gear_table[data[i]];
+        if (i >= MIN_CHUNK_SIZE && (hash & BOUNDARY_MASK) == 0)
+            return i + 1;
+    }
+
+    return limit;
+}
+
+std::string encode_chunk_list(const std::vector<ChunkRef>& chunks) {
+    uint32_t version = CHUNK_LIST_VERSION;
+    uint32_t count = chunks.size();
+    uint64_t total_size = 0;
+    for (const auto& chunk : chunks)
+        total_size += chunk.size;
+
+    std::string list(reinterpret_cast<const char*>(CHUNK_LIST_MAGIC), CHUNK_LIST_MAGIC_SIZE);
+    list.append(reinterpret_cast<const char*>(&version), sizeof(version));
+    list.append(reinterpret_cast<const char*>(&total_size), sizeof(total_size));
+    list.append(reinterpret_cast<const char*>(&count), sizeof(count));
+
+    for (const auto& chunk : chunks) {
+        ObjectId id;
+        if (!ObjectId::from_hex(chunk.hash, id))
+            throw std::runtime_error("Invalid chunk hash: " + chunk.hash);
+        list.append(reinterpret_cast<const char*>(id.data()), OBJECT_ID_SIZE);
+        list.append(reinterpret_cast<const char*>(&chunk.size), sizeof(chunk.size));
+    }
+
+    return list;
+}
+
+bool decode_chunk_list(const unsigned char* data, size_t size, std::vector<ChunkRef>& chunks) {
+    if (size < CHUNK_LIST_HEADER_SIZE || memcmp(data, CHUNK_LIST_MAGIC, CHUNK_LIST_MAGIC_SIZE) != 0)
+        return false;
+
+    uint32_t version, count;
+    uint64_t total_size;
+    const unsigned char* header = data + CHUNK_LIST_MAGIC_SIZE;
+    memcpy(&version, header, sizeof(version));
+    memcpy(&total_size, header + sizeof(version), sizeof(total_size));
+    memcpy(&count, header + sizeof(version) + sizeof(total_size), sizeof(count));
+
+    if (version != CHUNK_LIST_VERSION || size != CHUNK_LIST_HEADER_SIZE + static_cast<size_t>(count) * CHUNK_LIST_ENTRY_SIZE)
+        return false;
+
+    std::vector<ChunkRef> decoded;
+    decoded.reserve(count);
+    uint64_t decoded_size = 0;
+
+    for (const unsigned char* entry = data + CHUNK_LIST_HEADER_SIZE; entry < data + size; entry += CHUNK_LIST_ENTRY_SIZE) {
+        ChunkRef chunk{ObjectId::from_bytes(entry).hex(), 0};
+        memcpy(&chunk.size, entry + OBJECT_ID_SIZE, sizeof(chunk.size));
+        decoded_size += chunk.size;
+        decoded.push_back(std::move(chunk));
+    }
+
+    if (decoded_size != total_size)
+        return false;
+
+    chunks = std::move(decoded);
+    return true;
+}
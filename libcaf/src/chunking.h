@@ -0,0 +1,31 @@
+#ifndef CHUNKING_H
+#define CHUNKING_H
+
+#include <string>
+#include <vector>
+#include <cstddef>
+#include <cstdint>
+
+// Header of a chunk-list object, which describes a large blob as a sequence of chunk objects
+constexpr unsigned char CHUNK_LIST_MAGIC[] = {0x89, 'C', 'A', 'F', 'L', '\r', '\n', 0x1a};
+constexpr size_t CHUNK_LIST_MAGIC_SIZE = sizeof(CHUNK_LIST_MAGIC);
+
+#define CHUNKING_THRESHOLD (8 << 20)  // files at least this large are chunked when chunking is enabled
+#define MIN_CHUNK_SIZE (256 << 10)
+#define MAX_CHUNK_SIZE (4 << 20)
+
+struct ChunkRef {
+    std::string hash;
+    uint64_t size;
+};
+
+// Returns the length of the first chunk of data, cutting where the rolling hash of the
+// content hits a boundary. With no boundary the whole of data is one chunk, so callers
+// pass MAX_CHUNK_SIZE bytes unless they reached the end of the input
+size_t find_chunk_boundary(const unsigned char* data, size_t size);
+
+std::string encode_chunk_list(const std::vector<ChunkRef>& chunks);
+// Returns false when data is not a well-formed chunk list
+bool decode_chunk_list(const unsigned char* data, size_t size, std::vector<ChunkRef>& chunks);
+
+#endif // CHUNKING_H
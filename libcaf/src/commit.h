@@ -4,16 +4,17 @@
 #include <string>
 #include <ctime> // For std::time_t
 #include <optional> // For std::optional
+#include "object_id.h"
 
 class Commit {
 public:
-    const std::string treeHash;  // Hash of the tree object
+    const ObjectId treeHash;     // Hash of the tree object
     const std::string author;    // Author of the commit
     const std::string message;   // Commit message
     const std::time_t timestamp; // Timestamp of the commit
-    const std::optional<std::string> parent; // Parent commit hash
+    const std::optional<ObjectId> parent; // Parent commit hash
 
-    Commit(const std::string& treeHash, const std::string& author, const std::string& message, std::time_t timestamp, std::optional<std::string> parent = std::nullopt):
+    Commit(const ObjectId& treeHash, const std::string& author, const std::string& message, std::time_t timestamp, std::optional<ObjectId> parent = std::nullopt):
             treeHash(treeHash), author(author), message(message), timestamp(timestamp), parent(parent) {}
 
 };
@@ -0,0 +1,189 @@
+#include "compression.h"
+#include "caf.h"
+#include <unistd.h>
+#include <errno.h>
+#include <string.h>
+#include <algorithm>
+#include <stdexcept>
+
+#define COMPRESSION_BUFFER_SIZE (1 << 16)
+
+ObjectWriter::ObjectWriter(int fd, bool compressed)
+    : fd(fd), compressed(false), deciding(!compressed), finished(false), stream() {
+    if (compressed)
+        start_compression();
+}
+
+ObjectWriter::~ObjectWriter() {
+    if (compressed)
+        deflateEnd(&stream);
+}
+
+void ObjectWriter::start_compression() {
+    if (deflateInit(&stream, Z_DEFAULT_COMPRESSION) != Z_OK)
+        throw std::runtime_error("Failed to initialize compression");
+
+    out_buffer.resize(COMPRESSION_BUFFER_SIZE);
+
+    try {
+        write_all(fd, COMPRESSED_MAGIC, COMPRESSED_MAGIC_SIZE);
+    } catch (const std::exception& e) {
+        deflateEnd(&stream);
+        throw;
+    }
+
+    compressed = true;
+}
+
+void ObjectWriter::write(const void* data, size_t size) {
+    if (finished)
+        throw std::logic_error("Object writer is already finished");
+
+    // Plain content is held back until its first bytes show whether it looks compressed
+    const unsigned char* bytes = static_cast<const unsigned char*>(data);
+    if (deciding) {
+        size_t taken = std::min(size, COMPRESSED_MAGIC_SIZE - head.size());
+        head.insert(head.end(), bytes, bytes + taken);
+        bytes += taken;
+        size -= taken;
+        if (head.size() < COMPRESSED_MAGIC_SIZE)
+            return;
+        write_head();
+    }
+
+    if (!compressed) {
+        write_all(fd, bytes, size);
+        return;
+    }
+
+    deflate_chunk(bytes, size, Z_NO_FLUSH);
+}
+
+void ObjectWriter::write_head() {
+    deciding = false;
+
+    if (has_compressed_header(head.data(), head.size())) {
+        start_compression();
+        deflate_chunk(head.data(), head.size(), Z_NO_FLUSH);
+    } else {
+        write_all(fd, head.data(), head.size());
+    }
+}
+
+void ObjectWriter::finish() {
+    if (finished)
+        return;
+
+    if (deciding)
+        write_head();
+    if (compressed)
+        deflate_chunk(nullptr, 0, Z_FINISH);
+
+    finished = true;
+}
+
+void ObjectWriter::deflate_chunk(const void* data, size_t size, int flush) {
+    stream.next_in = static_cast<Bytef*>(const_cast<void*>(data));
+    stream.avail_in = size;
+
+    int status;
+    do {
+        stream.next_out = out_buffer.data();
+        stream.avail_out = out_buffer.size();
+
+        status = deflate(&stream, flush);
+        if (status == Z_STREAM_ERROR)
+            throw std::runtime_error("Failed to compress content");
+
+        write_all(fd, out_buffer.data(), out_buffer.size() - stream.avail_out);
+    } while (stream.avail_out == 0 || (flush == Z_FINISH && status != Z_STREAM_END));
+}
+
+bool has_compressed_header(const void* data, size_t size) {
+    return size >= COMPRESSED_MAGIC_SIZE && memcmp(data, COMPRESSED_MAGIC, COMPRESSED_MAGIC_SIZE) == 0;
+}
+
+bool is_compressed_object(int fd) {
+    unsigned char header[COMPRESSED_MAGIC_SIZE];
+
+    ssize_t bytes_read = pread(fd, header, sizeof(header), 0);
+    if (bytes_read < 0)
+        throw std::runtime_error("Failed to read object header");
+
+    return has_compressed_header(header, bytes_read);
+}
+
+// Feeds compressed input into a zlib stream and writes the plain output to dest_fd.
+// Returns true once the end of the compressed stream has been reached
+bool inflate_chunk(z_stream& stream, const void* data, size_t size, int dest_fd, std::vector<unsigned char>& out_buffer) {
+    stream.next_in = static_cast<Bytef*>(const_cast<void*>(data));
+    stream.avail_in = size;
+
+    int status;
+    do {
+        stream.next_out = out_buffer.data();
+        stream.avail_out = out_buffer.size();
+
+        status = inflate(&stream, Z_NO_FLUSH);
+        if (status != Z_OK && status != Z_STREAM_END && status != Z_BUF_ERROR)
+            throw std::runtime_error("Compressed object is corrupt");
+
+        write_all(dest_fd, out_buffer.data(), out_buffer.size() - stream.avail_out);
+    } while (stream.avail_out == 0 && status != Z_STREAM_END);
+
+    return status == Z_STREAM_END;
+}
+
+void inflate_object(int src_fd, int dest_fd) {
+    z_stream stream = {};
+    if (inflateInit(&stream) != Z_OK)
+        throw std::runtime_error("Failed to initialize decompression");
+
+    std::vector<unsigned char> in_buffer(COMPRESSION_BUFFER_SIZE);
+    std::vector<unsigned char> out_buffer(COMPRESSION_BUFFER_SIZE);
+    off_t offset = COMPRESSED_MAGIC_SIZE;
+
+    try {
+        bool finished = false;
+        while (!finished) {
+            ssize_t bytes_read = pread(src_fd, in_buffer.data(), in_buffer.size(), offset);
+            if (bytes_read < 0) {
+                if (errno == EINTR)
+                    continue;
+                throw std::runtime_error("Failed to read compressed object");
+            }
+            if (bytes_read == 0)
+                throw std::runtime_error("Compressed object is truncated");
+            offset += bytes_read;
+
+            finished = inflate_chunk(stream, in_buffer.data(), bytes_read, dest_fd, out_buffer);
+        }
+    } catch (const std::exception& e) {
+        inflateEnd(&stream);
+        throw;
+    }
+
+    inflateEnd(&stream);
+}
+
+void inflate_buffer(const void* data, size_t size, int dest_fd) {
+    if (!has_compressed_header(data, size))
+        throw std::invalid_argument("Content is not compressed");
+
+    z_stream stream = {};
+    if (inflateInit(&stream) != Z_OK)
+        throw std::runtime_error("Failed to initialize decompression");
+
+    std::vector<unsigned char> out_buffer(COMPRESSION_BUFFER_SIZE);
+
+    try {
+        const unsigned char* payload = static_cast<const unsigned char*>(data) + COMPRESSED_MAGIC_SIZE;
+        if (!inflate_chunk(stream, payload, size - COMPRESSED_MAGIC_SIZE, dest_fd, out_buffer))
+            throw std::runtime_error("Compressed object is truncated");
+    } catch (const std::exception& e) {
+        inflateEnd(&stream);
+        throw;
+    }
+
+    inflateEnd(&stream);
+}
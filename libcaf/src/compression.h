@@ -0,0 +1,49 @@
+#ifndef COMPRESSION_H
+#define COMPRESSION_H
+
+#include <string>
+#include <vector>
+#include <cstddef>
+#include <cstdint>
+#include <zlib.h>
+
+// Header written in front of every compressed object. Its first byte is not
+// valid UTF-8 so plain text objects stored uncompressed never start with it.
+// Content that does start with it is always stored compressed, so an object
+// starting with the header is compressed whatever the store configuration
+constexpr unsigned char COMPRESSED_MAGIC[] = {0x89, 'C', 'A', 'F', 'Z', '\r', '\n', 0x1a};
+constexpr size_t COMPRESSED_MAGIC_SIZE = sizeof(COMPRESSED_MAGIC);
+
+// Streams object content to a file descriptor, deflating it when compression is enabled
+// or when the content starts with COMPRESSED_MAGIC
+class ObjectWriter {
+public:
+    ObjectWriter(int fd, bool compressed);
+    ~ObjectWriter();
+
+    ObjectWriter(const ObjectWriter&) = delete;
+    ObjectWriter& operator=(const ObjectWriter&) = delete;
+
+    void write(const void* data, size_t size);
+    void finish();
+
+private:
+    void start_compression();
+    void write_head();
+    void deflate_chunk(const void* data, size_t size, int flush);
+
+    int fd;
+    bool compressed;
+    bool deciding;
+    bool finished;
+    std::vector<unsigned char> head;
+    z_stream stream;
+    std::vector<unsigned char> out_buffer;
+};
+
+bool has_compressed_header(const void* data, size_t size);
+bool is_compressed_object(int fd);
+void inflate_object(int src_fd, int dest_fd);
+void inflate_buffer(const void* data, size_t size, int dest_fd);
+
+#endif // COMPRESSION_H
@@ -0,0 +1,158 @@
+#include "delta.h"
+#include <string.h>
+#include <stdexcept>
+#include <unordered_map>
+
+#define DELTA_BLOCK_SIZE 16
+#define DELTA_MAX_INDEX_ENTRIES (1 << 22)
+#define DELTA_OP_COPY 0
+#define DELTA_OP_INSERT 1
+
+constexpr uint64_t ROLLING_PRIME = 1099511628211ULL;
+
+void emit_insert(std::string& delta, const unsigned char* data, size_t size);
+void emit_copy(std::string& delta, uint64_t offset, uint64_t size);
+uint64_t block_hash(const unsigned char* data, size_t size);
+
+bool create_delta(const unsigned char* base, size_t base_size,
+                  const unsigned char* target, size_t target_size,
+                  size_t max_size, std::string& delta) {
+    delta.clear();
+
+    // Larger bases are indexed with larger blocks to bound the index size
+    size_t block = DELTA_BLOCK_SIZE;
+    while (base_size / block > DELTA_MAX_INDEX_ENTRIES)
+        block *= 2;
+
+    std::unordered_map<uint64_t, uint64_t> index;
+    index.reserve(base_size / block + 1);
+    for (uint64_t offset = 0; offset + block <= base_size; offset += block)
+        index.emplace(block_hash(base + offset, block), offset);
+
+    // Weight of the byte leaving the rolling window
+    uint64_t leading_weight = 1;
+    for (size_t i = 1; i < block; ++i)
+        leading_weight *= ROLLING_PRIME;
+
+    size_t insert_start = 0;
+    size_t position = 0;
+    uint64_t hash = target_size >= block ? block_hash(target, block) : 0;
+
+    while (!index.empty() && position + block <= target_size) {
+        auto match = index.find(hash);
+
+        if (match != index.end() && memcmp(base + match->second, target + position, block) == 0) {
+            uint64_t base_start = match->second;
+            size_t start = position;
+
+            // Grow the match backwards into pending literals and forwards past the block
+            while (start > insert_start && base_start > 0 && base[base_start - 1] == target[start - 1]) {
+                --start;
+                --base_start;
+            }
+
+            size_t end = position + block;
+            uint64_t base_end = match->second + block;
+            while (end < target_size && base_end < base_size && target[end] == base[base_end]) {
+                ++end;
+                ++base_end;
+            }
+
+            emit_insert(delta, target + insert_start, start - insert_start);
+            emit_copy(delta, base_start, end - start);
+            if (delta.size() > max_size)
+                return false;
+
+            position = end;
+            insert_start = end;
+            if (position + block <= target_size)
+                hash = block_hash(target + position, block);
+            continue;
+        }
+
+        if (position + block < target_size)
+            hash = (hash - target[position] * leading_weight) * ROLLING_PRIME + target[position + block];
+        ++position;
+
+        if (position - insert_start > max_size)
+            return false;
+    }
+
+    emit_insert(delta, target + insert_start, target_size - insert_start);
+    return delta.size() <= max_size;
+}
+
+std::vector<DeltaOp> parse_delta(const unsigned char* data, size_t size, uint64_t base_size, uint64_t& result_size) {
+    const unsigned char* end = data + size;
+    std::vector<DeltaOp> ops;
+    uint64_t offset = 0;
+
+    while (data < end) {
+        unsigned char op = *data++;
+        if (op == DELTA_OP_COPY) {
+            uint64_t base_offset = read_varint(data, end);
+            uint64_t length = read_varint(data, end);
+            if (base_offset > base_size || length > base_size - base_offset)
+                throw std::runtime_error("Delta copies outside of its base");
+            ops.push_back(DeltaOp{offset, length, base_offset, nullptr});
+            offset += length;
+        } else if (op == DELTA_OP_INSERT) {
+            uint64_t length = read_varint(data, end);
+            if (length > static_cast<uint64_t>(end - data))
+                throw std::runtime_error("Delta is truncated");
+            ops.push_back(DeltaOp{offset, length, 0, data});
+            data += length;
+            offset += length;
+        } else {
+            throw std::runtime_error("Unknown delta instruction");
+        }
+    }
+
+    result_size = offset;
+    return ops;
+}
+
+void emit_insert(std::string& delta, const unsigned char* data, size_t size) {
+    if (size == 0)
+        return;
+
+    delta.push_back(DELTA_OP_INSERT);
+    append_varint(delta, size);
+    delta.append(reinterpret_cast<const char*>(data), size);
+}
+
+void emit_copy(std::string& delta, uint64_t offset, uint64_t size) {
+    delta.push_back(DELTA_OP_COPY);
+    append_varint(delta, offset);
+    append_varint(delta, size);
+}
+
+uint64_t block_hash(const unsigned char* data, size_t size) {
+    uint64_t hash = 0;
+    for (size_t i = 0; i < size; ++i)
+        hash = hash * ROLLING_PRIME + data[i];
+    return hash;
+}
+
+void append_varint(std::string& out, uint64_t value) {
+    while (value >= 0x80) {
+        out.push_back(static_cast<char>((value & 0x7f) | 0x80));
+        value >>= 7;
+    }
+    out.push_back(static_cast<char>(value));
+}
+
+uint64_t read_varint(const unsigned char*& data, const unsigned char* end) {
+    uint64_t value = 0;
+    for (int shift = 0; shift < 64; shift += 7) {
+        if (data >= end)
+            throw std::runtime_error("Delta is truncated");
+
+        unsigned char byte = *data++;
+        value |= static_cast<uint64_t>(byte & 0x7f) << shift;
+        if (!(byte & 0x80))
+            return value;
+    }
+
+    throw std::runtime_error("Delta varint is too long");
+}
@@ -0,0 +1,29 @@
+#ifndef DELTA_H
+#define DELTA_H
+
+#include <string>
+#include <vector>
+#include <cstddef>
+#include <cstdint>
+
+// One instruction of a delta: either copy a range of the base or insert literal bytes
+struct DeltaOp {
+    uint64_t target_offset;       // where the instruction's output starts in the result
+    uint64_t length;              // number of bytes it produces
+    uint64_t base_offset;         // source offset in the base, for copies
+    const unsigned char* data;    // literal bytes for inserts, nullptr for copies
+};
+
+// Encodes target as instructions against base. Returns false when the delta
+// would grow beyond max_size, in which case storing target in full is cheaper
+bool create_delta(const unsigned char* base, size_t base_size,
+                  const unsigned char* target, size_t target_size,
+                  size_t max_size, std::string& delta);
+
+// Decodes instructions written by create_delta, checking they fit the base
+std::vector<DeltaOp> parse_delta(const unsigned char* data, size_t size, uint64_t base_size, uint64_t& result_size);
+
+void append_varint(std::string& out, uint64_t value);
+uint64_t read_varint(const unsigned char*& data, const unsigned char* end);
+
+#endif // DELTA_H
@@ -0,0 +1,68 @@
+#include "object_id.h"
+#include <stdexcept>
+
+struct HexTables {
+    HexTables();
+
+    char encode[256][2];
+    int8_t decode[256];
+};
+
+// Encoding looks up both characters of a byte at once, and decoding maps
+// every possible character so invalid input costs no extra branches
+static const HexTables hex_tables;
+
+HexTables::HexTables() {
+    static const char digits[] = "0123456789abcdef";
+    for (int i = 0; i < 256; ++i) {
+        encode[i][0] = digits[i >> 4];
+        encode[i][1] = digits[i & 0xf];
+        decode[i] = -1;
+    }
+    for (int i = 0; i < 16; ++i)
+        decode[static_cast<unsigned char>(digits[i])] = i;
+}
+
+void encode_hex(const unsigned char* data, size_t size, char* out) {
+    for (size_t i = 0; i < size; ++i) {
+        memcpy(out + i * 2, hex_tables.encode[data[i]], 2);
+    }
+}
+
+bool decode_hex(const char* hex, size_t size, unsigned char* out) {
+    int invalid = 0;
+    for (size_t i = 0; i < size; ++i) {
+        int8_t high = hex_tables.decode[static_cast<unsigned char>(hex[i * 2])];
+        int8_t low = hex_tables.decode[static_cast<unsigned char>(hex[i * 2 + 1])];
+        invalid |= high | low;
+        out[i] = static_cast<unsigned char>((static_cast<unsigned>(high) << 4) | (low & 0xf));
+    }
+
+    return invalid >= 0;
+}
+
+ObjectId ObjectId::from_bytes(const unsigned char* data) {
+    ObjectId id;
+    memcpy(id.bytes.data(), data, OBJECT_ID_SIZE);
+    return id;
+}
+
+bool ObjectId::from_hex(const std::string& hex, ObjectId& id) {
+    if (hex.size() != OBJECT_ID_SIZE * 2)
+        return false;
+
+    return decode_hex(hex.data(), OBJECT_ID_SIZE, id.bytes.data());
+}
+
+ObjectId ObjectId::parse(const std::string& hex) {
+    ObjectId id;
+    if (!from_hex(hex, id))
+        throw std::runtime_error("Invalid object id: " + hex);
+    return id;
+}
+
+std::string ObjectId::hex() const {
+    std::string out(OBJECT_ID_SIZE * 2, '\0');
+    encode_hex(data(), OBJECT_ID_SIZE, &out[0]);
+    return out;
+}
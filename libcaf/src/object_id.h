@@ -0,0 +1,43 @@
+#ifndef OBJECT_ID_H
+#define OBJECT_ID_H
+
+#include <array>
+#include <string>
+#include <cstddef>
+#include <cstdint>
+#include <cstring>
+
+#define OBJECT_ID_SIZE 20
+
+// Encodes size bytes as 2 * size lowercase hex characters
+void encode_hex(const unsigned char* data, size_t size, char* out);
+// Decodes 2 * size hex characters, returning false on any non-hex character
+bool decode_hex(const char* hex, size_t size, unsigned char* out);
+
+// The raw 20-byte SHA-1 of an object. Hex is only used at the edges of the library
+struct ObjectId {
+    std::array<unsigned char, OBJECT_ID_SIZE> bytes{};
+
+    static ObjectId from_bytes(const unsigned char* data);
+    static bool from_hex(const std::string& hex, ObjectId& id);
+    // Like from_hex, but throws on anything that is not 40 lowercase hex characters
+    static ObjectId parse(const std::string& hex);
+
+    std::string hex() const;
+    const unsigned char* data() const { return bytes.data(); }
+
+    bool operator==(const ObjectId& other) const { return bytes == other.bytes; }
+    bool operator!=(const ObjectId& other) const { return bytes != other.bytes; }
+    bool operator<(const ObjectId& other) const { return memcmp(data(), other.data(), OBJECT_ID_SIZE) < 0; }
+};
+
+// Object ids are uniformly distributed, so any 8 of their bytes make a good hash
+struct ObjectIdHash {
+    size_t operator()(const ObjectId& id) const {
+        size_t value;
+        memcpy(&value, id.data(), sizeof(value));
+        return value;
+    }
+};
+
+#endif // OBJECT_ID_H
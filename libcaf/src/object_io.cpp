@@ -1,158 +1,315 @@
 #include "object_io.h"
-#include "hashTypes.h"
 #include "caf.h"
 #include <map>
 #include <string>
 #include <unistd.h>    
 #include <fcntl.h>     
-#include <sys/file.h>  
+#include <sys/stat.h>
 #include <vector>      
 #include <cstring>     
+#include <cerrno>
 #include <stdexcept>
 
-std::string read_length_prefixed_string(int fd); // Helper function to read a length-prefixed string safely
-void write_with_length(int fd, const std::string &data); // Helper function to write a length-prefixed string safely
-void save_TreeRecord(int fd, const TreeRecord &record); // Helper function to serialize a TreeRecord
-TreeRecord load_TreeRecord(int fd); // Helper function to deserialize a TreeRecord
-
-// Serialize Commit to disk
-void save_commit(const std::string &root_dir, const Commit &commit) {
-    std::string commit_hash = hash_object(commit);
+// Objects in the canonical format start with a magic and a format version. Objects
+// written before it have neither, and their first field can never match a magic
+constexpr char TREE_MAGIC[4] = {'C', 'A', 'F', 'T'};
+constexpr char COMMIT_MAGIC[4] = {'C', 'A', 'F', 'C'};
+constexpr uint8_t OBJECT_FORMAT_VERSION = 2;
+
+// Parses fields out of an object read into memory, checking every read against the end of the buffer
+class ObjectReader {
+public:
+    ObjectReader(const std::string& data) : position(data.data()), end(data.data() + data.size()) {}
+
+    template <typename T>
+    T read_value(const char* error) {
+        T value;
+        if (static_cast<size_t>(end - position) < sizeof(value))
+            throw std::runtime_error(error);
+        memcpy(&value, position, sizeof(value));
+        position += sizeof(value);
+        return value;
+    }
 
-    int fd = open_content_for_saving(root_dir, commit_hash);
+    // Canonical objects store integers little-endian whatever the host order
+    template <typename T>
+    T read_le(const char* error) {
+        if (static_cast<size_t>(end - position) < sizeof(T))
+            throw std::runtime_error(error);
+        T value = load_le<T>(reinterpret_cast<const unsigned char*>(position));
+        position += sizeof(T);
+        return value;
+    }
 
-    try{
-        write_with_length(fd, commit.treeHash);
-        write_with_length(fd, commit.author);
-        write_with_length(fd, commit.message);
+    bool skip_magic(const char (&magic)[4]);
+    std::string read_length_prefixed_string(bool canonical);
+    ObjectId read_object_id(bool canonical);
+    void expect_end();
+
+private:
+    const char* position;
+    const char* end;
+};
+
+std::string read_object(int fd); // Helper function to read a whole object with a single read
+void write_with_length(std::string &buffer, const std::string &data); // Helper function to append a length-prefixed string
+void write_object_id(std::string &buffer, const ObjectId &id); // Helper function to append the raw bytes of an id
+void save_TreeRecord(std::string &buffer, const TreeRecord &record); // Helper function to serialize a TreeRecord
+TreeRecord load_TreeRecord(ObjectReader &reader, bool canonical); // Helper function to deserialize a TreeRecord
+Commit parse_legacy_commit(ObjectReader &reader);
+Tree parse_legacy_tree(ObjectReader &reader);
+std::string legacy_commit_hash(const Commit &commit);
+std::string legacy_tree_hash(const Tree &tree);
+void save_object(const std::string &root_dir, const std::string &hash, const std::string &buffer); // Helper function to store a serialized object
+
+std::string serialize_commit(const Commit &commit) {
+    std::string buffer(COMMIT_MAGIC, sizeof(COMMIT_MAGIC));
+    append_le<uint8_t>(buffer, OBJECT_FORMAT_VERSION);
+    write_object_id(buffer, commit.treeHash);
+    write_with_length(buffer, commit.author);
+    write_with_length(buffer, commit.message);
+    append_le<int64_t>(buffer, commit.timestamp);
+    append_le<uint8_t>(buffer, commit.parent.has_value());
+    if (commit.parent)
+        write_object_id(buffer, *commit.parent);
+    return buffer;
+}
 
-        if (write(fd, &commit.timestamp, sizeof(commit.timestamp)) != sizeof(commit.timestamp))
-            throw std::runtime_error("Failed to write timestamp");
+std::string serialize_tree(const Tree &tree) {
+    std::string buffer(TREE_MAGIC, sizeof(TREE_MAGIC));
+    append_le<uint8_t>(buffer, OBJECT_FORMAT_VERSION);
+    append_le<uint32_t>(buffer, tree.records.size());
 
-        if (commit.parent) {
-            write_with_length(fd, *commit.parent);
-        } else {
-            uint32_t length = 0;
-            if (write(fd, &length, sizeof(length)) != sizeof(length))
-                throw std::runtime_error("Failed to write parent");
-        }
+    for (const auto &[name, record] : tree.records) {
+        save_TreeRecord(buffer, record);
+    }
+    return buffer;
+}
 
-        flock(fd, LOCK_UN);
-        close(fd);
+// Serialize Commit to disk. Its id is the hash of exactly the stored bytes
+std::string save_commit(const std::string &root_dir, const Commit &commit) {
+    std::string buffer = serialize_commit(commit);
+    std::string commit_hash = hash_bytes(buffer.data(), buffer.size());
 
-    } catch (const std::exception &e) {
-        delete_content(root_dir, commit_hash);
-        throw;
-    }
+    save_object(root_dir, commit_hash, buffer);
+    return commit_hash;
 }
 
 // Deserialize Commit from disk
 Commit load_commit(const std::string &root_dir, const std::string &commit_hash) {
-    int fd = open_content_for_reading(root_dir, commit_hash);
+    std::string data = read_object(open_content_for_reading(root_dir, commit_hash));
+    ObjectReader reader(data);
 
-    std::string tree_hash = read_length_prefixed_string(fd);
-    std::string author = read_length_prefixed_string(fd);
-    std::string message = read_length_prefixed_string(fd);
+    if (!reader.skip_magic(COMMIT_MAGIC))
+        return parse_legacy_commit(reader);
 
-    uint64_t timestamp;
-    if (read(fd, &timestamp, sizeof(timestamp)) != sizeof(timestamp))
-        throw std::runtime_error("Failed to read timestamp");
+    if (reader.read_le<uint8_t>("Failed to read object version") != OBJECT_FORMAT_VERSION)
+        throw std::runtime_error("Unsupported commit format version");
 
-    std::string parent_str = read_length_prefixed_string(fd);
+    ObjectId tree_hash = reader.read_object_id(true);
+    std::string author = reader.read_length_prefixed_string(true);
+    std::string message = reader.read_length_prefixed_string(true);
+    int64_t timestamp = reader.read_le<int64_t>("Failed to read timestamp");
 
-    flock(fd, LOCK_UN);
-    close(fd);
+    std::optional<ObjectId> parent;
+    if (reader.read_le<uint8_t>("Failed to read parent"))
+        parent = reader.read_object_id(true);
+    reader.expect_end();
 
-    std::optional<std::string> parent = parent_str.empty() ? std::nullopt : std::make_optional(parent_str);
     return Commit(tree_hash, author, message, timestamp, parent);
 }
 
-// Serialize Tree to disk
-void save_tree(const std::string &root_dir, const Tree &tree) {
-    std::string tree_hash = hash_object(tree);
+// Serialize Tree to disk. Its id is the hash of exactly the stored bytes
+std::string save_tree(const std::string &root_dir, const Tree &tree) {
+    std::string buffer = serialize_tree(tree);
+    std::string tree_hash = hash_bytes(buffer.data(), buffer.size());
 
-    int fd = open_content_for_saving(root_dir, tree_hash);
+    save_object(root_dir, tree_hash, buffer);
+    return tree_hash;
+}
 
-     try {
-        uint32_t num_records = tree.records.size();
-        if (write(fd, &num_records, sizeof(num_records)) != sizeof(num_records))
-            throw std::runtime_error("Failed to write number of records");
+// Deserialize Tree from disk
+Tree load_tree(const std::string &root_dir, const std::string &tree_hash) {
+    std::string data = read_object(open_content_for_reading(root_dir, tree_hash));
+    ObjectReader reader(data);
 
-        for (const auto &[name, record] : tree.records) {
-            save_TreeRecord(fd, record);
-        }
+    if (!reader.skip_magic(TREE_MAGIC))
+        return parse_legacy_tree(reader);
 
-        flock(fd, LOCK_UN);
-        close(fd);
+    if (reader.read_le<uint8_t>("Failed to read object version") != OBJECT_FORMAT_VERSION)
+        throw std::runtime_error("Unsupported tree format version");
 
-    } catch (const std::exception &e) {
-        delete_content(root_dir, tree_hash);
-        throw;
+    std::map<std::string, TreeRecord> records;
+    uint32_t num_records = reader.read_le<uint32_t>("Failed to read the number of records");
+
+    // Records are stored in name order, so each one goes at the end of the map
+    for (uint32_t i = 0; i < num_records; ++i) {
+        TreeRecord record = load_TreeRecord(reader, true);
+        records.emplace_hint(records.end(), record.name, record);
     }
+    reader.expect_end();
+
+    return Tree(records);
 }
 
-// Deserialize Tree from disk
-Tree load_tree(const std::string &root_dir, const std::string &tree_hash) {
-    int fd = open_content_for_reading(root_dir.c_str(), tree_hash.c_str());
+Commit parse_legacy_commit(ObjectReader &reader) {
+    ObjectId tree_hash = reader.read_object_id(false);
+    std::string author = reader.read_length_prefixed_string(false);
+    std::string message = reader.read_length_prefixed_string(false);
+    uint64_t timestamp = reader.read_value<uint64_t>("Failed to read timestamp");
+    std::string parent_str = reader.read_length_prefixed_string(false);
 
-    uint32_t num_records;
-    if (read(fd, &num_records, sizeof(num_records)) != sizeof(num_records))
-        throw std::runtime_error("Failed to read the number of records");
+    std::optional<ObjectId> parent;
+    if (!parent_str.empty())
+        parent = ObjectId::parse(parent_str);
+    return Commit(tree_hash, author, message, timestamp, parent);
+}
 
+Tree parse_legacy_tree(ObjectReader &reader) {
     std::map<std::string, TreeRecord> records;
+    uint32_t num_records = reader.read_value<uint32_t>("Failed to read the number of records");
+
     for (uint32_t i = 0; i < num_records; ++i) {
-        TreeRecord record = load_TreeRecord(fd);
-        records.emplace(record.name, record);
+        TreeRecord record = load_TreeRecord(reader, false);
+        records.emplace_hint(records.end(), record.name, record);
+    }
+
+    return Tree(records);
+}
+
+bool is_legacy_object(const std::string &root_dir, const std::string &hash) {
+    std::string data = read_object(open_content_for_reading(root_dir, hash));
+
+    ObjectReader tree_reader(data);
+    if (tree_reader.skip_magic(TREE_MAGIC) || ObjectReader(data).skip_magic(COMMIT_MAGIC))
+        return false;
+
+    // The layout does not say whether it holds a tree or a commit, so both are tried
+    try {
+        Tree tree = parse_legacy_tree(tree_reader);
+        tree_reader.expect_end();
+        if (legacy_tree_hash(tree) == hash)
+            return true;
+    } catch (const std::exception &e) {
+    }
+
+    try {
+        ObjectReader commit_reader(data);
+        Commit commit = parse_legacy_commit(commit_reader);
+        commit_reader.expect_end();
+        return legacy_commit_hash(commit) == hash;
+    } catch (const std::exception &e) {
+        return false;
+    }
+}
+
+std::string legacy_commit_hash(const Commit &commit) {
+    return hash_string(commit.treeHash.hex() + commit.author + commit.message + std::to_string(commit.timestamp) +
+                       (commit.parent ? commit.parent->hex() : ""));
+}
+
+std::string legacy_tree_hash(const Tree &tree) {
+    std::string fields;
+    for (const auto &[name, record] : tree.records)
+        fields += record.name + std::to_string(static_cast<int>(record.type)) + record.hash.hex();
+    return hash_string(fields);
+}
+
+std::string read_object(int fd) {
+    std::string data;
+    try {
+        struct stat st;
+        if (fstat(fd, &st) != 0)
+            throw std::runtime_error("Failed to read object");
+
+        data.resize(st.st_size);
+        if (read_full(fd, &data[0], data.size()) != data.size())
+            throw std::runtime_error("Failed to read object");
+    } catch (const std::exception &e) {
+        close(fd);
+        throw;
     }
 
-    flock(fd, LOCK_UN);
     close(fd);
+    return data;
+}
 
-    return Tree(records);
+void save_object(const std::string &root_dir, const std::string &hash, const std::string &buffer) {
+    if (mkdir(root_dir.c_str(), 0755) != 0 && errno != EEXIST)
+        throw std::runtime_error("Failed to create root directory");
+
+    // Written through the same writer as blobs, so compressed stores deflate it on the way out
+    save_buffer_content(root_dir, hash, buffer.data(), buffer.size(), load_store_config(root_dir).compression);
 }
 
-std::string read_length_prefixed_string(int fd) {
-    uint32_t length;
-    if (read(fd, &length, sizeof(length)) != sizeof(length))
-        throw std::runtime_error("Failed to read length");
+bool ObjectReader::skip_magic(const char (&magic)[4]) {
+    if (static_cast<size_t>(end - position) < sizeof(magic) || memcmp(position, magic, sizeof(magic)) != 0)
+        return false;
+
+    position += sizeof(magic);
+    return true;
+}
+
+std::string ObjectReader::read_length_prefixed_string(bool canonical) {
+    uint32_t length = canonical ? read_le<uint32_t>("Failed to read length") : read_value<uint32_t>("Failed to read length");
 
     if (length > MAX_LENGTH)
         throw std::runtime_error("Length exceeds maximum");
 
-    std::string result(length, '\0');
-
-    if (read(fd, &result[0], length) != static_cast<ssize_t>(length))
+    if (static_cast<size_t>(end - position) < length)
         throw std::runtime_error("Failed to read string");
 
+    std::string result(position, length);
+    position += length;
     return result;
 }
 
-void write_with_length(int fd, const std::string &data) {
-    uint32_t length = data.length();
-    if (write(fd, &length, sizeof(length)) != sizeof(length) || write(fd, data.c_str(), length) != static_cast<ssize_t>(length)) {
-        throw std::runtime_error("Failed to write string");
-    }
+// Canonical objects store ids as raw bytes, legacy ones as length-prefixed hex
+ObjectId ObjectReader::read_object_id(bool canonical) {
+    if (!canonical)
+        return ObjectId::parse(read_length_prefixed_string(false));
+
+    if (static_cast<size_t>(end - position) < OBJECT_ID_SIZE)
+        throw std::runtime_error("Failed to read object id");
+
+    ObjectId id = ObjectId::from_bytes(reinterpret_cast<const unsigned char*>(position));
+    position += OBJECT_ID_SIZE;
+    return id;
 }
 
-void save_TreeRecord(int fd, const TreeRecord &record) {
-    uint8_t type = static_cast<uint8_t>(record.type);
-    if (write(fd, &type, sizeof(type)) != sizeof(type))
-        throw std::runtime_error("Failed to write type");
+void ObjectReader::expect_end() {
+    if (position != end)
+        throw std::runtime_error("Unexpected data after object");
+}
 
-    write_with_length(fd, record.hash);
-    write_with_length(fd, record.name);
+void write_with_length(std::string &buffer, const std::string &data) {
+    if (data.length() > MAX_LENGTH)
+        throw std::runtime_error("Length exceeds maximum");
+
+    append_le<uint32_t>(buffer, data.length());
+    buffer.append(data);
 }
 
-TreeRecord load_TreeRecord(int fd) {
-    uint8_t type;
-    if (read(fd, &type, sizeof(type)) != sizeof(type)) {
-        throw std::runtime_error("Failed to read TreeRecord type");
-    }
+void write_object_id(std::string &buffer, const ObjectId &id) {
+    buffer.append(reinterpret_cast<const char*>(id.data()), OBJECT_ID_SIZE);
+}
+
+void save_TreeRecord(std::string &buffer, const TreeRecord &record) {
+    append_le<uint8_t>(buffer, static_cast<uint8_t>(record.type));
+
+    write_object_id(buffer, record.hash);
+    write_with_length(buffer, record.name);
+}
+
+TreeRecord load_TreeRecord(ObjectReader &reader, bool canonical) {
+    uint8_t type = reader.read_value<uint8_t>("Failed to read TreeRecord type");
+    if (type > static_cast<uint8_t>(TreeRecord::Type::COMMIT))
+        throw std::runtime_error("Unknown TreeRecord type");
 
     TreeRecord::Type recordType = static_cast<TreeRecord::Type>(type);
 
-    std::string hash = read_length_prefixed_string(fd);
-    std::string name = read_length_prefixed_string(fd);
+    ObjectId hash = reader.read_object_id(canonical);
+    std::string name = reader.read_length_prefixed_string(canonical);
 
     return TreeRecord(recordType, hash, name);
-}
\ No newline at end of file
+}
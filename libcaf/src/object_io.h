@@ -12,10 +12,19 @@
 // Maximum string length for length-prefixed strings
 constexpr uint32_t MAX_LENGTH = 1024 * 1024;  // 1 MB limit for strings
 
-void save_commit(const std::string &root_dir, const Commit &commit);
+// Canonical, versioned encodings. An object's id is the SHA-1 of these bytes
+std::string serialize_commit(const Commit &commit);
+std::string serialize_tree(const Tree &tree);
+
+// save_* return the id the object was stored under
+std::string save_commit(const std::string &root_dir, const Commit &commit);
 Commit load_commit(const std::string &root_dir, const std::string &hash);
-void save_tree(const std::string &root_dir, const Tree &tree);
+std::string save_tree(const std::string &root_dir, const Tree &tree);
 Tree load_tree(const std::string &root_dir, const std::string &hash);
 
+// Whether an object is a tree or commit written before the canonical format, which named
+// objects by a hash of their fields. Such objects load, but never match their names
+bool is_legacy_object(const std::string &root_dir, const std::string &hash);
+
 
 #endif // OBJECT_IO_H
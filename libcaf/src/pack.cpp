@@ -0,0 +1,943 @@
+#include "pack.h"
+#include "caf.h"
+#include "compression.h"
+#include "delta.h"
+#include <stdio.h>
+#include <string.h>
+#include <ctype.h>
+#include <errno.h>
+#include <unistd.h>
+#include <fcntl.h>
+#include <dirent.h>
+#include <sys/file.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <map>
+#include <set>
+#include <mutex>
+#include <vector>
+#include <algorithm>
+#include <stdexcept>
+#include <unordered_map>
+
+#define PACK_VERSION 1
+#define REPACK_LOCK_FILE "repack.lock"
+#define REJECTED_DELTAS_FILE "rejected-deltas"
+#define FANOUT_SIZE 256
+#define OUTPUT_BUFFER_SIZE (1 << 20)
+
+constexpr char PACK_MAGIC[4] = {'C', 'P', 'C', 'K'};
+constexpr char IDX_MAGIC[4] = {'C', 'I', 'D', 'X'};
+constexpr size_t PACK_HEADER_SIZE = sizeof(PACK_MAGIC) + 2 * sizeof(uint32_t);
+constexpr size_t IDX_HEADER_SIZE = sizeof(IDX_MAGIC) + sizeof(uint32_t);
+constexpr size_t ENTRY_HEADER_SIZE = sizeof(uint8_t) + sizeof(uint64_t);
+
+// Where repack reads an object from: a loose file or an entry of an existing pack
+struct RepackSource {
+    std::string loose_path;
+    std::shared_ptr<const Pack> pack;
+    uint64_t offset;
+};
+
+struct PackCacheEntry {
+    int64_t mtime;
+    std::vector<std::shared_ptr<const Pack>> packs;
+};
+
+// Collects output in large writes, since deltas produce many small pieces
+class OutputBuffer {
+public:
+    explicit OutputBuffer(int fd);
+    void append(const unsigned char* data, size_t size);
+    void flush();
+
+private:
+    int fd;
+    std::vector<unsigned char> buffer;
+};
+
+// Writes a pack file, hashing it on the way so the pack can be named by its contents
+class PackFile {
+public:
+    explicit PackFile(FILE* file) : file(file) {}
+    void write(const void* data, size_t size);
+    std::string hash() { return content_hash.hex(); }
+
+private:
+    FILE* file;
+    StreamingHash content_hash;
+};
+
+struct ParsedDelta {
+    PackedObject base;
+    std::vector<DeltaOp> ops;
+    uint64_t result_size;
+};
+
+// Produces ranges of packed objects, following delta chains down to stored bases
+class DeltaResolver {
+public:
+    explicit DeltaResolver(OutputBuffer& out) : out(out) {}
+
+    uint64_t object_size(const PackedObject& object);
+    void write_range(const PackedObject& object, uint64_t offset, uint64_t length, int depth);
+
+private:
+    const ParsedDelta& parsed(const PackedObject& object);
+
+    OutputBuffer& out;
+    std::unordered_map<const unsigned char*, ParsedDelta> deltas;
+};
+
+// The plain bytes of an object being repacked, mapped into memory
+class PlainContent {
+public:
+    PlainContent(const std::string& content_root_dir, const RepackSource& source);
+    ~PlainContent();
+
+    PlainContent(const PlainContent&) = delete;
+    PlainContent& operator=(const PlainContent&) = delete;
+
+    const unsigned char* data() const { return content; }
+    uint64_t size() const { return content_size; }
+
+private:
+    void map_content(int fd);
+
+    const unsigned char* content;
+    uint64_t content_size;
+    bool mapped;
+};
+
+bool locate_entry(const std::shared_ptr<const Pack>& pack, const unsigned char* id, PackedObject& object);
+PackedObject entry_at(const std::shared_ptr<const Pack>& pack, uint64_t offset);
+std::vector<std::shared_ptr<const Pack>> load_packs(const std::string& content_root_dir, bool refresh);
+const unsigned char* map_file(const std::string& path, size_t& size);
+void write_checked(FILE* file, const void* data, size_t size);
+void write_entry_header(PackFile& out, PackEntryKind kind, uint64_t size);
+uint64_t write_stored(PackFile& out, const std::string& content_root_dir, const unsigned char* data, uint64_t size);
+std::map<ObjectId, ObjectId> plan_deltas(const std::map<ObjectId, RepackSource>& sources,
+                                         const std::map<std::string, std::string>& delta_bases,
+                                         const std::set<std::pair<ObjectId, ObjectId>>& rejected);
+std::set<std::pair<ObjectId, ObjectId>> load_rejected_deltas(const std::string& pack_dir);
+void save_rejected_deltas(const std::string& pack_dir, const std::set<std::pair<ObjectId, ObjectId>>& rejected);
+int dependent_depth(const std::multimap<ObjectId, ObjectId>& dependents, const ObjectId& id);
+
+static std::mutex pack_cache_mutex;
+static std::unordered_map<std::string, PackCacheEntry> pack_cache;
+
+Pack::Pack(const std::string& pack_path, const std::string& idx_path)
+    : pack_path(pack_path), pack_data(nullptr), pack_size(0), idx_data(nullptr), idx_size(0) {
+    idx_data = map_file(idx_path, idx_size);
+
+    try {
+        if (idx_size < IDX_HEADER_SIZE + FANOUT_SIZE * sizeof(uint32_t) || memcmp(idx_data, IDX_MAGIC, sizeof(IDX_MAGIC)) != 0)
+            throw std::runtime_error("Invalid pack index: " + idx_path);
+
+        if (load_le<uint32_t>(idx_data + sizeof(IDX_MAGIC)) != PACK_VERSION)
+            throw std::runtime_error("Unsupported pack index version: " + idx_path);
+
+        fanout = idx_data + IDX_HEADER_SIZE;
+        count = load_le<uint32_t>(fanout + (FANOUT_SIZE - 1) * sizeof(uint32_t));
+        ids = fanout + FANOUT_SIZE * sizeof(uint32_t);
+        offsets = ids + static_cast<size_t>(count) * OBJECT_ID_SIZE;
+
+        if (idx_size != static_cast<size_t>(offsets - idx_data) + static_cast<size_t>(count) * sizeof(uint64_t))
+            throw std::runtime_error("Truncated pack index: " + idx_path);
+
+        pack_data = map_file(pack_path, pack_size);
+        if (pack_size < PACK_HEADER_SIZE || memcmp(pack_data, PACK_MAGIC, sizeof(PACK_MAGIC)) != 0)
+            throw std::runtime_error("Invalid pack file: " + pack_path);
+    } catch (const std::exception& e) {
+        munmap(const_cast<unsigned char*>(idx_data), idx_size);
+        if (pack_data)
+            munmap(const_cast<unsigned char*>(pack_data), pack_size);
+        throw;
+    }
+}
+
+Pack::~Pack() {
+    munmap(const_cast<unsigned char*>(idx_data), idx_size);
+    munmap(const_cast<unsigned char*>(pack_data), pack_size);
+}
+
+bool Pack::find(const unsigned char* id, uint64_t& offset) const {
+    // The fanout table narrows the search to ids sharing the first byte
+    uint32_t low = id[0] > 0 ? load_le<uint32_t>(fanout + (id[0] - 1) * sizeof(uint32_t)) : 0;
+    uint32_t high = load_le<uint32_t>(fanout + id[0] * sizeof(uint32_t));
+
+    while (low < high) {
+        uint32_t middle = low + (high - low) / 2;
+        int cmp = memcmp(id_at(middle), id, OBJECT_ID_SIZE);
+
+        if (cmp == 0) {
+            offset = offset_at(middle);
+            return true;
+        }
+        if (cmp < 0)
+            low = middle + 1;
+        else
+            high = middle;
+    }
+
+    return false;
+}
+
+const unsigned char* Pack::id_at(uint32_t index) const {
+    return ids + static_cast<size_t>(index) * OBJECT_ID_SIZE;
+}
+
+uint64_t Pack::offset_at(uint32_t index) const {
+    return load_le<uint64_t>(offsets + static_cast<size_t>(index) * sizeof(uint64_t));
+}
+
+bool find_packed_object(const std::string& content_root_dir, const std::string& content_hash, PackedObject& object, bool refresh) {
+    ObjectId id;
+    if (!ObjectId::from_hex(content_hash, id))
+        return false;
+
+    for (const auto& pack : load_packs(content_root_dir, refresh)) {
+        if (locate_entry(pack, id.data(), object))
+            return true;
+    }
+
+    return false;
+}
+
+bool locate_entry(const std::shared_ptr<const Pack>& pack, const unsigned char* id, PackedObject& object) {
+    uint64_t offset;
+    if (!pack->find(id, offset))
+        return false;
+
+    object = entry_at(pack, offset);
+    return true;
+}
+
+PackedObject entry_at(const std::shared_ptr<const Pack>& pack, uint64_t offset) {
+    if (offset + ENTRY_HEADER_SIZE > pack->data_size())
+        throw std::runtime_error("Corrupt pack entry in " + pack->path());
+
+    const unsigned char* entry = pack->data() + offset;
+    uint64_t size = load_le<uint64_t>(entry + sizeof(uint8_t));
+
+    if (size > pack->data_size() - offset - ENTRY_HEADER_SIZE)
+        throw std::runtime_error("Corrupt pack entry in " + pack->path());
+
+    PackEntryKind kind = static_cast<PackEntryKind>(entry[0]);
+    if (kind != PackEntryKind::STORED && kind != PackEntryKind::DELTA)
+        throw std::runtime_error("Unknown pack entry kind in " + pack->path());
+    if (kind == PackEntryKind::DELTA && size < OBJECT_ID_SIZE)
+        throw std::runtime_error("Corrupt delta entry in " + pack->path());
+
+    return PackedObject{pack, kind, entry + ENTRY_HEADER_SIZE, size};
+}
+
+std::vector<std::string> list_packed_objects(const std::string& content_root_dir) {
+    std::vector<std::string> hashes;
+    for (const auto& pack : load_packs(content_root_dir, true)) {
+        for (uint32_t i = 0; i < pack->size(); ++i)
+            hashes.push_back(ObjectId::from_bytes(pack->id_at(i)).hex());
+    }
+    return hashes;
+}
+
+void write_packed_object(const PackedObject& object, int dest_fd) {
+    if (object.kind == PackEntryKind::STORED) {
+        if (has_compressed_header(object.data, object.size))
+            inflate_buffer(object.data, object.size, dest_fd);
+        else
+            write_all(dest_fd, object.data, object.size);
+        return;
+    }
+
+    // Deltas are resolved range by range through a bounded buffer, so only dest_fd holds the whole result
+    OutputBuffer out(dest_fd);
+    DeltaResolver resolver(out);
+    resolver.write_range(object, 0, resolver.object_size(object), 0);
+    out.flush();
+}
+
+OutputBuffer::OutputBuffer(int fd) : fd(fd) {
+    buffer.reserve(OUTPUT_BUFFER_SIZE);
+}
+
+void OutputBuffer::append(const unsigned char* data, size_t size) {
+    if (buffer.size() + size > OUTPUT_BUFFER_SIZE) {
+        flush();
+        if (size >= OUTPUT_BUFFER_SIZE) {
+            write_all(fd, data, size);
+            return;
+        }
+    }
+    buffer.insert(buffer.end(), data, data + size);
+}
+
+void OutputBuffer::flush() {
+    write_all(fd, buffer.data(), buffer.size());
+    buffer.clear();
+}
+
+uint64_t DeltaResolver::object_size(const PackedObject& object) {
+    if (object.kind == PackEntryKind::DELTA)
+        return parsed(object).result_size;
+
+    if (has_compressed_header(object.data, object.size))
+        throw std::runtime_error("Delta base is compressed in " + object.pack->path());
+    return object.size;
+}
+
+void DeltaResolver::write_range(const PackedObject& object, uint64_t offset, uint64_t length, int depth) {
+    if (length == 0)
+        return;
+
+    if (depth > MAX_DELTA_DEPTH)
+        throw std::runtime_error("Delta chain is too deep in " + object.pack->path());
+
+    if (object.kind == PackEntryKind::STORED) {
+        if (offset + length > object_size(object))
+            throw std::runtime_error("Delta reads past its base in " + object.pack->path());
+        out.append(object.data + offset, length);
+        return;
+    }
+
+    const ParsedDelta& delta = parsed(object);
+    if (offset + length > delta.result_size)
+        throw std::runtime_error("Delta reads past its base in " + object.pack->path());
+
+    // Find the first instruction producing bytes at offset, then walk forward
+    auto op = std::upper_bound(delta.ops.begin(), delta.ops.end(), offset,
+                               [](uint64_t value, const DeltaOp& candidate) { return value < candidate.target_offset; });
+    --op;
+
+    uint64_t end = offset + length;
+    for (; op != delta.ops.end() && op->target_offset < end; ++op) {
+        uint64_t start = std::max(offset, op->target_offset);
+        uint64_t stop = std::min(end, op->target_offset + op->length);
+        uint64_t skip = start - op->target_offset;
+
+        if (op->data)
+            out.append(op->data + skip, stop - start);
+        else
+            write_range(delta.base, op->base_offset + skip, stop - start, depth + 1);
+    }
+}
+
+const ParsedDelta& DeltaResolver::parsed(const PackedObject& object) {
+    auto cached = deltas.find(object.data);
+    if (cached != deltas.end())
+        return cached->second;
+
+    PackedObject base;
+    if (!locate_entry(object.pack, object.data, base))
+        throw std::runtime_error("Delta base is missing from " + object.pack->path());
+
+    const unsigned char* payload = object.data + OBJECT_ID_SIZE;
+    const unsigned char* payload_end = object.data + object.size;
+    uint64_t expected_size = read_varint(payload, payload_end);
+
+    ParsedDelta delta{base, {}, 0};
+    delta.ops = parse_delta(payload, payload_end - payload, object_size(base), delta.result_size);
+    if (delta.result_size != expected_size)
+        throw std::runtime_error("Corrupt delta entry in " + object.pack->path());
+
+    return deltas.emplace(object.data, std::move(delta)).first->second;
+}
+
+std::vector<std::shared_ptr<const Pack>> load_packs(const std::string& content_root_dir, bool refresh) {
+    std::string pack_dir = content_root_dir + "/" + PACK_SUBDIR;
+
+    struct stat st;
+    if (stat(pack_dir.c_str(), &st) != 0) {
+        if (errno == ENOENT)
+            return {};
+        throw std::runtime_error("Failed to read pack directory");
+    }
+    int64_t mtime = st.st_mtim.tv_sec * 1000000000LL + st.st_mtim.tv_nsec;
+
+    std::lock_guard<std::mutex> guard(pack_cache_mutex);
+
+    // Listing is cached per store until the pack directory changes; callers
+    // that miss an object retry with refresh in case of a coarse mtime
+    auto cached = pack_cache.find(pack_dir);
+    if (!refresh && cached != pack_cache.end() && cached->second.mtime == mtime)
+        return cached->second.packs;
+
+    std::map<std::string, std::shared_ptr<const Pack>> previous;
+    if (cached != pack_cache.end()) {
+        for (const auto& pack : cached->second.packs)
+            previous[pack->path()] = pack;
+    }
+
+    DIR* dir = opendir(pack_dir.c_str());
+    if (!dir)
+        throw std::runtime_error("Failed to read pack directory");
+
+    std::vector<std::shared_ptr<const Pack>> packs;
+    try {
+        struct dirent* entry;
+        while ((entry = readdir(dir)) != nullptr) {
+            std::string name = entry->d_name;
+            if (name.size() <= 4 || name.compare(name.size() - 4, 4, ".idx") != 0)
+                continue;
+
+            std::string base = pack_dir + "/" + name.substr(0, name.size() - 4);
+            std::string pack_path = base + ".pack";
+
+            auto reused = previous.find(pack_path);
+            if (reused != previous.end()) {
+                packs.push_back(reused->second);
+                continue;
+            }
+
+            try {
+                packs.push_back(std::make_shared<const Pack>(pack_path, base + ".idx"));
+            } catch (const std::exception& e) {
+                // The pack may have been removed by a concurrent repack
+                if (access(base.c_str(), F_OK) == 0 || access((base + ".idx").c_str(), F_OK) == 0)
+                    throw;
+            }
+        }
+    } catch (const std::exception& e) {
+        closedir(dir);
+        throw;
+    }
+    closedir(dir);
+
+    pack_cache[pack_dir] = PackCacheEntry{mtime, packs};
+    return packs;
+}
+
+const unsigned char* map_file(const std::string& path, size_t& size) {
+    int fd = open(path.c_str(), O_RDONLY);
+    if (fd < 0)
+        throw std::runtime_error("Failed to open file: " + path);
+
+    struct stat st;
+    if (fstat(fd, &st) != 0 || st.st_size == 0) {
+        close(fd);
+        throw std::runtime_error("Failed to map file: " + path);
+    }
+
+    void* data = mmap(nullptr, st.st_size, PROT_READ, MAP_SHARED, fd, 0);
+    close(fd);
+
+    if (data == MAP_FAILED)
+        throw std::runtime_error("Failed to map file: " + path);
+
+    size = st.st_size;
+    return static_cast<const unsigned char*>(data);
+}
+
+void write_checked(FILE* file, const void* data, size_t size) {
+    if (size > 0 && fwrite(data, 1, size, file) != size)
+        throw std::runtime_error("Failed to write pack");
+}
+
+void PackFile::write(const void* data, size_t size) {
+    write_checked(file, data, size);
+    content_hash.update(data, size);
+}
+
+void write_entry_header(PackFile& out, PackEntryKind kind, uint64_t size) {
+    std::string header;
+    append_le<uint8_t>(header, static_cast<uint8_t>(kind));
+    append_le<uint64_t>(header, size);
+    out.write(header.data(), header.size());
+}
+
+// Returns the size of the written entry, header included
+uint64_t write_stored(PackFile& out, const std::string& content_root_dir, const unsigned char* data, uint64_t size) {
+    if (!has_compressed_header(data, size)) {
+        write_entry_header(out, PackEntryKind::STORED, size);
+        out.write(data, size);
+        return ENTRY_HEADER_SIZE + size;
+    }
+
+    // Like loose objects, content that starts like a compressed object is stored compressed
+    int fd = create_plain_content(content_root_dir);
+    uint64_t encoded_size;
+    try {
+        ObjectWriter writer(fd, true);
+        writer.write(data, size);
+        writer.finish();
+
+        encoded_size = lseek(fd, 0, SEEK_CUR);
+        write_entry_header(out, PackEntryKind::STORED, encoded_size);
+
+        std::vector<unsigned char> buffer(OUTPUT_BUFFER_SIZE);
+        uint64_t copied = 0;
+        while (copied < encoded_size) {
+            ssize_t bytes_read = pread(fd, buffer.data(), std::min<uint64_t>(buffer.size(), encoded_size - copied), copied);
+            if (bytes_read < 0 && errno == EINTR)
+                continue;
+            if (bytes_read <= 0)
+                throw std::runtime_error("Failed to read compressed object");
+            out.write(buffer.data(), bytes_read);
+            copied += bytes_read;
+        }
+    } catch (const std::exception& e) {
+        close(fd);
+        throw;
+    }
+    close(fd);
+
+    return ENTRY_HEADER_SIZE + encoded_size;
+}
+
+std::map<ObjectId, ObjectId> plan_deltas(const std::map<ObjectId, RepackSource>& sources,
+                                         const std::map<std::string, std::string>& delta_bases,
+                                         const std::set<std::pair<ObjectId, ObjectId>>& rejected) {
+    // Deltas already in packs are kept, so their chains count towards the depth of new ones
+    std::map<ObjectId, ObjectId> bases;
+    std::multimap<ObjectId, ObjectId> dependents;
+    for (const auto& [id, source] : sources) {
+        if (!source.pack)
+            continue;
+
+        PackedObject object = entry_at(source.pack, source.offset);
+        if (object.kind == PackEntryKind::DELTA) {
+            ObjectId base = ObjectId::from_bytes(object.data);
+            bases[id] = base;
+            dependents.emplace(base, id);
+        }
+    }
+
+    std::map<ObjectId, ObjectId> planned;
+    for (const auto& [target_hash, base_hash] : delta_bases) {
+        ObjectId target, base;
+        if (!ObjectId::from_hex(target_hash, target) || !ObjectId::from_hex(base_hash, base))
+            continue;
+
+        if (target == base || !sources.count(target) || !sources.count(base) || bases.count(target))
+            continue;
+
+        // Pairs whose delta did not pay off before never will, their contents cannot change
+        if (rejected.count({target, base}))
+            continue;
+
+        // Chains through the new delta must stay within MAX_DELTA_DEPTH and must not loop back to it
+        int depth = 1;
+        ObjectId current = base;
+        for (auto next = bases.find(current); next != bases.end() && current != target && depth <= MAX_DELTA_DEPTH; next = bases.find(current)) {
+            current = next->second;
+            depth++;
+        }
+        if (current == target || depth + dependent_depth(dependents, target) > MAX_DELTA_DEPTH)
+            continue;
+
+        bases[target] = base;
+        dependents.emplace(base, target);
+        planned[target] = base;
+    }
+
+    return planned;
+}
+
+int dependent_depth(const std::multimap<ObjectId, ObjectId>& dependents, const ObjectId& id) {
+    int depth = 0;
+    auto range = dependents.equal_range(id);
+    for (auto it = range.first; it != range.second; ++it)
+        depth = std::max(depth, 1 + dependent_depth(dependents, it->second));
+    return depth;
+}
+
+std::set<std::pair<ObjectId, ObjectId>> load_rejected_deltas(const std::string& pack_dir) {
+    std::set<std::pair<ObjectId, ObjectId>> rejected;
+
+    int fd = open((pack_dir + "/" + REJECTED_DELTAS_FILE).c_str(), O_RDONLY);
+    if (fd < 0)
+        return rejected;
+
+    // Pairs of target and base ids, one after another
+    unsigned char pair[2 * OBJECT_ID_SIZE];
+    try {
+        while (read_full(fd, pair, sizeof(pair)) == sizeof(pair))
+            rejected.emplace(ObjectId::from_bytes(pair), ObjectId::from_bytes(pair + OBJECT_ID_SIZE));
+    } catch (const std::exception& e) {
+        close(fd);
+        throw;
+    }
+    close(fd);
+
+    return rejected;
+}
+
+void save_rejected_deltas(const std::string& pack_dir, const std::set<std::pair<ObjectId, ObjectId>>& rejected) {
+    std::string path = pack_dir + "/" + REJECTED_DELTAS_FILE;
+    if (rejected.empty()) {
+        unlink(path.c_str());
+        return;
+    }
+
+    std::string data;
+    for (const auto& [target, base] : rejected) {
+        data.append(reinterpret_cast<const char*>(target.data()), OBJECT_ID_SIZE);
+        data.append(reinterpret_cast<const char*>(base.data()), OBJECT_ID_SIZE);
+    }
+
+    std::string temp_path;
+    int fd = create_temp_content(pack_dir, temp_path);
+    try {
+        write_all(fd, data.data(), data.size());
+    } catch (const std::exception& e) {
+        close(fd);
+        unlink(temp_path.c_str());
+        throw;
+    }
+    close(fd);
+
+    if (rename(temp_path.c_str(), path.c_str()) != 0) {
+        unlink(temp_path.c_str());
+        throw std::runtime_error("Failed to save rejected deltas");
+    }
+}
+
+PlainContent::PlainContent(const std::string& content_root_dir, const RepackSource& source) : content(nullptr), content_size(0), mapped(false) {
+    int fd;
+
+    if (source.pack) {
+        PackedObject object = entry_at(source.pack, source.offset);
+        if (object.kind == PackEntryKind::STORED && !has_compressed_header(object.data, object.size)) {
+            content = object.data;
+            content_size = object.size;
+            return;
+        }
+
+        fd = create_plain_content(content_root_dir);
+        try {
+            write_packed_object(object, fd);
+        } catch (const std::exception& e) {
+            close(fd);
+            throw;
+        }
+    } else {
+        fd = open(source.loose_path.c_str(), O_RDONLY);
+        if (fd < 0)
+            throw std::runtime_error("Failed to read object " + source.loose_path);
+
+        try {
+            if (is_compressed_object(fd)) {
+                int plain_fd = create_plain_content(content_root_dir);
+                try {
+                    inflate_object(fd, plain_fd);
+                } catch (const std::exception& e) {
+                    close(plain_fd);
+                    throw;
+                }
+                close(fd);
+                fd = plain_fd;
+            }
+        } catch (const std::exception& e) {
+            close(fd);
+            throw;
+        }
+    }
+
+    map_content(fd);
+}
+
+PlainContent::~PlainContent() {
+    if (mapped)
+        munmap(const_cast<unsigned char*>(content), content_size);
+}
+
+void PlainContent::map_content(int fd) {
+    struct stat st;
+    if (fstat(fd, &st) != 0) {
+        close(fd);
+        throw std::runtime_error("Failed to read object for repacking");
+    }
+
+    if (st.st_size > 0) {
+        void* data = mmap(nullptr, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+        if (data == MAP_FAILED) {
+            close(fd);
+            throw std::runtime_error("Failed to map object for repacking");
+        }
+        content = static_cast<const unsigned char*>(data);
+        mapped = true;
+    }
+
+    content_size = st.st_size;
+    close(fd);
+}
+
+size_t repack(const std::string& content_root_dir, const std::map<std::string, std::string>& delta_bases) {
+    std::string pack_dir = content_root_dir + "/" + PACK_SUBDIR;
+    if (mkdir(pack_dir.c_str(), 0755) != 0 && errno != EEXIST)
+        throw std::runtime_error("Failed to create pack directory");
+
+    // Only one repack may rewrite the packs of a store at a time
+    int lock_fd = open((pack_dir + "/" + REPACK_LOCK_FILE).c_str(), O_RDWR | O_CREAT, 0644);
+    if (lock_fd < 0)
+        throw std::runtime_error("Failed to open repack lock");
+
+    try {
+        lock_file_with_timeout(lock_fd, LOCK_EX, get_lock_timeout_ms());
+    } catch (const std::exception& e) {
+        close(lock_fd);
+        throw;
+    }
+
+    std::vector<std::string> pack_paths;
+    std::vector<std::string> loose_paths;
+    std::string temp_pack_path, temp_idx_path;
+    size_t packed = 0;
+
+    try {
+        // Sorted by binary id, which is the order of the index
+        std::map<ObjectId, RepackSource> sources;
+
+        std::vector<std::shared_ptr<const Pack>> packs = load_packs(content_root_dir, true);
+        for (const auto& pack : packs) {
+            pack_paths.push_back(pack->path());
+            for (uint32_t i = 0; i < pack->size(); ++i) {
+                sources.emplace(ObjectId::from_bytes(pack->id_at(i)), RepackSource{"", pack, pack->offset_at(i)});
+            }
+        }
+
+        DIR* root = opendir(content_root_dir.c_str());
+        if (!root)
+            throw std::runtime_error("Failed to read objects directory");
+
+        struct dirent* sub_entry;
+        while ((sub_entry = readdir(root)) != nullptr) {
+            std::string sub_name = sub_entry->d_name;
+            if (sub_name.size() != 2 || !isxdigit(sub_name[0]) || !isxdigit(sub_name[1]))
+                continue;
+
+            std::string sub_dir = content_root_dir + "/" + sub_name;
+            DIR* sub = opendir(sub_dir.c_str());
+            if (!sub)
+                continue;
+
+            struct dirent* entry;
+            while ((entry = readdir(sub)) != nullptr) {
+                std::string name = entry->d_name;
+                ObjectId id;
+                if (name.compare(0, 2, sub_name) != 0 || !ObjectId::from_hex(name, id))
+                    continue;
+
+                std::string loose_path = sub_dir + "/" + name;
+                loose_paths.push_back(loose_path);
+                sources.emplace(id, RepackSource{loose_path, nullptr, 0});
+            }
+            closedir(sub);
+        }
+        closedir(root);
+
+        std::set<std::pair<ObjectId, ObjectId>> rejected = load_rejected_deltas(pack_dir);
+        std::map<ObjectId, ObjectId> planned_bases = plan_deltas(sources, delta_bases, rejected);
+
+        if (sources.empty() || (loose_paths.empty() && packs.size() <= 1 && planned_bases.empty())) {
+            flock(lock_fd, LOCK_UN);
+            close(lock_fd);
+            return 0;
+        }
+
+        int pack_fd = create_temp_content(pack_dir, temp_pack_path);
+        FILE* pack_file = fdopen(pack_fd, "wb");
+        if (!pack_file) {
+            close(pack_fd);
+            throw std::runtime_error("Failed to open pack for writing");
+        }
+
+        PackFile pack_out(pack_file);
+        std::string all_ids;
+        std::vector<uint64_t> offsets;
+        uint32_t fanout[FANOUT_SIZE] = {0};
+
+        try {
+            std::string header(PACK_MAGIC, sizeof(PACK_MAGIC));
+            append_le<uint32_t>(header, PACK_VERSION);
+            append_le<uint32_t>(header, sources.size());
+            pack_out.write(header.data(), header.size());
+
+            uint64_t offset = PACK_HEADER_SIZE;
+            std::vector<unsigned char> buffer(1 << 20);
+
+            // Stored bases of new deltas are rewritten uncompressed, deltas used as bases are kept as they are
+            std::set<ObjectId> raw_bases;
+            for (const auto& [target, base] : planned_bases) {
+                const RepackSource& source = sources.at(base);
+                if (!planned_bases.count(base) && !(source.pack && entry_at(source.pack, source.offset).kind == PackEntryKind::DELTA))
+                    raw_bases.insert(base);
+            }
+
+            for (const auto& [id, source] : sources) {
+                all_ids.append(reinterpret_cast<const char*>(id.data()), OBJECT_ID_SIZE);
+                offsets.push_back(offset);
+                fanout[id.bytes[0]]++;
+
+                auto planned = planned_bases.find(id);
+                if (planned != planned_bases.end()) {
+                    PlainContent target(content_root_dir, source);
+                    PlainContent base(content_root_dir, sources.at(planned->second));
+
+                    // A delta is only worth storing when it is much smaller than the object. Bases that
+                    // start like compressed objects are stored compressed, so they cannot be used
+                    std::string delta;
+                    if (!has_compressed_header(base.data(), base.size()) && create_delta(base.data(), base.size(), target.data(), target.size(), target.size() / 2, delta)) {
+                        std::string header(reinterpret_cast<const char*>(planned->second.data()), OBJECT_ID_SIZE);
+                        append_varint(header, target.size());
+
+                        uint64_t size = header.size() + delta.size();
+                        write_entry_header(pack_out, PackEntryKind::DELTA, size);
+                        pack_out.write(header.data(), header.size());
+                        pack_out.write(delta.data(), delta.size());
+                        offset += ENTRY_HEADER_SIZE + size;
+                        continue;
+                    }
+
+                    // Objects whose delta did not pay off may still be bases of other deltas. The pair is
+                    // remembered, so later repacks do not rewrite the pack to try it again
+                    rejected.emplace(id, planned->second);
+                    offset += write_stored(pack_out, content_root_dir, target.data(), target.size());
+                    continue;
+                }
+
+                if (raw_bases.count(id)) {
+                    PlainContent base(content_root_dir, source);
+                    offset += write_stored(pack_out, content_root_dir, base.data(), base.size());
+                    continue;
+                }
+
+                if (source.pack) {
+                    // Existing entries are copied verbatim, header included
+                    const unsigned char* entry = source.pack->data() + source.offset;
+                    uint64_t size = load_le<uint64_t>(entry + sizeof(uint8_t));
+                    pack_out.write(entry, ENTRY_HEADER_SIZE + size);
+                    offset += ENTRY_HEADER_SIZE + size;
+                    continue;
+                }
+
+                int loose_fd = open(source.loose_path.c_str(), O_RDONLY);
+                struct stat st;
+                if (loose_fd < 0 || fstat(loose_fd, &st) != 0) {
+                    if (loose_fd >= 0)
+                        close(loose_fd);
+                    throw std::runtime_error("Failed to read object " + source.loose_path);
+                }
+
+                uint64_t size = st.st_size;
+                write_entry_header(pack_out, PackEntryKind::STORED, size);
+
+                uint64_t copied = 0;
+                size_t bytes_read;
+                try {
+                    while (copied < size && (bytes_read = read_full(loose_fd, buffer.data(), std::min<uint64_t>(buffer.size(), size - copied))) > 0) {
+                        pack_out.write(buffer.data(), bytes_read);
+                        copied += bytes_read;
+                    }
+                } catch (const std::exception& e) {
+                    close(loose_fd);
+                    throw;
+                }
+                close(loose_fd);
+
+                if (copied != size)
+                    throw std::runtime_error("Object changed while repacking: " + source.loose_path);
+
+                offset += ENTRY_HEADER_SIZE + size;
+            }
+
+            if (fflush(pack_file) != 0)
+                throw std::runtime_error("Failed to write pack");
+        } catch (const std::exception& e) {
+            fclose(pack_file);
+            throw;
+        }
+        fclose(pack_file);
+
+        for (size_t i = 1; i < FANOUT_SIZE; ++i)
+            fanout[i] += fanout[i - 1];
+
+        int idx_fd = create_temp_content(pack_dir, temp_idx_path);
+        FILE* idx_file = fdopen(idx_fd, "wb");
+        if (!idx_file) {
+            close(idx_fd);
+            throw std::runtime_error("Failed to open pack index for writing");
+        }
+
+        try {
+            std::string header(IDX_MAGIC, sizeof(IDX_MAGIC));
+            append_le<uint32_t>(header, PACK_VERSION);
+            for (uint32_t total : fanout)
+                append_le<uint32_t>(header, total);
+            std::string offset_table;
+            for (uint64_t entry_offset : offsets)
+                append_le<uint64_t>(offset_table, entry_offset);
+
+            write_checked(idx_file, header.data(), header.size());
+            write_checked(idx_file, all_ids.data(), all_ids.size());
+            write_checked(idx_file, offset_table.data(), offset_table.size());
+
+            if (fflush(idx_file) != 0)
+                throw std::runtime_error("Failed to write pack index");
+        } catch (const std::exception& e) {
+            fclose(idx_file);
+            throw;
+        }
+        fclose(idx_file);
+
+        // Packs are named by their contents, so a live pack is never replaced in place. The pack
+        // is published before its index, since readers discover packs by their index
+        std::string base = pack_dir + "/pack-" + pack_out.hash();
+        if (access((base + ".idx").c_str(), F_OK) == 0) {
+            unlink(temp_pack_path.c_str());
+            unlink(temp_idx_path.c_str());
+        } else {
+            if (rename(temp_pack_path.c_str(), (base + ".pack").c_str()) != 0)
+                throw std::runtime_error("Failed to publish pack");
+            temp_pack_path.clear();
+            if (rename(temp_idx_path.c_str(), (base + ".idx").c_str()) != 0)
+                throw std::runtime_error("Failed to publish pack index");
+        }
+        temp_pack_path.clear();
+        temp_idx_path.clear();
+
+        for (auto it = rejected.begin(); it != rejected.end();) {
+            if (sources.count(it->first) && sources.count(it->second))
+                ++it;
+            else
+                it = rejected.erase(it);
+        }
+        save_rejected_deltas(pack_dir, rejected);
+
+        for (const auto& old_pack : pack_paths) {
+            if (old_pack == base + ".pack")
+                continue;
+            std::string old_base = old_pack.substr(0, old_pack.size() - 5);
+            unlink((old_base + ".idx").c_str());
+            unlink(old_pack.c_str());
+        }
+
+        for (const auto& loose_path : loose_paths) {
+            unlink(loose_path.c_str());
+            // Fails with ENOTEMPTY or ENOENT when the directory got newer objects or another repack
+            // removed it, which leaves nothing to do. A concurrent publish that loses its directory
+            // here creates it again
+            rmdir(loose_path.substr(0, loose_path.rfind('/')).c_str());
+        }
+
+        packed = sources.size();
+    } catch (const std::exception& e) {
+        if (!temp_pack_path.empty())
+            unlink(temp_pack_path.c_str());
+        if (!temp_idx_path.empty())
+            unlink(temp_idx_path.c_str());
+        flock(lock_fd, LOCK_UN);
+        close(lock_fd);
+        throw;
+    }
+
+    {
+        std::lock_guard<std::mutex> guard(pack_cache_mutex);
+        pack_cache.erase(pack_dir);
+    }
+
+    flock(lock_fd, LOCK_UN);
+    close(lock_fd);
+
+    return packed;
+}
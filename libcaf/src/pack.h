@@ -0,0 +1,64 @@
+#ifndef PACK_H
+#define PACK_H
+
+#include <map>
+#include <string>
+#include <vector>
+#include <memory>
+#include <cstddef>
+#include <cstdint>
+#include "object_id.h"
+
+#define PACK_SUBDIR "pack"
+#define MAX_DELTA_DEPTH 10
+
+// Kinds of entries stored in a pack file
+enum class PackEntryKind : uint8_t {
+    STORED = 0, // the bytes of the loose object, compressed or not
+    DELTA = 1   // base object id, result size and instructions rebuilding the object from the base
+};
+
+// A pack file and its sorted index, both memory-mapped for the lifetime of the object
+class Pack {
+public:
+    Pack(const std::string& pack_path, const std::string& idx_path);
+    ~Pack();
+
+    Pack(const Pack&) = delete;
+    Pack& operator=(const Pack&) = delete;
+
+    bool find(const unsigned char* id, uint64_t& offset) const;
+
+    uint32_t size() const { return count; }
+    const unsigned char* id_at(uint32_t index) const;
+    uint64_t offset_at(uint32_t index) const;
+    const unsigned char* data() const { return pack_data; }
+    size_t data_size() const { return pack_size; }
+    const std::string& path() const { return pack_path; }
+
+private:
+    std::string pack_path;
+    const unsigned char* pack_data;
+    size_t pack_size;
+    const unsigned char* idx_data;
+    size_t idx_size;
+    const unsigned char* fanout;
+    const unsigned char* ids;
+    const unsigned char* offsets;
+    uint32_t count;
+};
+
+// Location of an object inside a loaded pack
+struct PackedObject {
+    std::shared_ptr<const Pack> pack;
+    PackEntryKind kind;
+    const unsigned char* data;
+    uint64_t size;
+};
+
+bool find_packed_object(const std::string& content_root_dir, const std::string& content_hash, PackedObject& object, bool refresh = false);
+void write_packed_object(const PackedObject& object, int dest_fd);
+std::vector<std::string> list_packed_objects(const std::string& content_root_dir);
+size_t repack(const std::string& content_root_dir, const std::map<std::string, std::string>& delta_bases = {});
+
+#endif // PACK_H
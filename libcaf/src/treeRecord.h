@@ -2,6 +2,7 @@
 #define TREERECORD_H
 
 #include <string>
+#include "object_id.h"
 
 class TreeRecord {
 public:
@@ -14,10 +15,10 @@ public:
     };
     
     const Type type;         // tree or blob or commit
-    const std::string hash;  // unique identifier for the object
+    const ObjectId hash;     // unique identifier for the object
     const std::string name;  // name of the record
 
-    TreeRecord(Type type, std::string hash, std::string name)
+    TreeRecord(Type type, const ObjectId& hash, std::string name)
         : type(type), hash(hash), name(name) {}
 };
 
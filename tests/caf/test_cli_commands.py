@@ -170,6 +170,20 @@ class TestCLICommands:
         assert f"Message: {message}" in output
         assert "Hash: " in output
 
+    def test_commit_with_jobs(self, initialized_temp_repo, capsys):
+        for i in range(10):
+            (initialized_temp_repo / f"file{i}.txt").write_text(f"content {i}")
+
+        result = cli_commands.commit(
+            working_dir_path=initialized_temp_repo,
+            repo_dir=DEFAULT_REPO_DIR,
+            author="John Doe",
+            message="Parallel commit",
+            jobs=4
+        )
+        assert result == 0
+        assert "Commit created successfully:" in capsys.readouterr().out
+
     def test_commit_no_repository(self, temp_repo, capsys):
         temp_file = temp_repo / "test_file.txt"
         temp_file.write_text("Content of test_file")
@@ -259,6 +273,124 @@ class TestCLICommands:
         assert "First commit" in captured
         assert "Second commit" in captured
 
+    def test_repack_command(self, initialized_temp_repo, capsys):
+        temp_file = initialized_temp_repo / "repack_test.txt"
+        temp_file.write_text("Packed content")
+        cli_commands.commit(working_dir_path=initialized_temp_repo,
+                            repo_dir=DEFAULT_REPO_DIR,
+                            author="Repack Tester",
+                            message="Commit to pack")
+        capsys.readouterr()
+
+        result = cli_commands.repack(working_dir_path=initialized_temp_repo, repo_dir=DEFAULT_REPO_DIR)
+        assert result == 0
+        assert "Packed 3 objects." in capsys.readouterr().out
+
+        objects_dir = initialized_temp_repo / DEFAULT_REPO_DIR / OBJECTS_SUBDIR
+        assert list(objects_dir.glob("??/*")) == []
+
+        result = cli_commands.log(working_dir_path=initialized_temp_repo, repo_dir=DEFAULT_REPO_DIR)
+        assert result == 0
+        assert "Commit to pack" in capsys.readouterr().out
+
+    def test_fsck_command(self, initialized_temp_repo, capsys):
+        temp_file = initialized_temp_repo / "fsck_test.txt"
+        temp_file.write_text("Verified content")
+        cli_commands.commit(working_dir_path=initialized_temp_repo,
+                            repo_dir=DEFAULT_REPO_DIR,
+                            author="Fsck Tester",
+                            message="Commit to verify")
+        capsys.readouterr()
+
+        result = cli_commands.fsck(working_dir_path=initialized_temp_repo, repo_dir=DEFAULT_REPO_DIR)
+        assert result == 0
+        assert "All objects verified." in capsys.readouterr().out
+
+        blob_hash = hash_file(temp_file)
+        (initialized_temp_repo / DEFAULT_REPO_DIR / OBJECTS_SUBDIR / blob_hash[:2] / blob_hash).write_text("Tampered")
+
+        result = cli_commands.fsck(working_dir_path=initialized_temp_repo, repo_dir=DEFAULT_REPO_DIR)
+        assert result == -1
+        assert f"Corrupt object: {blob_hash}" in capsys.readouterr().err
+
+    def test_status_command(self, initialized_temp_repo, capsys):
+        temp_file = initialized_temp_repo / "status_test.txt"
+        temp_file.write_text("Committed content")
+        cli_commands.commit(working_dir_path=initialized_temp_repo,
+                            repo_dir=DEFAULT_REPO_DIR,
+                            author="Status Tester",
+                            message="Commit to compare")
+        capsys.readouterr()
+
+        result = cli_commands.status(working_dir_path=initialized_temp_repo, repo_dir=DEFAULT_REPO_DIR)
+        assert result == 0
+        assert "No changes detected in the working tree." in capsys.readouterr().out
+
+        temp_file.write_text("Changed content")
+        (initialized_temp_repo / "new.txt").write_text("New content")
+
+        result = cli_commands.status(working_dir_path=initialized_temp_repo, repo_dir=DEFAULT_REPO_DIR)
+        assert result == 0
+        output = capsys.readouterr().out
+        assert "Added: new.txt" in output
+        assert "Modified: status_test.txt" in output
+
+    def test_checkout_command(self, initialized_temp_repo, capsys):
+        temp_file = initialized_temp_repo / "checkout_test.txt"
+        temp_file.write_text("First version")
+        cli_commands.commit(working_dir_path=initialized_temp_repo, repo_dir=DEFAULT_REPO_DIR,
+                            author="Checkout Tester", message="First commit")
+        first_hash = capsys.readouterr().out.split("Hash: ")[1].split()[0]
+
+        temp_file.write_text("Second version")
+        cli_commands.commit(working_dir_path=initialized_temp_repo, repo_dir=DEFAULT_REPO_DIR,
+                            author="Checkout Tester", message="Second commit")
+        capsys.readouterr()
+
+        temp_file.write_text("Local change")
+        result = cli_commands.checkout(working_dir_path=initialized_temp_repo, repo_dir=DEFAULT_REPO_DIR,
+                                       commit=first_hash, jobs=0, force=False)
+        assert result == -1
+        assert "Local changes would be overwritten: checkout_test.txt" in capsys.readouterr().err
+        assert temp_file.read_text() == "Local change"
+
+        result = cli_commands.checkout(working_dir_path=initialized_temp_repo, repo_dir=DEFAULT_REPO_DIR,
+                                       commit=first_hash, jobs=0, force=True)
+        assert result == 0
+        assert f"HEAD is now at {first_hash}" in capsys.readouterr().out
+        assert temp_file.read_text() == "First version"
+
+    def test_sparse_command(self, initialized_temp_repo, capsys):
+        (initialized_temp_repo / "kept").mkdir()
+        (initialized_temp_repo / "kept" / "file.txt").write_text("Kept")
+        (initialized_temp_repo / "dropped").mkdir()
+        (initialized_temp_repo / "dropped" / "file.txt").write_text("Dropped")
+        cli_commands.commit(working_dir_path=initialized_temp_repo, repo_dir=DEFAULT_REPO_DIR,
+                            author="Sparse Tester", message="Commit to narrow")
+        capsys.readouterr()
+
+        result = cli_commands.sparse(working_dir_path=initialized_temp_repo, repo_dir=DEFAULT_REPO_DIR,
+                                     patterns=[], jobs=0, disable=False, force=False)
+        assert result == 0
+        assert "Sparse checkout is not enabled." in capsys.readouterr().out
+
+        result = cli_commands.sparse(working_dir_path=initialized_temp_repo, repo_dir=DEFAULT_REPO_DIR,
+                                     patterns=["kept"], jobs=0, disable=False, force=False)
+        assert result == 0
+        assert "Sparse checkout set to: kept" in capsys.readouterr().out
+        assert not (initialized_temp_repo / "dropped").exists()
+
+        result = cli_commands.sparse(working_dir_path=initialized_temp_repo, repo_dir=DEFAULT_REPO_DIR,
+                                     patterns=[], jobs=0, disable=True, force=False)
+        assert result == 0
+        assert "Sparse checkout disabled." in capsys.readouterr().out
+        assert (initialized_temp_repo / "dropped" / "file.txt").read_text() == "Dropped"
+
+    def test_fsmonitor_no_repo(self, temp_repo, capsys):
+        result = cli_commands.fsmonitor(working_dir_path=temp_repo, repo_dir=DEFAULT_REPO_DIR)
+        assert result == -1
+        assert "No repository found" in capsys.readouterr().err
+
     def test_log_no_repo(self, temp_repo, capsys):
         result = cli_commands.log(working_dir_path=temp_repo, repo_dir=DEFAULT_REPO_DIR)
         assert result == -1
@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from pytest import fixture
+
+from libcaf.constants import DEFAULT_REPO_DIR
+from libcaf.repository import Repository
+
+
+@fixture
+def repo(temp_repo) -> Repository:
+    repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+    repo.init()
+    return repo
+
+
+@fixture
+def write_files(temp_repo) -> callable:
+    def _write(files: dict[str, str]) -> None:
+        for path, content in files.items():
+            file = temp_repo / path
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_text(content)
+
+    return _write
+
+
+@fixture
+def working_files(temp_repo) -> callable:
+    def _working_files() -> dict[str, str]:
+        return {path.relative_to(temp_repo).as_posix(): path.read_text()
+                for path in Path(temp_repo).rglob('*')
+                if path.is_file() and DEFAULT_REPO_DIR.name not in path.parts}
+
+    return _working_files
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from libcaf.aio import AsyncRepository
+from libcaf.constants import DEFAULT_REPO_DIR
+from libcaf.repository import AddedFile, ModifiedFile, Repository, RepositoryError
+from pytest import raises
+
+
+def test_async_repository_operations(temp_repo):
+    async def scenario():
+        async with AsyncRepository(Repository(temp_repo, DEFAULT_REPO_DIR)) as repo:
+            await repo.init()
+
+            file = temp_repo / 'file.txt'
+            file.write_text('Version 1')
+            commit1 = await repo.create_commit('Tester', 'First commit')
+            file.write_text('Version 2')
+            commit2 = await repo.create_commit('Tester', 'Second commit')
+
+            history = [commit_hash async for commit_hash, _ in repo.get_commit_history()]
+            assert history == [commit2, commit1]
+
+            commit = await repo.load_commit(commit2)
+            assert commit.parent == commit1
+            assert 'file.txt' in (await repo.load_tree(commit.treeHash)).get_records()
+            assert [diff.record.name for diff in await repo.diff_commits(commit1, commit2)] == ['file.txt']
+
+            blob = await repo.save_file_content(file)
+            assert (await repo.load_tree(commit.treeHash)).get_records()["file.txt"].hash == blob.hash
+
+            assert await repo.status() == []
+            file.write_text('Version 3')
+            (temp_repo / 'new.txt').write_text('New')
+            assert {change.path: type(change) for change in await repo.status()} == \
+                {'file.txt': ModifiedFile, 'new.txt': AddedFile}
+
+    asyncio.run(scenario())
+
+
+def test_async_repository_errors(temp_repo):
+    async def scenario():
+        async with AsyncRepository(Repository(temp_repo, DEFAULT_REPO_DIR)) as repo:
+            with raises(RepositoryError):
+                await repo.create_commit('Tester', 'No repository')
+
+    asyncio.run(scenario())
+
+
+def test_event_loop_stays_responsive_during_large_commit(temp_repo):
+    for index in range(4):
+        (temp_repo / f'large{index}').write_bytes(bytes([index]) * (32 << 20))
+
+    async def scenario():
+        async with AsyncRepository(Repository(temp_repo, DEFAULT_REPO_DIR), max_concurrency=1) as repo:
+            await repo.init()
+            commit = asyncio.create_task(repo.create_commit('Tester', 'Large commit'))
+
+            gaps = []
+            while not commit.done():
+                start = time.monotonic()
+                await asyncio.sleep(0.005)
+                gaps.append(time.monotonic() - start)
+
+            await commit
+            return gaps
+
+    gaps = asyncio.run(scenario())
+
+    assert len(gaps) > 5
+    assert max(gaps) < 0.1
@@ -0,0 +1,103 @@
+import threading
+
+from libcaf import Blob, checkout_files, hash_file, hash_files, open_content_for_reading, save_files_content
+from pytest import mark
+
+
+def _write_files(tmp_path, count):
+    files = []
+    for index in range(count):
+        file = tmp_path / f'file{index}.txt'
+        file.write_text(f'content {index}\n' * (index + 1))
+        files.append(file)
+    return files
+
+
+@mark.parametrize('workers', [0, 1, 4])
+def test_hash_files(tmp_path, workers):
+    files = _write_files(tmp_path, 50)
+
+    assert hash_files(files, workers=workers) == [hash_file(file) for file in files]
+
+
+def test_hash_files_reports_errors_per_file(tmp_path):
+    files = _write_files(tmp_path, 3)
+    files.insert(1, tmp_path / 'missing.txt')
+
+    results = hash_files(files)
+
+    assert isinstance(results[1], ValueError)
+    assert 'missing.txt' in str(results[1])
+    assert results[0] == hash_file(files[0])
+    assert results[2:] == [hash_file(file) for file in files[2:]]
+
+
+def test_hash_files_empty():
+    assert hash_files([]) == []
+
+
+@mark.parametrize('workers', [0, 1, 4])
+def test_save_files_content(temp_repo, tmp_path, workers):
+    files = _write_files(tmp_path, 50)
+
+    blobs = save_files_content(temp_repo, files, workers=workers)
+
+    assert all(isinstance(blob, Blob) for blob in blobs)
+    for blob, file in zip(blobs, files):
+        assert blob.hash == hash_file(file)
+        with open_content_for_reading(temp_repo, blob.hash) as f:
+            assert f.read() == file.read_text()
+
+
+def test_save_files_content_reports_errors_per_file(temp_repo, tmp_path):
+    files = _write_files(tmp_path, 2) + [tmp_path / 'missing.txt']
+
+    results = save_files_content(temp_repo, files)
+
+    assert [type(result) for result in results] == [Blob, Blob, ValueError]
+
+
+
+@mark.parametrize('workers', [0, 1, 4])
+def test_checkout_files(temp_repo, tmp_path, workers):
+    files = _write_files(tmp_path, 20)
+    hashes = [blob.hash for blob in save_files_content(temp_repo, files)]
+    targets = [tmp_path / 'out' / file.name for file in files]
+    (tmp_path / 'out').mkdir()
+    targets[0].write_text('replaced')
+
+    assert checkout_files(temp_repo, hashes, targets, workers=workers) == [True] * len(files)
+    assert [target.read_text() for target in targets] == [file.read_text() for file in files]
+    assert sorted(path.name for path in (tmp_path / 'out').iterdir()) == sorted(file.name for file in files)
+
+
+def test_checkout_files_reports_errors_per_file(temp_repo, tmp_path):
+    files = _write_files(tmp_path, 2)
+    hashes = [blob.hash for blob in save_files_content(temp_repo, files)]
+
+    results = checkout_files(temp_repo, hashes + ['0' * 40], [tmp_path / 'a', tmp_path / 'b', tmp_path / 'c'])
+
+    assert results[:2] == [True, True]
+    assert isinstance(results[2], ValueError)
+    assert not (tmp_path / 'c').exists()
+
+def test_batches_run_without_the_gil(tmp_path):
+    large = tmp_path / 'large'
+    large.write_bytes(b'x' * (64 << 20))
+    ticks = []
+    done = threading.Event()
+
+    def tick():
+        while not done.is_set():
+            ticks.append(1)
+            done.wait(0.001)
+
+    ticker = threading.Thread(target=tick)
+    ticker.start()
+    try:
+        hash_files([large] * 4, workers=2)
+    finally:
+        done.set()
+        ticker.join()
+
+    assert len(ticks) > 10
@@ -0,0 +1,142 @@
+import os
+import time
+from pathlib import Path
+
+from pytest import raises
+
+from libcaf import load_commit, load_tree, walk
+from libcaf.constants import DEFAULT_REPO_DIR, IGNORE_FILE
+from libcaf.repository import Repository, RepositoryError
+
+
+def _backdate(repo: Repository) -> None:
+    # Old enough that no stat in the index is racy
+    past = (time.time_ns() - 10**10,) * 2
+    for path in repo.working_dir.rglob('*'):
+        if DEFAULT_REPO_DIR.name not in path.parts:
+            os.utime(path, ns=past)
+    os.utime(repo.working_dir, ns=past)
+
+
+class TestCheckout:
+    def test_checkout_restores_commit(self, repo, write_files, working_files):
+        first = {'kept.txt': 'kept', 'changed.txt': 'first', 'gone/deep/file.txt': 'gone', 'type': 'file'}
+        write_files(first)
+        first_hash = repo.create_commit('Tester', 'First commit')
+
+        (repo.working_dir / 'type').unlink()
+        write_files({'changed.txt': 'second', 'type/inner.txt': 'dir', 'new/file.txt': 'new'})
+        (repo.working_dir / 'gone' / 'deep' / 'file.txt').unlink()
+        (repo.working_dir / 'gone' / 'deep').rmdir()
+        (repo.working_dir / 'gone').rmdir()
+        second_hash = repo.create_commit('Tester', 'Second commit')
+        second = working_files()
+
+        write_files({'untracked.txt': 'untracked'})
+
+        repo.checkout(first_hash, workers=4)
+        assert working_files() == {**first, 'untracked.txt': 'untracked'}
+        assert not (repo.working_dir / 'new').exists()
+        assert repo.head_commit() == first_hash
+
+        repo.checkout(second_hash)
+        assert working_files() == {**second, 'untracked.txt': 'untracked'}
+        assert not (repo.working_dir / 'gone').exists()
+        assert [change.path for change in repo.status()] == ['untracked.txt']
+
+        (repo.working_dir / 'untracked.txt').unlink()
+        assert load_commit(repo.objects_dir(), repo.create_commit('Tester', 'Same tree')).treeHash == \
+            load_commit(repo.objects_dir(), second_hash).treeHash
+
+    def test_checkout_keeps_local_changes(self, repo, write_files, working_files):
+        write_files({'file.txt': 'first', 'other.txt': 'other'})
+        first_hash = repo.create_commit('Tester', 'First commit')
+        write_files({'file.txt': 'second'})
+        (repo.working_dir / 'other.txt').unlink()
+        second_hash = repo.create_commit('Tester', 'Second commit')
+
+        write_files({'file.txt': 'local'})
+        with raises(RepositoryError, match='Local changes would be overwritten: file.txt'):
+            repo.checkout(first_hash)
+
+        write_files({'file.txt': 'second', 'other.txt': 'untracked'})
+        with raises(RepositoryError, match='Untracked files would be overwritten: other.txt'):
+            repo.checkout(first_hash)
+        assert repo.head_commit() == second_hash
+        assert working_files() == {'file.txt': 'second', 'other.txt': 'untracked'}
+
+        repo.checkout(first_hash, force=True)
+        assert working_files() == {'file.txt': 'first', 'other.txt': 'other'}
+
+    def test_checkout_touches_only_differing_paths(self, repo, write_files, working_files, monkeypatch):
+        write_files({f'{d}/file{i}.txt': f'{d} {i}' for d in ('a', 'b', 'c') for i in range(3)})
+        first_hash = repo.create_commit('Tester', 'First commit')
+        write_files({'b/file0.txt': 'changed'})
+        second_hash = repo.create_commit('Tester', 'Second commit')
+
+        repo.checkout(first_hash)
+        _backdate(repo)
+        repo.create_commit('Tester', 'Index refresh')
+        inodes = {path: (repo.working_dir / path).stat().st_ino for path in working_files()}
+
+        opened = []
+        scandir = os.scandir
+        monkeypatch.setattr(walk.os, 'scandir', lambda path: opened.append(Path(path)) or scandir(path))
+        repo.checkout(second_hash)
+        monkeypatch.undo()
+
+        # Subtrees the index vouches for are never listed
+        assert sorted(set(opened)) == [repo.working_dir, repo.working_dir / 'b']
+        assert (repo.working_dir / 'b' / 'file0.txt').read_text() == 'changed'
+        assert [path for path, inode in inodes.items()
+                if (repo.working_dir / path).stat().st_ino != inode] == ['b/file0.txt']
+
+    def test_checkout_respects_ignored_files(self, repo, write_files, working_files):
+        write_files({'file.txt': 'first', 'build.log': 'tracked'})
+        first_hash = repo.create_commit('Tester', 'First commit')
+        write_files({'file.txt': 'second'})
+        second_hash = repo.create_commit('Tester', 'Second commit')
+        (repo.working_dir / 'build.log').unlink()
+        third_hash = repo.create_commit('Tester', 'Third commit')
+        write_files({IGNORE_FILE.name: '*.log\n'})
+
+        # An ignored local file the target tracks is not overwritten without force
+        write_files({'build.log': 'local'})
+        with raises(RepositoryError, match='Untracked files would be overwritten: build.log'):
+            repo.checkout(first_hash)
+        assert working_files()['build.log'] == 'local'
+
+        repo.checkout(second_hash, force=True)
+        _backdate(repo)
+        inode = (repo.working_dir / 'build.log').stat().st_ino
+
+        # Tracked files are compared like any other even when ignored, so they are not rewritten
+        repo.checkout(first_hash)
+        assert working_files() == {'file.txt': 'first', 'build.log': 'tracked', IGNORE_FILE.name: '*.log\n'}
+        assert (repo.working_dir / 'build.log').stat().st_ino == inode
+
+        write_files({'build.log': 'modified'})
+        with raises(RepositoryError, match='Local changes would be overwritten: build.log'):
+            repo.checkout(third_hash)
+
+        write_files({'build.log': 'tracked'})
+        repo.checkout(third_hash)
+        assert not (repo.working_dir / 'build.log').exists()
+
+    def test_checkout_keeps_untracked_files_in_replaced_directory(self, repo, write_files, working_files):
+        write_files({'a': 'file'})
+        first_hash = repo.create_commit('Tester', 'First commit')
+        (repo.working_dir / 'a').unlink()
+        write_files({'a/b': 'tracked'})
+        second_hash = repo.create_commit('Tester', 'Second commit')
+
+        # The target has a file where the working tree has a directory holding an untracked file
+        write_files({'a/x': 'untracked'})
+        with raises(RepositoryError, match='Untracked files would be overwritten: a/x'):
+            repo.checkout(first_hash)
+        assert repo.head_commit() == second_hash
+        assert working_files() == {'a/b': 'tracked', 'a/x': 'untracked'}
+
+        repo.checkout(first_hash, force=True)
+        assert working_files() == {'a': 'file'}
+        assert list(repo.status()) == []
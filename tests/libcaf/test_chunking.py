@@ -0,0 +1,121 @@
+import hashlib
+import random
+import struct
+
+from libcaf import (StoreConfig, content_exists, get_store_stats, hash_file, load_store_config, map_content,
+                    open_content_for_reading, repack, reset_store_stats, save_file_content, save_store_config,
+                    verify_content)
+from libcaf.constants import DEFAULT_REPO_DIR
+from libcaf.repository import Repository
+from pytest import fixture
+
+
+@fixture
+def chunked_repo(temp_repo):
+    save_store_config(temp_repo, StoreConfig(chunking=True))
+    return temp_repo
+
+
+def _large_content(size, seed=0):
+    return random.Random(seed).randbytes(size)
+
+
+def _stored_size(root):
+    return sum(path.stat().st_size for path in root.glob('??/*'))
+
+
+def test_store_config_chunking(temp_repo):
+    assert not load_store_config(temp_repo).chunking
+
+    save_store_config(temp_repo, StoreConfig(compression=True, chunking=True))
+    config = load_store_config(temp_repo)
+    assert config.chunking
+    assert config.compression
+
+
+def test_large_file_is_stored_as_chunks(chunked_repo, tmp_path):
+    content = _large_content(20 << 20)
+    file = tmp_path / 'large'
+    file.write_bytes(content)
+
+    blob = save_file_content(chunked_repo, file)
+
+    assert blob.hash == hash_file(file) == hashlib.sha1(content).hexdigest()
+    assert len(list(chunked_repo.glob('??/*'))) > 2
+    assert map_content(chunked_repo, blob.hash) == content
+
+
+def test_unchanged_chunks_are_shared_between_versions(chunked_repo, tmp_path):
+    content = bytearray(_large_content(20 << 20))
+    file = tmp_path / 'large'
+    file.write_bytes(content)
+    save_file_content(chunked_repo, file)
+    first_size = _stored_size(chunked_repo)
+
+    content[10 << 20] ^= 0xff
+    file.write_bytes(content)
+    reset_store_stats()
+    blob = save_file_content(chunked_repo, file)
+
+    assert get_store_stats().skipped_writes > 0
+    assert _stored_size(chunked_repo) - first_size < 10 << 20
+    assert map_content(chunked_repo, blob.hash) == content
+
+
+def test_small_files_are_not_chunked(chunked_repo, tmp_path):
+    file = tmp_path / 'small'
+    file.write_text('small file')
+
+    blob = save_file_content(chunked_repo, file)
+
+    assert list(chunked_repo.glob('??/*')) == [chunked_repo / blob.hash[:2] / blob.hash]
+
+
+def test_chunked_content_with_compression_and_packs(temp_repo, tmp_path):
+    save_store_config(temp_repo, StoreConfig(compression=True, chunking=True))
+    content = b'compressible line\n' * (1 << 20)
+    file = tmp_path / 'large'
+    file.write_bytes(content)
+
+    blob = save_file_content(temp_repo, file)
+    assert map_content(temp_repo, blob.hash) == content
+
+    repack(temp_repo)
+    assert content_exists(temp_repo, blob.hash)
+    assert map_content(temp_repo, blob.hash) == content
+
+
+def test_file_that_looks_like_a_chunk_list(temp_repo, tmp_path):
+    other = tmp_path / 'other'
+    other.write_bytes(b'other content')
+    other_blob = save_file_content(temp_repo, other)
+
+    # A well-formed chunk list pointing at another blob, saved as an ordinary file
+    content = (b'\x89CAFL\r\n\x1a' + struct.pack('<IQI', 1, 13, 1) +
+               bytes.fromhex(other_blob.hash) + struct.pack('<Q', 13))
+    file = tmp_path / 'imitation'
+    file.write_bytes(content)
+
+    blob = save_file_content(temp_repo, file)
+
+    assert map_content(temp_repo, blob.hash) == content
+    assert verify_content(temp_repo, blob.hash)
+
+
+def test_chunked_text_content(chunked_repo, tmp_path):
+    content = ''.join(f'line {i}\n' for i in range(2 << 20))
+    file = tmp_path / 'large.txt'
+    file.write_text(content)
+
+    blob = save_file_content(chunked_repo, file)
+
+    with open_content_for_reading(chunked_repo, blob.hash) as f:
+        assert f.read() == content
+
+
+def test_init_with_chunking(temp_repo):
+    repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+    repo.init(chunking=True)
+
+    assert load_store_config(repo.objects_dir()).chunking
+    assert not load_store_config(repo.objects_dir()).compression
@@ -0,0 +1,124 @@
+from libcaf import (Commit, StoreConfig, Tree, TreeRecord, TreeRecordType, hash_object, load_commit,
+                    load_store_config, load_tree, map_content, open_content_for_reading, open_content_for_saving,
+                    repack, save_commit, save_file_content, save_store_config, save_tree, verify_content)
+from libcaf.constants import DEFAULT_REPO_DIR
+from libcaf.repository import Repository
+from pytest import fixture
+
+COMPRESSED_MAGIC = b'\x89CAFZ\r\n\x1a'
+
+
+@fixture
+def compressed_store(temp_repo):
+    save_store_config(temp_repo, StoreConfig(compression=True))
+    return temp_repo
+
+
+def test_store_config_defaults_to_uncompressed(temp_repo):
+    assert not load_store_config(temp_repo).compression
+
+    save_store_config(temp_repo, StoreConfig(compression=True))
+    assert load_store_config(temp_repo).compression
+
+
+def test_save_file_content_compressed(compressed_store, tmp_path):
+    content = 'line of very repetitive text\n' * 10000
+    file = tmp_path / 'file.txt'
+    file.write_text(content)
+
+    blob = save_file_content(compressed_store, file)
+
+    stored = (compressed_store / blob.hash[:2] / blob.hash).read_bytes()
+    assert stored.startswith(COMPRESSED_MAGIC)
+    assert len(stored) < len(content) // 10
+
+    with open_content_for_reading(compressed_store, blob.hash) as f:
+        assert f.read() == content
+
+
+def test_large_file_compressed(compressed_store, tmp_path):
+    content = ''.join(f'{i}\n' for i in range(500000))
+    file = tmp_path / 'large.txt'
+    file.write_text(content)
+
+    blob = save_file_content(compressed_store, file)
+
+    with open_content_for_reading(compressed_store, blob.hash) as f:
+        assert f.read() == content
+
+
+def test_open_content_for_saving_compressed(compressed_store):
+    content = 'saved through a file object\n' * 100
+    content_hash = 'ab' + '0' * 38
+
+    with open_content_for_saving(compressed_store, content_hash) as f:
+        f.write(content)
+
+    assert (compressed_store / content_hash[:2] / content_hash).read_bytes().startswith(COMPRESSED_MAGIC)
+    with open_content_for_reading(compressed_store, content_hash) as f:
+        assert f.read() == content
+
+
+def test_save_load_tree_and_commit_compressed(compressed_store):
+    records = {
+        'a': TreeRecord(TreeRecordType.BLOB, 'a' * 40, 'a'),
+        'b': TreeRecord(TreeRecordType.TREE, 'b' * 40, 'b'),
+    }
+    tree = Tree(records)
+    tree_hash = hash_object(tree)
+    save_tree(compressed_store, tree)
+
+    commit = Commit(tree_hash, 'Author', 'Message', 1234567890, None)
+    commit_hash = hash_object(commit)
+    save_commit(compressed_store, commit)
+
+    assert (compressed_store / tree_hash[:2] / tree_hash).read_bytes().startswith(COMPRESSED_MAGIC)
+    assert load_tree(compressed_store, tree_hash).get_records() == records
+    assert load_commit(compressed_store, commit_hash).treeHash == tree_hash
+
+
+def test_uncompressed_objects_readable_after_enabling_compression(temp_repo, tmp_path):
+    file = tmp_path / 'file.txt'
+    file.write_text('stored before compression was enabled')
+    blob = save_file_content(temp_repo, file)
+
+    save_store_config(temp_repo, StoreConfig(compression=True))
+
+    with open_content_for_reading(temp_repo, blob.hash) as f:
+        assert f.read() == 'stored before compression was enabled'
+
+
+def test_uncompressed_content_starting_like_compressed_object(temp_repo, tmp_path):
+    large = COMPRESSED_MAGIC + b'large line\n' * 200000
+    contents = [COMPRESSED_MAGIC + b'small file', large, large + b'changed']
+    blobs = []
+    for index, content in enumerate(contents):
+        file = tmp_path / f'file{index}'
+        file.write_bytes(content)
+        blobs.append(save_file_content(temp_repo, file))
+
+    for blob, content in zip(blobs, contents):
+        assert map_content(temp_repo, blob.hash) == content
+        assert verify_content(temp_repo, blob.hash)
+
+    # The base of the planned delta starts like a compressed object too
+    repack(temp_repo, {blobs[2].hash: blobs[1].hash})
+    for blob, content in zip(blobs, contents):
+        assert map_content(temp_repo, blob.hash) == content
+        assert verify_content(temp_repo, blob.hash)
+
+
+def test_compressed_repository_commits(temp_repo):
+    repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+    repo.init(compress=True)
+
+    file = repo.working_dir / 'file.txt'
+    file.write_text('Version 1')
+    commit1 = repo.create_commit('Tester', 'First commit')
+
+    file.write_text('Version 2')
+    commit2 = repo.create_commit('Tester', 'Second commit')
+
+    assert load_store_config(repo.objects_dir()).compression
+    assert [commit_hash for commit_hash, _ in repo.get_commit_history()] == [commit2, commit1]
+    assert [diff.record.name for diff in repo.diff_commits(commit1, commit2)] == ['file.txt']
@@ -0,0 +1,62 @@
+import fcntl
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from libcaf import (Commit, Tree, TreeRecord, TreeRecordType, delete_content, hash_file, hash_object, load_commit,
+                    load_tree, open_content_for_reading, save_commit, save_file_content, save_tree)
+
+
+def _content(index):
+    return f'file {index}\n' * (index % 50 + 1)
+
+
+def _round_trip(root, tmp_path, index):
+    content = _content(index)
+    file = tmp_path / f'file{index}.txt'
+
+    blob = save_file_content(root, file)
+    assert blob.hash == hash_file(file) == hashlib.sha1(content.encode()).hexdigest()
+    with open_content_for_reading(root, blob.hash) as f:
+        assert f.read() == content
+
+    tree = Tree({file.name: TreeRecord(TreeRecordType.BLOB, blob.hash, file.name)})
+    save_tree(root, tree)
+    tree_hash = hash_object(tree)
+    assert load_tree(root, tree_hash).get_records()[file.name].hash == blob.hash
+
+    commit = Commit(tree_hash, 'Tester', f'Commit {index}', 1234567890 + index, None)
+    save_commit(root, commit)
+    assert load_commit(root, hash_object(commit)).treeHash == tree_hash
+
+    return blob.hash
+
+
+def test_bindings_are_thread_safe(temp_repo, tmp_path):
+    # Files are written up front, so threads only race on the store
+    for index in range(100):
+        (tmp_path / f'file{index}.txt').write_text(_content(index))
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        # Every index is saved by several threads at once
+        hashes = list(executor.map(lambda index: _round_trip(temp_repo, tmp_path, index % 100), range(400)))
+
+    assert len(set(hashes)) == 100
+    assert not list(temp_repo.glob('.tmp-*'))
+
+
+def test_waiting_for_a_lock_does_not_block_other_threads(temp_repo, tmp_path):
+    file = tmp_path / 'file.txt'
+    file.write_text('locked content')
+    blob = save_file_content(temp_repo, file)
+    saved_file = temp_repo / blob.hash[:2] / blob.hash
+
+    with open(saved_file) as locked:
+        fcntl.flock(locked, fcntl.LOCK_EX)
+        # Only runs if delete_content let go of the GIL while it waits for the lock
+        releaser = threading.Timer(0.05, fcntl.flock, (locked, fcntl.LOCK_UN))
+        releaser.start()
+        delete_content(temp_repo, blob.hash)
+        releaser.join()
+
+    assert not saved_file.exists()
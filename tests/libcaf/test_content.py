@@ -1,9 +1,11 @@
+import fcntl
 import hashlib
 import os
 import threading
 import time
-from libcaf import hash_file, delete_content, open_content_for_reading, save_file_content, open_content_for_saving
-from pytest import mark
+from libcaf import (StoreConfig, hash_file, delete_content, map_content, open_content_for_reading, repack,
+                    save_file_content, save_store_config, open_content_for_saving)
+from pytest import mark, raises
 
 
 @mark.parametrize("temp_content_length", [0, 1, 10, 100, 1000, 10000, 100000, 1000000])
@@ -27,6 +29,14 @@ class TestContent:
         saved_content = saved_file.read_text()
         assert saved_content == expected_content
 
+    def test_save_file_content_leaves_no_temp_files(self, temp_repo, temp_content):
+        file, _ = temp_content
+
+        blob = save_file_content(temp_repo, file)
+
+        assert [entry.name for entry in temp_repo.iterdir()] == [blob.hash[:2]]
+        assert [entry.name for entry in (temp_repo / blob.hash[:2]).iterdir()] == [blob.hash]
+
     def test_open_content_for_reading(self, temp_repo, temp_content):
         file, expected_content = temp_content
 
@@ -37,6 +47,28 @@ class TestContent:
 
         assert saved_content == expected_content
 
+    def test_map_content(self, temp_repo, temp_content):
+        file, expected_content = temp_content
+
+        blob = save_file_content(temp_repo, file)
+        view = map_content(temp_repo, blob.hash)
+
+        assert view.readonly
+        assert view == expected_content.encode('utf-8')
+        assert hashlib.sha1(view).hexdigest() == blob.hash
+
+    def test_map_binary_content(self, temp_repo, tmp_path, temp_content_length):
+        content = (bytes(range(256)) * (temp_content_length // 256 + 1))[:temp_content_length]
+        file = tmp_path / 'binary'
+        file.write_bytes(content)
+
+        blob = save_file_content(temp_repo, file)
+        view = map_content(temp_repo, blob.hash)
+
+        assert view == content
+        with raises(TypeError):
+            view[0] = 1
+
     def test_open_content_for_saving(self, temp_repo, temp_content):
         file, expected_content = temp_content
 
@@ -50,6 +82,32 @@ class TestContent:
 
         assert saved_content == expected_content
 
+    def test_open_content_for_saving_publishes_on_close(self, temp_repo, temp_content):
+        file, expected_content = temp_content
+        file_hash = hash_file(file)
+        saved_file = temp_repo / f"{file_hash[:2]}/{file_hash}"
+
+        with open_content_for_saving(temp_repo, file_hash) as f:
+            f.write(expected_content)
+            f.flush()
+            assert not saved_file.exists()
+
+        assert saved_file.read_text() == expected_content
+
+    def test_open_content_for_reading_ignores_locks(self, temp_repo, temp_content):
+        file, expected_content = temp_content
+
+        blob = save_file_content(temp_repo, file)
+        saved_file = temp_repo / f"{blob.hash[:2]}/{blob.hash}"
+
+        with open(saved_file) as locked:
+            fcntl.flock(locked, fcntl.LOCK_EX)
+
+            start = time.monotonic()
+            with open_content_for_reading(temp_repo, blob.hash) as f:
+                assert f.read() == expected_content
+            assert time.monotonic() - start < 1
+
     def test_save_and_delete_content(self, temp_repo, temp_content):
         file, _ = temp_content
 
@@ -121,4 +179,40 @@ class TestContent:
         delete_thread.join()
 
         saved_file_path = temp_repo / f"{blob.hash[:2]}/{blob.hash}"
-        assert not saved_file_path.exists()
\ No newline at end of file
+        assert not saved_file_path.exists()
+
+def test_map_compressed_and_packed_content(temp_repo, tmp_path):
+    save_store_config(temp_repo, StoreConfig(compression=True))
+    content = b'\x00\xff binary line\n' * 10000
+    file = tmp_path / 'binary'
+    file.write_bytes(content)
+
+    blob = save_file_content(temp_repo, file)
+    assert map_content(temp_repo, blob.hash) == content
+
+    repack(temp_repo)
+    assert map_content(temp_repo, blob.hash) == content
+
+
+def test_map_missing_content(temp_repo):
+    with raises(ValueError):
+        map_content(temp_repo, 'deadbeef' + '0' * 32)
+
+
+def test_save_large_file_content(temp_repo, tmp_path):
+    content = os.urandom(5 << 20)
+    file = tmp_path / 'large'
+    file.write_bytes(content)
+
+    blob = save_file_content(temp_repo, file)
+    saved_file = temp_repo / f"{blob.hash[:2]}/{blob.hash}"
+
+    assert blob.hash == hashlib.sha1(content).hexdigest()
+    assert saved_file.read_bytes() == content
+    assert [entry.name for entry in temp_repo.iterdir()] == [blob.hash[:2]]
+
+    # The object is a copy, so later changes to the file do not reach it
+    with open(file, 'r+b') as f:
+        f.write(b'changed')
+    assert saved_file.read_bytes() == content
+    assert not saved_file.samefile(file)
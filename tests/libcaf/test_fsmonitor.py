@@ -0,0 +1,111 @@
+import os
+import shutil
+import threading
+import time
+
+from pytest import fixture
+
+from libcaf import get_store_stats, load_commit, load_tree
+from libcaf.constants import DEFAULT_REPO_DIR, IGNORE_FILE
+from libcaf.fsmonitor import query_fsmonitor
+from libcaf.repository import Repository
+
+
+@fixture
+def repo(temp_repo) -> Repository:
+    repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+    repo.init()
+
+    for d in ('a', 'b', 'a/nested'):
+        (repo.working_dir / d).mkdir()
+        for f in range(5):
+            file = repo.working_dir / d / f'file{f}.txt'
+            file.write_text(f'{d} {f}')
+            # Old enough that the index never treats the files as racy
+            os.utime(file, ns=(time.time_ns() - 10**10,) * 2)
+
+    return repo
+
+
+@fixture
+def monitor(repo):
+    monitor = repo.fsmonitor()
+    stop = threading.Event()
+    thread = threading.Thread(target=monitor.serve, args=(stop,))
+    thread.start()
+
+    yield monitor
+
+    stop.set()
+    thread.join()
+    monitor.close()
+
+
+def _full_snapshot(repo: Repository) -> str:
+    repo.index_file().unlink()
+    return repo.save_directory_tree(repo.working_dir)
+
+
+def test_query_without_monitor(repo):
+    assert query_fsmonitor(repo.fsmonitor_socket(), '') is None
+
+
+def test_monitor_reports_changed_directories(repo, monitor):
+    token, changed = query_fsmonitor(repo.fsmonitor_socket(), '')
+    assert changed is None
+
+    (repo.working_dir / 'a' / 'nested' / 'file0.txt').write_text('changed')
+    (repo.working_dir / 'b' / 'new_dir').mkdir()
+
+    token, changed = query_fsmonitor(repo.fsmonitor_socket(), token)
+    assert sorted(changed) == ['a/nested', 'b', 'b/new_dir']
+
+    _, changed = query_fsmonitor(repo.fsmonitor_socket(), token)
+    assert changed == []
+
+    _, changed = query_fsmonitor(repo.fsmonitor_socket(), 'other-instance:0')
+    assert changed is None
+
+
+def test_commit_reuses_unchanged_subtrees(repo, monitor):
+    repo.create_commit('Author', 'First commit')
+
+    (repo.working_dir / 'b' / 'file0.txt').write_text('changed')
+
+    before = get_store_stats()
+    commit_hash = repo.create_commit('Author', 'Second commit')
+    after = get_store_stats()
+
+    # Only the changed blob, the trees of b and the root, and the commit itself are stored
+    assert after.written_objects - before.written_objects == 4
+    assert after.skipped_writes == before.skipped_writes
+    assert load_commit(repo.objects_dir(), commit_hash).treeHash == _full_snapshot(repo)
+
+
+def test_commit_sees_added_and_removed_directories(repo, monitor):
+    repo.create_commit('Author', 'First commit')
+
+    shutil.rmtree(repo.working_dir / 'a' / 'nested')
+    (repo.working_dir / 'c' / 'd').mkdir(parents=True)
+    (repo.working_dir / 'c' / 'd' / 'file.txt').write_text('new')
+    (repo.working_dir / 'b').rename(repo.working_dir / 'e')
+
+    commit_hash = repo.create_commit('Author', 'Second commit')
+    # Nothing changed since, so the whole tree is reused
+    unchanged_hash = repo.create_commit('Author', 'Third commit')
+
+    tree_hash = load_commit(repo.objects_dir(), commit_hash).treeHash
+    assert load_commit(repo.objects_dir(), unchanged_hash).treeHash == tree_hash
+    assert tree_hash == _full_snapshot(repo)
+
+
+def test_ignore_rule_changes_walk_the_whole_tree(repo, monitor):
+    repo.create_commit('Author', 'First commit')
+
+    (repo.working_dir / IGNORE_FILE).write_text('nested/\n')
+    commit_hash = repo.create_commit('Author', 'Second commit')
+
+    tree_hash = load_commit(repo.objects_dir(), commit_hash).treeHash
+    assert tree_hash == _full_snapshot(repo)
+    a_records = load_tree(repo.objects_dir(), load_tree(repo.objects_dir(), tree_hash).get_records()['a'].hash)
+    assert 'nested' not in a_records.get_records()
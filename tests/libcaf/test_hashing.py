@@ -1,6 +1,8 @@
 from pytest import raises
 
-from libcaf import Blob, Commit, Tree, TreeRecord, TreeRecordType, hash_object, hash_file
+import hashlib
+
+from libcaf import Blob, Commit, ObjectId, Tree, TreeRecord, TreeRecordType, hash_object, hash_file
 
 
 class TestHashing:
@@ -10,22 +12,22 @@ class TestHashing:
             hash_file("test_hash_file_non_existent_file.txt")
 
     def test_commit_hash(self):
-        commit = Commit("1234567890abcdef", "Author", "Initial commit", 1234567890,"3234567890abcdef")
+        commit = Commit("1234567890abcdef1234567890abcdef12345678", "Author", "Initial commit", 1234567890,"3234567890abcdef1234567890abcdef12345678")
         commit_hash = hash_object(commit)
 
         assert commit_hash is not None
         assert len(commit_hash) == 40
         
     def test_commit_hash_parent_none(self):
-        commit = Commit("1234567890abcdef", "Author", "Initial commit", 1234567890,None)
+        commit = Commit("1234567890abcdef1234567890abcdef12345678", "Author", "Initial commit", 1234567890,None)
         commit_hash = hash_object(commit)
 
         assert commit_hash is not None
         assert len(commit_hash) == 40
 
     def test_tree_hash(self):
-        record1 = TreeRecord(TreeRecordType.TREE, "1234567890abcdef", "record1")
-        record2 = TreeRecord(TreeRecordType.BLOB, "abcdef1234567890", "record2")
+        record1 = TreeRecord(TreeRecordType.TREE, "1234567890abcdef1234567890abcdef12345678", "record1")
+        record2 = TreeRecord(TreeRecordType.BLOB, "abcdef1234567890abcdef1234567890abcdef12", "record2")
 
         tree = Tree({"record1": record1, "record2": record2})
         tree_hash = hash_object(tree)
@@ -34,25 +36,25 @@ class TestHashing:
         assert len(tree_hash) == 40
 
     def test_same_blob_objects_get_same_hash(self):
-        blob1 = Blob("1234567890abcdef")
-        blob2 = Blob("1234567890abcdef")
+        blob1 = Blob("1234567890abcdef1234567890abcdef12345678")
+        blob2 = Blob("1234567890abcdef1234567890abcdef12345678")
 
         assert hash_object(blob1) == hash_object(blob2)
 
     def test_same_commit_objects_get_same_hash(self):
-        commit1 = Commit("1234567890abcdef", "Author", "Initial commit", 1234567890, "aaabb12")
-        commit2 = Commit("1234567890abcdef", "Author", "Initial commit", 1234567890,"aaabb12")
+        commit1 = Commit("1234567890abcdef1234567890abcdef12345678", "Author", "Initial commit", 1234567890, "aaabb12aaabb12aaabb12aaabb12aaabb12aaabb")
+        commit2 = Commit("1234567890abcdef1234567890abcdef12345678", "Author", "Initial commit", 1234567890,"aaabb12aaabb12aaabb12aaabb12aaabb12aaabb")
 
         assert hash_object(commit1) == hash_object(commit2)
 
     def test_same_commit_objects_get_same_hash_parent_none(self):
-        commit1 = Commit("1234567890abcdef", "Author", "Initial commit", 1234567890, None)
-        commit2 = Commit("1234567890abcdef", "Author", "Initial commit", 1234567890,None)
+        commit1 = Commit("1234567890abcdef1234567890abcdef12345678", "Author", "Initial commit", 1234567890, None)
+        commit2 = Commit("1234567890abcdef1234567890abcdef12345678", "Author", "Initial commit", 1234567890,None)
 
         assert hash_object(commit1) == hash_object(commit2)
     def test_same_tree_objects_get_same_hash(self):
-        record1 = TreeRecord(TreeRecordType.TREE, "1234567890abcdef", "record1")
-        record2 = TreeRecord(TreeRecordType.BLOB, "abcdef1234567890", "record2")
+        record1 = TreeRecord(TreeRecordType.TREE, "1234567890abcdef1234567890abcdef12345678", "record1")
+        record2 = TreeRecord(TreeRecordType.BLOB, "abcdef1234567890abcdef1234567890abcdef12", "record2")
 
         tree1 = Tree({"record1": record1, "record2": record2})
         tree2 = Tree({"record1": record1, "record2": record2})
@@ -60,15 +62,15 @@ class TestHashing:
         assert hash_object(tree1) == hash_object(tree2)
 
     def test_different_hashes_for_different_blobs(self):
-        blob1 = Blob("1234567890abcdef")
-        blob2 = Blob("abcdef1234567890")
+        blob1 = Blob("1234567890abcdef1234567890abcdef12345678")
+        blob2 = Blob("abcdef1234567890abcdef1234567890abcdef12")
 
         assert hash_object(blob1) != hash_object(blob2)
 
     def test_different_hashes_for_different_trees(self):
-        record1 = TreeRecord(TreeRecordType.TREE, "1234567890abcdef", "record1")
-        record2 = TreeRecord(TreeRecordType.BLOB, "abcdef1234567890", "record2")
-        record3 = TreeRecord(TreeRecordType.TREE, "fedcba0987654321", "record3")
+        record1 = TreeRecord(TreeRecordType.TREE, "1234567890abcdef1234567890abcdef12345678", "record1")
+        record2 = TreeRecord(TreeRecordType.BLOB, "abcdef1234567890abcdef1234567890abcdef12", "record2")
+        record3 = TreeRecord(TreeRecordType.TREE, "fedcba0987654321fedcba0987654321fedcba09", "record3")
 
         tree1 = Tree({"record1": record1, "record2": record2})
         tree2 = Tree({"record1": record1, "record2": record3})
@@ -76,14 +78,14 @@ class TestHashing:
         assert hash_object(tree1) != hash_object(tree2)
 
     def test_different_hashes_for_different_commits(self):
-        commit1 = Commit("1234567890abcdef", "Author1", "Initial commit", 1234567890,None)
-        commit2 = Commit("abcdef1234567890", "Author2", "Second commit", 1234567891,"2134567890abcdef")
+        commit1 = Commit("1234567890abcdef1234567890abcdef12345678", "Author1", "Initial commit", 1234567890,None)
+        commit2 = Commit("abcdef1234567890abcdef1234567890abcdef12", "Author2", "Second commit", 1234567891,"2134567890abcdef1234567890abcdef12345678")
 
         assert hash_object(commit1) != hash_object(commit2)
 
     def test_different_hashes_for_different_parent_commits(self):
-        commit1 = Commit("1234567890abcdef", "Author", "Commit message", 1234567890, "parenthash1")
-        commit2 = Commit("1234567890abcdef", "Author", "Commit message", 1234567890, "parenthash2")
+        commit1 = Commit("1234567890abcdef1234567890abcdef12345678", "Author", "Commit message", 1234567890, "1111111111111111111111111111111111111111")
+        commit2 = Commit("1234567890abcdef1234567890abcdef12345678", "Author", "Commit message", 1234567890, "2222222222222222222222222222222222222222")
 
         hash1 = hash_object(commit1)
         hash2 = hash_object(commit2)
@@ -92,12 +94,52 @@ class TestHashing:
         
     def test_different_hashes_for_different_parent_commits_one_none(self):
         # Create two commits that differ only by the parent hash
-        commit1 = Commit("1234567890abcdef", "Author", "Commit message", 1234567890, "parenthash1")
-        commit2 = Commit("1234567890abcdef", "Author", "Commit message", 1234567890, None)
+        commit1 = Commit("1234567890abcdef1234567890abcdef12345678", "Author", "Commit message", 1234567890, "1111111111111111111111111111111111111111")
+        commit2 = Commit("1234567890abcdef1234567890abcdef12345678", "Author", "Commit message", 1234567890, None)
 
         # Compute the hash for both commits
         hash1 = hash_object(commit1)
         hash2 = hash_object(commit2)
 
         # Verify the hashes are different
-        assert hash1 != hash2, "Hashes for commits with different parent hashes one none should not match"
\ No newline at end of file
+        assert hash1 != hash2, "Hashes for commits with different parent hashes one none should not match"
+
+    def test_object_id_round_trip(self, tmp_path):
+        file = tmp_path / 'file.txt'
+        file.write_bytes(bytes(range(256)))
+        file_hash = hash_file(file)
+
+        object_id = ObjectId(file_hash)
+
+        assert file_hash == hashlib.sha1(bytes(range(256))).hexdigest()
+        assert object_id.hex() == str(object_id) == file_hash
+        assert bytes(object_id) == bytes.fromhex(file_hash)
+        assert ObjectId.from_bytes(bytes(object_id)) == object_id
+
+    def test_object_id_as_dict_key(self):
+        ids = [ObjectId(hashlib.sha1(str(i).encode()).hexdigest()) for i in range(100)]
+        lookup = {object_id: index for index, object_id in enumerate(ids)}
+
+        for index, object_id in enumerate(ids):
+            assert lookup[ObjectId(object_id.hex())] == index
+        assert sorted(ids, key=bytes) == sorted(ids)
+
+    def test_invalid_object_ids(self):
+        for invalid in ['', '1234567890abcdef', 'g' * 40, 'A' * 40, '0' * 41]:
+            with raises(ValueError):
+                ObjectId(invalid)
+
+        with raises(ValueError):
+            ObjectId.from_bytes(b'short')
+
+    def test_objects_reject_invalid_ids(self):
+        valid = "1234567890abcdef1234567890abcdef12345678"
+        for invalid in ["", "1234567890abcdef", "g" * 40]:
+            with raises(ValueError):
+                Blob(invalid)
+            with raises(ValueError):
+                TreeRecord(TreeRecordType.BLOB, invalid, "record")
+            with raises(ValueError):
+                Commit(invalid, "Author", "Commit message", 1234567890, None)
+            with raises(ValueError):
+                Commit(valid, "Author", "Commit message", 1234567890, invalid)
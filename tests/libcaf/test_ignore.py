@@ -0,0 +1,94 @@
+import os
+from pathlib import Path
+
+from pytest import mark
+
+from libcaf import load_tree, walk
+from libcaf.constants import DEFAULT_REPO_DIR, IGNORE_FILE
+from libcaf.ignore import IgnoreMatcher
+from libcaf.repository import Repository
+
+PATTERNS = [
+    '# comment',
+    '',
+    'node_modules/',
+    '*.pyc',
+    '!keep.pyc',
+    '/build',
+    'docs/**/tmp',
+    'logs/**',
+    'a/b',
+    '[!x]y.txt',
+    'c[!x]d/e',
+    '\\#hash',
+]
+
+
+@mark.parametrize('path, is_dir, expected', [
+    ('node_modules', True, True),
+    ('src/node_modules', True, True),
+    ('node_modules', False, False),
+    ('module.pyc', False, True),
+    ('src/keep.pyc', False, False),
+    ('build', True, True),
+    ('src/build', True, False),
+    ('docs/tmp', True, True),
+    ('docs/a/b/tmp', False, True),
+    ('logs', True, False),
+    ('logs/today.log', False, True),
+    ('a/b', False, True),
+    ('c/a/b', False, False),
+    ('zy.txt', False, True),
+    ('xy.txt', False, False),
+    ('cyd/e', False, True),
+    ('c/d/e', False, False),
+    ('#hash', False, True),
+    ('# comment', False, False),
+    ('readme.md', False, False),
+])
+def test_ignore_patterns(path, is_dir, expected):
+    assert IgnoreMatcher(PATTERNS).matches(path, is_dir) == expected
+
+
+def test_empty_matcher_ignores_nothing(temp_repo):
+    matcher = IgnoreMatcher.from_file(temp_repo / IGNORE_FILE)
+    assert not matcher
+    assert matcher.source_hash == ''
+    assert not matcher.matches('anything', True)
+
+
+def test_ignore_file_that_is_not_utf8(temp_repo):
+    (temp_repo / IGNORE_FILE).write_bytes(b'\xff.log\n*.tmp\n')
+    matcher = IgnoreMatcher.from_file(temp_repo / IGNORE_FILE)
+
+    assert matcher.matches(os.fsdecode(b'\xff.log'), False)
+    assert matcher.matches('file.tmp', False)
+    assert not matcher.matches('file.log', False)
+
+
+def test_snapshot_prunes_ignored_paths(temp_repo, monkeypatch):
+    repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+    repo.init()
+
+    (repo.working_dir / IGNORE_FILE).write_text('node_modules/\n*.log\n')
+    (repo.working_dir / 'src' / 'node_modules' / 'pkg').mkdir(parents=True)
+    (repo.working_dir / 'src' / 'node_modules' / 'pkg' / 'index.js').write_text('ignored')
+    (repo.working_dir / 'src' / 'main.py').write_text('kept')
+    (repo.working_dir / 'src' / 'debug.log').write_text('ignored')
+
+    opened = []
+    scandir = os.scandir
+
+    def recording_scandir(path):
+        opened.append(Path(path))
+        return scandir(path)
+
+    monkeypatch.setattr(walk.os, 'scandir', recording_scandir)
+    tree_hash = repo.save_directory_tree(repo.working_dir)
+
+    # The ignored directory is never opened
+    assert opened == [repo.working_dir, repo.working_dir / 'src']
+
+    records = load_tree(repo.objects_dir(), tree_hash).get_records()
+    assert sorted(records) == ['.cafignore', 'src']
+    assert sorted(load_tree(repo.objects_dir(), records['src'].hash).get_records()) == ['main.py']
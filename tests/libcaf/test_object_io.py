@@ -1,8 +1,19 @@
-from libcaf import Commit, hash_object, load_commit, save_commit, load_tree, save_tree, Tree, TreeRecord, TreeRecordType
+import hashlib
+import struct
+
+from libcaf import Commit, hash_object, load_commit, save_commit, load_tree, save_tree, Tree, TreeRecord, TreeRecordType, \
+    list_objects, verify_content
+from libcaf.constants import DEFAULT_REPO_DIR
+from libcaf.repository import FsckReport, Repository
+from pytest import raises
+
+TREE_HASH = hashlib.sha1(b'tree').hexdigest()
+PARENT_HASH = hashlib.sha1(b'parent').hexdigest()
+BLOB_HASH = hashlib.sha1(b'blob').hexdigest()
 
 
 def test_save_load_commit(temp_repo):
-    commit = Commit("treehash123", "Author", "Commit message", 1234567890, "commithash123parent")
+    commit = Commit(TREE_HASH, "Author", "Commit message", 1234567890, PARENT_HASH)
     commit_hash = hash_object(commit)
 
     save_commit(temp_repo, commit)
@@ -15,7 +26,7 @@ def test_save_load_commit(temp_repo):
     assert loaded_commit.parent == commit.parent
     
 def test_save_load_commit_with_none_parent(temp_repo):
-    commit_none_parent = Commit("commithash456", "Author", "Commit message", 1234567890, None)
+    commit_none_parent = Commit(TREE_HASH, "Author", "Commit message", 1234567890, None)
     commit_none_parent_hash = hash_object(commit_none_parent)
 
     save_commit(temp_repo, commit_none_parent)
@@ -29,9 +40,9 @@ def test_save_load_commit_with_none_parent(temp_repo):
 
 def test_save_load_tree(temp_repo):
     records = {
-        "omer": TreeRecord(TreeRecordType.BLOB, "omer123", "omer"),
-        "bar": TreeRecord(TreeRecordType.BLOB, "bar123", "bar"),
-        "meshi": TreeRecord(TreeRecordType.BLOB, "meshi123", "meshi"),
+        "omer": TreeRecord(TreeRecordType.BLOB, hashlib.sha1(b'omer').hexdigest(), "omer"),
+        "bar": TreeRecord(TreeRecordType.BLOB, hashlib.sha1(b'bar').hexdigest(), "bar"),
+        "meshi": TreeRecord(TreeRecordType.BLOB, hashlib.sha1(b'meshi').hexdigest(), "meshi"),
     }
     tree = Tree(records)
     tree_hash = hash_object(tree)
@@ -44,9 +55,9 @@ def test_save_load_tree(temp_repo):
 
 def test_tree_creation_sorted():
     records = {
-        "omer": TreeRecord(TreeRecordType.BLOB, "omer123", "omer"),
-        "bar": TreeRecord(TreeRecordType.BLOB, "bar123", "bar"),
-        "meshi": TreeRecord(TreeRecordType.BLOB, "meshi123", "meshi"),
+        "omer": TreeRecord(TreeRecordType.BLOB, hashlib.sha1(b'omer').hexdigest(), "omer"),
+        "bar": TreeRecord(TreeRecordType.BLOB, hashlib.sha1(b'bar').hexdigest(), "bar"),
+        "meshi": TreeRecord(TreeRecordType.BLOB, hashlib.sha1(b'meshi').hexdigest(), "meshi"),
     }
     tree = Tree(records)
     sorted_keys = sorted(records.keys())
@@ -55,3 +66,131 @@ def test_tree_creation_sorted():
 
 
 
+
+
+def test_save_load_large_tree(temp_repo):
+    records = {f'file{i:05}': TreeRecord(TreeRecordType.BLOB, f'{i:040x}', f'file{i:05}') for i in range(10000)}
+    tree = Tree(records)
+
+    save_tree(temp_repo, tree)
+    loaded_records = load_tree(temp_repo, hash_object(tree)).get_records()
+
+    assert list(loaded_records) == sorted(records)
+    assert all(loaded_records[name].hash == record.hash for name, record in records.items())
+
+
+def test_load_truncated_objects(temp_repo):
+    commit = Commit(TREE_HASH, "Author", "Commit message", 1234567890, None)
+    tree = Tree({'file': TreeRecord(TreeRecordType.BLOB, BLOB_HASH, 'file')})
+    save_commit(temp_repo, commit)
+    save_tree(temp_repo, tree)
+
+    for object_hash, load in [(hash_object(commit), load_commit), (hash_object(tree), load_tree)]:
+        saved_file = temp_repo / object_hash[:2] / object_hash
+        saved_file.write_bytes(saved_file.read_bytes()[:-3])
+
+        with raises(RuntimeError):
+            load(temp_repo, object_hash)
+
+
+def test_object_id_is_hash_of_stored_bytes(temp_repo):
+    tree = Tree({'file': TreeRecord(TreeRecordType.BLOB, BLOB_HASH, 'file')})
+    commit = Commit(TREE_HASH, "Author", "Commit message", 1234567890, None)
+
+    for obj, save in [(tree, save_tree), (commit, save_commit)]:
+        object_hash = save(temp_repo, obj)
+        stored = (temp_repo / object_hash[:2] / object_hash).read_bytes()
+
+        assert object_hash == hash_object(obj) == hashlib.sha1(stored).hexdigest()
+        assert verify_content(temp_repo, object_hash)
+
+
+def test_commit_parent_is_an_id_or_none(temp_repo):
+    with raises(ValueError):
+        Commit(TREE_HASH, "Author", "Commit message", 1234567890, "")
+
+    without = Commit(TREE_HASH, "Author", "Commit message", 1234567890, None)
+    assert load_commit(temp_repo, save_commit(temp_repo, without)).parent is None
+
+
+def test_ids_are_stored_as_raw_bytes(temp_repo):
+    tree = Tree({'file': TreeRecord(TreeRecordType.BLOB, BLOB_HASH, 'file')})
+    commit = Commit(TREE_HASH, "Author", "Message", 1234567890, PARENT_HASH)
+
+    tree_hash = save_tree(temp_repo, tree)
+    stored_tree = (temp_repo / tree_hash[:2] / tree_hash).read_bytes()
+    assert stored_tree == (b'CAFT' + struct.pack('<BIB', 2, 1, int(TreeRecordType.BLOB)) + bytes.fromhex(BLOB_HASH) +
+                           struct.pack('<I', 4) + b'file')
+
+    commit_hash = save_commit(temp_repo, commit)
+    stored_commit = (temp_repo / commit_hash[:2] / commit_hash).read_bytes()
+    assert bytes.fromhex(TREE_HASH) in stored_commit and bytes.fromhex(PARENT_HASH) in stored_commit
+    assert TREE_HASH.encode() not in stored_commit
+
+
+def _length_prefixed(value):
+    return struct.pack('=I', len(value)) + value.encode()
+
+
+def test_load_objects_written_before_canonical_format(temp_repo):
+    legacy_tree = struct.pack('=I', 1) + struct.pack('=B', 1) + _length_prefixed(BLOB_HASH) + _length_prefixed('file')
+    legacy_commit = (_length_prefixed(TREE_HASH) + _length_prefixed('Author') + _length_prefixed('Message') +
+                     struct.pack('=Q', 1234567890) + _length_prefixed(PARENT_HASH))
+
+    for name, data in [('aa' * 20, legacy_tree), ('bb' * 20, legacy_commit)]:
+        (temp_repo / name[:2]).mkdir()
+        (temp_repo / name[:2] / name).write_bytes(data)
+
+    record = load_tree(temp_repo, 'aa' * 20).get_records()['file']
+    assert (record.type, record.hash) == (TreeRecordType.BLOB, BLOB_HASH)
+
+    commit = load_commit(temp_repo, 'bb' * 20)
+    assert (commit.treeHash, commit.message, commit.timestamp, commit.parent) == \
+        (TREE_HASH, 'Message', 1234567890, PARENT_HASH)
+
+
+def test_fsck_finds_corrupt_objects(temp_repo):
+    repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+    repo.init(compress=True)
+    (temp_repo / 'file.txt').write_text('content')
+    commit_hash = repo.create_commit('Tester', 'Commit')
+    repo.repack()
+    (temp_repo / 'other.txt').write_text('other')
+    repo.create_commit('Tester', 'Second commit')
+
+    assert len(list_objects(repo.objects_dir())) == 6
+    assert repo.fsck() == FsckReport()
+
+    # A packed tree and a loose commit are both checked against their names
+    tree_hash = load_commit(repo.objects_dir(), commit_hash).treeHash
+    assert tree_hash in list_objects(repo.objects_dir())
+
+    other_hash = hash_object(Commit(TREE_HASH, 'y', 'z', 1, None))
+    (repo.objects_dir() / other_hash[:2]).mkdir(exist_ok=True)
+    (repo.objects_dir() / other_hash[:2] / other_hash).write_bytes(b'not the commit')
+
+    assert repo.fsck() == FsckReport(corrupt=[other_hash])
+
+
+def test_fsck_reports_legacy_objects_separately(temp_repo):
+    repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+    repo.init()
+    (temp_repo / 'file.txt').write_text('content')
+    repo.create_commit('Tester', 'Commit')
+
+    # Legacy objects were named by a hash of their fields, not of their bytes
+    legacy_tree = struct.pack('=I', 1) + struct.pack('=B', 1) + _length_prefixed(BLOB_HASH) + _length_prefixed('file')
+    legacy_commit = (_length_prefixed(TREE_HASH) + _length_prefixed('Author') + _length_prefixed('Message') +
+                     struct.pack('=Q', 1234567890) + _length_prefixed(''))
+    tree_hash = hashlib.sha1(f'file1{BLOB_HASH}'.encode()).hexdigest()
+    commit_hash = hashlib.sha1(f'{TREE_HASH}AuthorMessage1234567890'.encode()).hexdigest()
+    corrupt_hash = hashlib.sha1(b'other').hexdigest()
+
+    for name, data in [(tree_hash, legacy_tree), (commit_hash, legacy_commit), (corrupt_hash, legacy_tree)]:
+        (repo.objects_dir() / name[:2]).mkdir(exist_ok=True)
+        (repo.objects_dir() / name[:2] / name).write_bytes(data)
+
+    assert load_commit(repo.objects_dir(), commit_hash).treeHash == TREE_HASH
+    report = repo.fsck()
+    assert sorted(report.legacy) == sorted([tree_hash, commit_hash])
+    assert report.corrupt == [corrupt_hash]
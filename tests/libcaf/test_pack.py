@@ -0,0 +1,256 @@
+import hashlib
+import os
+import random
+import struct
+
+from libcaf import (Commit, StoreConfig, content_exists, delete_content, hash_object, load_commit, load_tree,
+                    open_content_for_reading, repack, save_commit, save_file_content, save_store_config)
+from libcaf.constants import DEFAULT_REPO_DIR
+from libcaf.repository import Repository
+from pytest import raises
+
+
+def _loose_objects(root):
+    return [path for path in root.glob('??/*')]
+
+
+def _save_files(root, tmp_path, contents):
+    blobs = []
+    for index, content in enumerate(contents):
+        file = tmp_path / f'file{index}.txt'
+        file.write_text(content)
+        blobs.append(save_file_content(root, file))
+    return blobs
+
+
+def test_repack_moves_loose_objects_into_pack(temp_repo, tmp_path):
+    contents = [f'content {i}' for i in range(50)]
+    blobs = _save_files(temp_repo, tmp_path, contents)
+
+    assert repack(temp_repo) == 50
+    assert _loose_objects(temp_repo) == []
+    assert len(list((temp_repo / 'pack').glob('pack-*.pack'))) == 1
+    assert len(list((temp_repo / 'pack').glob('pack-*.idx'))) == 1
+
+    for blob, content in zip(blobs, contents):
+        assert content_exists(temp_repo, blob.hash)
+        with open_content_for_reading(temp_repo, blob.hash) as f:
+            assert f.read() == content
+
+
+def test_repack_with_nothing_to_do(temp_repo, tmp_path):
+    assert repack(temp_repo) == 0
+
+    _save_files(temp_repo, tmp_path, ['only object'])
+    assert repack(temp_repo) == 1
+    assert repack(temp_repo) == 0
+
+
+def test_repack_names_packs_by_their_contents(temp_repo, tmp_path):
+    _save_files(temp_repo, tmp_path, ['first', 'second'])
+    repack(temp_repo)
+
+    pack, = (temp_repo / 'pack').glob('pack-*.pack')
+    assert pack.stem == f'pack-{hashlib.sha1(pack.read_bytes()).hexdigest()}'
+    assert pack.with_suffix('.idx').exists()
+
+
+def test_pack_and_index_are_little_endian(temp_repo, tmp_path):
+    contents = ['first', 'second', 'third']
+    _save_files(temp_repo, tmp_path, contents)
+    repack(temp_repo)
+
+    pack, = (temp_repo / 'pack').glob('pack-*.pack')
+    data = pack.read_bytes()
+    assert data[:12] == b'CPCK' + struct.pack('<II', 1, 3)
+
+    index = pack.with_suffix('.idx').read_bytes()
+    assert index[:8] == b'CIDX' + struct.pack('<I', 1)
+    fanout = struct.unpack('<256I', index[8:8 + 256 * 4])
+    assert fanout[-1] == 3
+    offsets = struct.unpack('<3Q', index[-3 * 8:])
+    assert offsets[0] == 12
+    # Each stored entry is a kind byte and a little-endian size ahead of the object
+    sizes = sorted(struct.unpack('<Q', data[offset + 1:offset + 9])[0] for offset in offsets)
+    assert sizes == sorted(len(content) for content in contents)
+
+def test_repack_does_not_retry_rejected_deltas(temp_repo, tmp_path):
+    rng = random.Random(0)
+    contents = [''.join(rng.choice('abcdefghij') for _ in range(10000)) for _ in range(3)]
+    blobs = _save_files(temp_repo, tmp_path, contents)
+    bases = {blobs[0].hash: blobs[1].hash, blobs[1].hash: blobs[2].hash}
+
+    assert repack(temp_repo, bases) == 3
+    packs = sorted((temp_repo / 'pack').glob('pack-*'))
+
+    # Unrelated contents make no useful deltas, so an unchanged store stays as it is
+    assert repack(temp_repo, bases) == 0
+    assert sorted((temp_repo / 'pack').glob('pack-*')) == packs
+
+    # A base that was not tried before is still planned
+    assert repack(temp_repo, {blobs[0].hash: blobs[2].hash}) == 3
+
+
+def test_repack_merges_packs_and_new_loose_objects(temp_repo, tmp_path):
+    (tmp_path / 'first').mkdir()
+    first = _save_files(temp_repo, tmp_path / 'first', ['first'])
+    repack(temp_repo)
+
+    (tmp_path / 'second').mkdir()
+    second = _save_files(temp_repo, tmp_path / 'second', ['second', 'third'])
+    assert repack(temp_repo) == 3
+    assert len(list((temp_repo / 'pack').glob('pack-*.pack'))) == 1
+
+    for blob, content in zip(first + second, ['first', 'second', 'third']):
+        with open_content_for_reading(temp_repo, blob.hash) as f:
+            assert f.read() == content
+
+
+def test_saving_packed_content_is_skipped(temp_repo, tmp_path):
+    blob, = _save_files(temp_repo, tmp_path, ['packed content'])
+    repack(temp_repo)
+
+    save_file_content(temp_repo, tmp_path / 'file0.txt')
+    assert _loose_objects(temp_repo) == []
+
+    delete_content(temp_repo, blob.hash)
+    assert content_exists(temp_repo, blob.hash)
+
+
+def test_missing_object_with_packs(temp_repo, tmp_path):
+    _save_files(temp_repo, tmp_path, ['packed content'])
+    repack(temp_repo)
+
+    with raises(ValueError):
+        open_content_for_reading(temp_repo, 'deadbeef' + '0' * 32)
+
+
+def test_repack_compressed_objects(temp_repo, tmp_path):
+    save_store_config(temp_repo, StoreConfig(compression=True))
+    content = 'compressible line\n' * 1000
+    blob, = _save_files(temp_repo, tmp_path, [content])
+
+    repack(temp_repo)
+
+    with open_content_for_reading(temp_repo, blob.hash) as f:
+        assert f.read() == content
+
+
+def test_repository_reads_trees_and_commits_from_packs(temp_repo):
+    repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+    repo.init()
+
+    (repo.working_dir / 'dir').mkdir()
+    (repo.working_dir / 'dir' / 'file.txt').write_text('Version 1')
+    commit1 = repo.create_commit('Tester', 'First commit')
+    (repo.working_dir / 'dir' / 'file.txt').write_text('Version 2')
+    commit2 = repo.create_commit('Tester', 'Second commit')
+
+    assert repo.repack() > 0
+    assert _loose_objects(repo.objects_dir()) == []
+
+    commit = load_commit(repo.objects_dir(), commit2)
+    assert commit.parent == commit1
+    assert 'dir' in load_tree(repo.objects_dir(), commit.treeHash).get_records()
+    assert [hash_value for hash_value, _ in repo.get_commit_history()] == [commit2, commit1]
+    assert [diff.record.name for diff in repo.diff_commits(commit1, commit2)] == ['dir']
+
+    # New objects are written loose next to the pack
+    commit = Commit(commit.treeHash, 'Tester', 'Third commit', 1234567890, commit2)
+    save_commit(repo.objects_dir(), commit)
+    assert load_commit(repo.objects_dir(), hash_object(commit)).parent == commit2
+
+
+def _versions(count):
+    lines = [f'line {i}: {"abcdefghij" * 5}\n' for i in range(2000)]
+    versions = []
+    for version in range(count):
+        lines[version * 37 % len(lines)] = f'changed in version {version}\n'
+        versions.append(''.join(lines))
+    return versions
+
+
+def _pack_size(root):
+    return sum(path.stat().st_size for path in (root / 'pack').glob('pack-*.pack'))
+
+
+def test_repack_deltifies_similar_versions(temp_repo, tmp_path):
+    contents = _versions(5)
+    blobs = _save_files(temp_repo, tmp_path, contents)
+    bases = {older.hash: newer.hash for older, newer in zip(blobs, blobs[1:])}
+
+    assert repack(temp_repo, bases) == 5
+    assert _pack_size(temp_repo) < 2 * len(contents[0])
+
+    for blob, content in zip(blobs, contents):
+        with open_content_for_reading(temp_repo, blob.hash) as f:
+            assert f.read() == content
+
+
+def test_repack_deltifies_compressed_objects(temp_repo, tmp_path):
+    save_store_config(temp_repo, StoreConfig(compression=True))
+    contents = _versions(3)
+    blobs = _save_files(temp_repo, tmp_path, contents)
+
+    repack(temp_repo)
+    assert repack(temp_repo, {blobs[0].hash: blobs[2].hash, blobs[1].hash: blobs[2].hash}) == 3
+    assert _pack_size(temp_repo) < 2 * len(contents[0])
+
+    for blob, content in zip(blobs, contents):
+        with open_content_for_reading(temp_repo, blob.hash) as f:
+            assert f.read() == content
+
+
+def test_packed_objects_are_rebuilt_on_disk(temp_repo, tmp_path):
+    save_store_config(temp_repo, StoreConfig(compression=True))
+    contents = _versions(2)
+    blobs = _save_files(temp_repo, tmp_path, contents)
+    repack(temp_repo, {blobs[0].hash: blobs[1].hash})
+
+    # Deltas and compressed entries are resolved into unnamed files in the store, not into memory
+    for blob in blobs:
+        with open_content_for_reading(temp_repo, blob.hash) as f:
+            assert os.readlink(f'/proc/self/fd/{f.fileno()}').startswith(f'{temp_repo}/')
+
+
+def test_repack_bounds_delta_chains(temp_repo, tmp_path):
+    contents = _versions(15)
+    blobs = _save_files(temp_repo, tmp_path, contents)
+    bases = {older.hash: newer.hash for older, newer in zip(blobs, blobs[1:])}
+    # A cycle is never accepted
+    bases[blobs[-1].hash] = blobs[0].hash
+
+    repack(temp_repo, bases)
+    repack(temp_repo, {blobs[0].hash: blobs[1].hash})
+
+    for blob, content in zip(blobs, contents):
+        with open_content_for_reading(temp_repo, blob.hash) as f:
+            assert f.read() == content
+
+
+def test_repack_ignores_unknown_delta_bases(temp_repo, tmp_path):
+    blob, = _save_files(temp_repo, tmp_path, ['only object'])
+
+    assert repack(temp_repo, {blob.hash: 'deadbeef' + '0' * 32, 'not a hash': blob.hash}) == 1
+
+    with open_content_for_reading(temp_repo, blob.hash) as f:
+        assert f.read() == 'only object'
+
+
+def test_repository_repack_deltifies_file_history(temp_repo):
+    repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+    repo.init()
+
+    contents = _versions(4)
+    for index, content in enumerate(contents):
+        (repo.working_dir / 'file.txt').write_text(content)
+        repo.create_commit('Tester', f'Commit {index}')
+
+    assert repo.repack() > 0
+    assert repo.repack() == 0
+    assert _pack_size(repo.objects_dir()) < 2 * len(contents[0])
+
+    for (_, commit), content in zip(repo.get_commit_history(), reversed(contents)):
+        record = load_tree(repo.objects_dir(), commit.treeHash).get_records()['file.txt']
+        with open_content_for_reading(repo.objects_dir(), record.hash) as f:
+            assert f.read() == content
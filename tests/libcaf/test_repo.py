@@ -1,11 +1,27 @@
+import fcntl
+import os
+import subprocess
+import sys
 import threading
 import time
+from pathlib import Path
 
 from pytest import mark, raises
-from libcaf import hash_file, delete_content, open_content_for_reading, save_file_content, load_commit, hash_object
+from libcaf import hash_file, delete_content, open_content_for_reading, save_file_content, load_commit, hash_object, \
+    content_exists, get_store_stats, get_lock_timeout_ms, set_lock_timeout_ms, load_tree
+from libcaf import walk
+from libcaf.index import Index
 from libcaf.constants import DEFAULT_REPO_DIR
 from libcaf.repository import Repository
 
+LOCK_HOLDER = """
+import fcntl, sys, time
+with open(sys.argv[1]) as f:
+    fcntl.flock(f, fcntl.LOCK_EX)
+    print('locked', flush=True)
+    time.sleep(float(sys.argv[2]))
+"""
+
 class TestRepo:
     def test_open_non_existent_file(self, temp_repo):
         non_existent_hash = "deadbeef" + "0" * 32
@@ -17,6 +33,143 @@ class TestRepo:
         non_existent_hash = "deadbeef" + "0" * 32
         delete_content(temp_repo, non_existent_hash)
 
+    @mark.parametrize("temp_content_length", [100])
+    def test_contended_lock_is_acquired_without_polling_delay(self, temp_repo, temp_content):
+        file, _ = temp_content
+        blob = save_file_content(temp_repo, file)
+        saved_file = temp_repo / f"{blob.hash[:2]}/{blob.hash}"
+
+        holder = subprocess.Popen([sys.executable, '-c', LOCK_HOLDER, str(saved_file), '0.05'],
+                                  stdout=subprocess.PIPE, text=True)
+        assert holder.stdout.readline().strip() == 'locked'
+
+        before = get_store_stats()
+        start = time.monotonic()
+        delete_content(temp_repo, blob.hash)
+        elapsed = time.monotonic() - start
+        after = get_store_stats()
+        holder.wait()
+
+        assert elapsed < 0.5
+        assert not saved_file.exists()
+        assert after.lock_waits - before.lock_waits == 1
+        assert after.lock_wait_ns - before.lock_wait_ns > 0
+
+    @mark.parametrize("temp_content_length", [100])
+    def test_lock_timeout_is_configurable(self, temp_repo, temp_content):
+        file, _ = temp_content
+        blob = save_file_content(temp_repo, file)
+        saved_file = temp_repo / f"{blob.hash[:2]}/{blob.hash}"
+
+        previous_timeout = get_lock_timeout_ms()
+        set_lock_timeout_ms(100)
+        try:
+            with open(saved_file) as locked:
+                fcntl.flock(locked, fcntl.LOCK_EX)
+
+                start = time.monotonic()
+                with raises(ValueError):
+                    delete_content(temp_repo, blob.hash)
+                assert time.monotonic() - start < 1
+        finally:
+            set_lock_timeout_ms(previous_timeout)
+
+        assert saved_file.exists()
+
+    @mark.parametrize("temp_content_length", [10, 2000000])
+    def test_save_existing_content_is_skipped(self, temp_repo, temp_content):
+        file, _ = temp_content
+
+        blob = save_file_content(temp_repo, file)
+        assert content_exists(temp_repo, blob.hash)
+
+        before = get_store_stats()
+        assert save_file_content(temp_repo, file).hash == blob.hash
+        after = get_store_stats()
+
+        assert after.skipped_writes - before.skipped_writes == 1
+        assert after.written_objects == before.written_objects
+
+    def test_unchanged_commit_skips_existing_objects(self, temp_repo):
+        repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+        repo.init()
+
+        (repo.working_dir / "file.txt").write_text("unchanged")
+        repo.create_commit("Author", "First commit")
+        # Without the stat cache the blob is hashed again and found in the store
+        repo.index_file().unlink()
+
+        before = get_store_stats()
+        repo.create_commit("Author", "Second commit")
+        after = get_store_stats()
+
+        # Only the new commit object is written, the blob and the tree already exist
+        assert after.written_objects - before.written_objects == 1
+        assert after.skipped_writes - before.skipped_writes == 2
+
+    def test_unchanged_files_are_not_rehashed(self, temp_repo):
+        repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+        repo.init()
+
+        file = repo.working_dir / "file.txt"
+        file.write_text("unchanged")
+        os.utime(file, ns=(time.time_ns() - 10**10,) * 2)
+        first_commit = load_commit(repo.objects_dir(), repo.create_commit("Author", "First commit"))
+        # A new directory mtime forces the directory to be listed again
+        os.utime(repo.working_dir)
+
+        before = get_store_stats()
+        second_commit = load_commit(repo.objects_dir(), repo.create_commit("Author", "Second commit"))
+        after = get_store_stats()
+
+        # The blob hash comes from the index, only the tree is looked up in the store
+        assert second_commit.treeHash == first_commit.treeHash
+        assert after.skipped_writes - before.skipped_writes == 1
+
+    def test_modified_files_are_rehashed(self, temp_repo):
+        repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+        repo.init()
+
+        file = repo.working_dir / "file.txt"
+        file.write_text("first")
+        first_commit = load_commit(repo.objects_dir(), repo.create_commit("Author", "First commit"))
+
+        file.write_text("other")
+        second_commit = load_commit(repo.objects_dir(), repo.create_commit("Author", "Second commit"))
+
+        assert second_commit.treeHash != first_commit.treeHash
+        assert load_tree(repo.objects_dir(), second_commit.treeHash).get_records()["file.txt"].hash == \
+            hash_file(file)
+
+    def test_racy_index_entries_are_not_trusted(self, temp_repo):
+        file = temp_repo / "file.txt"
+        file.write_text("content")
+        st = os.stat(file)
+
+        index = Index(timestamp_ns=st.st_mtime_ns)
+        index.record("file.txt", st, "0" * 40)
+        assert index.lookup("file.txt", st) is None
+
+        index.timestamp_ns = st.st_mtime_ns + 1
+        assert index.lookup("file.txt", st) == "0" * 40
+
+    def test_index_round_trip(self, temp_repo):
+        file = temp_repo / "file.txt"
+        file.write_text("content")
+        st = os.stat(file)
+
+        index = Index(timestamp_ns=st.st_mtime_ns + 1)
+        index.record("dir/file.txt", st, hash_file(file))
+        index.save(temp_repo / "index")
+
+        loaded = Index.load(temp_repo / "index")
+        assert loaded.entries == index.entries
+        assert loaded.timestamp_ns == index.timestamp_ns
+
+        (temp_repo / "index").write_bytes(b"CAFI garbage")
+        assert Index.load(temp_repo / "index").entries == {}
+        assert Index.load(temp_repo / "missing").entries == {}
+
     @mark.parametrize("temp_content_length", [1, 10, 100, 1000, 10000, 100000, 1000000])
     def test_multi_file_lock_contention(self, temp_repo, temp_content_file_factory):
         temp_content_file1, _ = temp_content_file_factory()
@@ -131,6 +284,111 @@ class TestRepo:
 
         assert (objects_dir / tree_hash[:2] / tree_hash).exists()
 
+    def test_save_directory_tree_saves_each_file_once(self, temp_repo):
+        repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+        repo.init()
+
+        for i in range(10):
+            (repo.working_dir / f"file{i}.txt").write_text(f"content {i}")
+        for d in range(5):
+            sub_dir = repo.working_dir / f"dir{d}"
+            sub_dir.mkdir()
+            (sub_dir / "file.txt").write_text(f"nested {d}")
+
+        before = get_store_stats()
+        repo.save_directory_tree(repo.working_dir)
+        after = get_store_stats()
+
+        # 15 blobs and 6 trees, none of them offered to the store twice
+        assert after.written_objects - before.written_objects == 21
+        assert after.skipped_writes == before.skipped_writes
+
+    @mark.parametrize("workers", [1, 4])
+    def test_unchanged_subtrees_are_reused(self, temp_repo, workers, monkeypatch):
+        repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+        repo.init()
+
+        for package in ("a", "b", "c"):
+            for sub_dir in ("x", "y"):
+                (repo.working_dir / package / sub_dir).mkdir(parents=True)
+                (repo.working_dir / package / sub_dir / "file.txt").write_text(f"{package} {sub_dir}")
+        # Old enough that no stat in the index is racy
+        past = (time.time_ns() - 10**10,) * 2
+        for path in sorted(repo.working_dir.rglob("*"), reverse=True):
+            if DEFAULT_REPO_DIR.name not in path.parts:
+                os.utime(path, ns=past)
+        os.utime(repo.working_dir, ns=past)
+        repo.create_commit("Author", "First commit")
+
+        (repo.working_dir / "b" / "x" / "file.txt").write_text("changed")
+        (repo.working_dir / "c" / "new.txt").write_text("new")
+
+        opened = []
+        scandir = os.scandir
+        monkeypatch.setattr(walk.os, "scandir", lambda path: opened.append(Path(path)) or scandir(path))
+        before = get_store_stats()
+        tree_hash = repo.save_directory_tree(repo.working_dir, workers)
+        after = get_store_stats()
+        monkeypatch.undo()
+
+        # Only the changed directories and their ancestors are listed and stored again
+        assert sorted(opened) == [repo.working_dir, repo.working_dir / "b", repo.working_dir / "b" / "x",
+                                  repo.working_dir / "c"]
+        assert after.written_objects - before.written_objects == 6
+        assert after.skipped_writes == before.skipped_writes
+
+        repo.index_file().unlink()
+        assert repo.save_directory_tree(repo.working_dir) == tree_hash
+
+    def test_subdirectory_snapshot_does_not_hide_changes_from_commit(self, temp_repo):
+        repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+        repo.init()
+
+        for package in ("pkg0", "pkg1"):
+            (repo.working_dir / package / "sub").mkdir(parents=True)
+            (repo.working_dir / package / "sub" / "f.txt").write_text(package)
+        # Old enough that no stat in the index is racy
+        past = (time.time_ns() - 10**10,) * 2
+        for path in sorted(repo.working_dir.rglob("*"), reverse=True):
+            if DEFAULT_REPO_DIR.name not in path.parts:
+                os.utime(path, ns=past)
+        os.utime(repo.working_dir, ns=past)
+        repo.create_commit("Author", "First commit")
+
+        # Edited in place, so no directory stat changes, and long enough ago not to be racy
+        (repo.working_dir / "pkg0" / "sub" / "f.txt").write_text("changed")
+        os.utime(repo.working_dir / "pkg0" / "sub" / "f.txt", ns=(past[0] + 10**9,) * 2)
+        repo.save_directory_tree(repo.working_dir / "pkg0")
+
+        commit = load_commit(repo.objects_dir(), repo.create_commit("Author", "Second commit"))
+        pkg0 = load_tree(repo.objects_dir(), commit.treeHash).get_records()["pkg0"]
+        sub = load_tree(repo.objects_dir(), pkg0.hash).get_records()["sub"]
+        assert load_tree(repo.objects_dir(), sub.hash).get_records()["f.txt"].hash == hash_file(
+            repo.working_dir / "pkg0" / "sub" / "f.txt")
+        assert list(repo.status()) == []
+
+    @mark.parametrize("workers", [0, 4])
+    def test_parallel_save_directory_tree_matches_serial(self, temp_repo, workers):
+        repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+        repo.init()
+
+        for d in range(5):
+            sub_dir = repo.working_dir / f"dir{d}" / "nested"
+            sub_dir.mkdir(parents=True)
+            (sub_dir.parent / "top.txt").write_text(f"top {d}")
+            for f in range(20):
+                (sub_dir / f"file{f}.txt").write_text(f"content {d} {f}")
+        (repo.working_dir / "empty_dir").mkdir()
+
+        serial_hash = repo.save_directory_tree(repo.working_dir)
+        repo.index_file().unlink()
+        parallel_hash = repo.save_directory_tree(repo.working_dir, workers)
+        # A second parallel run takes every blob hash from the index
+        cached_hash = repo.save_directory_tree(repo.working_dir, workers)
+
+        assert parallel_hash == serial_hash
+        assert cached_hash == serial_hash
+
     def test_get_commit_history(self, temp_repo):
         repo = Repository(temp_repo, DEFAULT_REPO_DIR)
         repo.init()
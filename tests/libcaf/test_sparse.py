@@ -0,0 +1,144 @@
+import os
+import shutil
+from pathlib import Path
+
+from pytest import fixture, mark, raises
+
+from libcaf import load_commit, load_tree, walk
+from libcaf.repository import Repository, RepositoryError
+from libcaf.sparse import SparseCone
+
+FILES = {
+    'top.txt': 'top',
+    'a/file.txt': 'a',
+    'b/file.txt': 'b',
+    'b/deep/file.txt': 'deep',
+    'b/other/file.txt': 'other',
+    'c/nested/file.txt': 'c',
+}
+
+
+@mark.parametrize('path, contains, includes_dir', [
+    ('', False, True),
+    ('b', False, True),
+    ('b/deep', True, True),
+    ('b/deep/more', True, True),
+    ('b/other', False, False),
+    ('a', False, False),
+    ('bb', False, False),
+])
+def test_cone(path, contains, includes_dir):
+    cone = SparseCone(['# comment', '/b/deep/', ''])
+
+    assert cone.directories == {'b/deep'}
+    assert cone.contains(path) == contains
+    assert cone.includes_dir(path) == includes_dir
+
+
+def test_empty_cone_wants_everything():
+    cone = SparseCone()
+
+    assert not cone
+    assert cone.source_hash == ''
+    assert cone.contains('any/path') and cone.includes_file('any/path/file.txt')
+
+
+@fixture
+def repo(repo, write_files) -> Repository:
+    write_files(FILES)
+    repo.create_commit('Tester', 'Initial commit')
+    return repo
+
+
+def _tree_files(repo: Repository, tree_hash: str, prefix: str = '') -> dict[str, str]:
+    files = {}
+    for name, record in load_tree(repo.objects_dir(), tree_hash).get_records().items():
+        if record.type == record.type.TREE:
+            files.update(_tree_files(repo, record.hash, f'{prefix}{name}/'))
+        else:
+            files[prefix + name] = record.hash
+    return files
+
+
+def _head_files(repo: Repository) -> dict[str, str]:
+    return _tree_files(repo, load_commit(repo.objects_dir(), repo.head_commit()).treeHash)
+
+
+class TestSparse:
+    def test_set_sparse_patterns(self, repo, write_files, working_files):
+        write_files({'a/untracked.txt': 'untracked'})
+
+        repo.set_sparse_patterns(['b/deep'])
+        assert repo.sparse_patterns() == ['b/deep']
+        assert working_files() == {'top.txt': 'top', 'b/file.txt': 'b', 'b/deep/file.txt': 'deep',
+                                        'a/untracked.txt': 'untracked'}
+        assert not (repo.working_dir / 'c').exists()
+        # Untracked files outside the cone are left alone and not reported
+        assert list(repo.status()) == []
+
+        repo.set_sparse_patterns(['c'])
+        assert working_files() == {'top.txt': 'top', 'c/nested/file.txt': 'c', 'a/untracked.txt': 'untracked'}
+        assert not (repo.working_dir / 'b').exists()
+
+        repo.set_sparse_patterns([])
+        assert repo.sparse_patterns() == []
+        assert not repo.sparse_file().exists()
+        assert working_files() == {**FILES, 'a/untracked.txt': 'untracked'}
+
+    def test_set_sparse_patterns_keeps_local_changes(self, repo, write_files, working_files):
+        write_files({'a/file.txt': 'local'})
+        with raises(RepositoryError, match='Local changes would be overwritten: a/file.txt'):
+            repo.set_sparse_patterns(['b'])
+        assert repo.sparse_patterns() == []
+
+        repo.set_sparse_patterns(['b'], force=True)
+        assert not (repo.working_dir / 'a').exists()
+
+        write_files({'a/file.txt': 'untracked'})
+        with raises(RepositoryError, match='Untracked files would be overwritten: a/file.txt'):
+            repo.set_sparse_patterns([])
+        assert repo.sparse_patterns() == ['b']
+
+    def test_sparse_commit_carries_out_of_cone_subtrees(self, repo, write_files, working_files, monkeypatch):
+        repo.set_sparse_patterns(['b/deep'])
+        before = _head_files(repo)
+
+        write_files({'b/deep/file.txt': 'changed', 'b/deep/new.txt': 'new'})
+        opened = []
+        scandir = os.scandir
+        monkeypatch.setattr(walk.os, 'scandir', lambda path: opened.append(Path(path)) or scandir(path))
+        repo.create_commit('Tester', 'Sparse commit')
+        monkeypatch.undo()
+
+        # Directories outside the cone are never opened, yet the commit keeps them
+        assert sorted(set(opened)) == [repo.working_dir, repo.working_dir / 'b', repo.working_dir / 'b' / 'deep']
+        after = _head_files(repo)
+        assert sorted(set(after) - set(before)) == ['b/deep/new.txt']
+        assert [path for path in before if after[path] != before[path]] == ['b/deep/file.txt']
+
+        # An ancestor of the cone removed from disk keeps only what lies outside the cone
+        shutil.rmtree(repo.working_dir / 'b')
+        repo.create_commit('Tester', 'Removed b')
+        assert sorted(_head_files(repo)) == ['a/file.txt', 'b/other/file.txt', 'c/nested/file.txt', 'top.txt']
+
+    def test_sparse_checkout(self, repo, write_files, working_files, monkeypatch):
+        first_hash = repo.head_commit()
+        write_files({'a/file.txt': 'a changed', 'b/deep/file.txt': 'deep changed'})
+        second_hash = repo.create_commit('Tester', 'Second commit')
+
+        repo.set_sparse_patterns(['b/deep'])
+        repo.checkout(first_hash)
+        assert working_files() == {'top.txt': 'top', 'b/file.txt': 'b', 'b/deep/file.txt': 'deep'}
+
+        opened = []
+        scandir = os.scandir
+        monkeypatch.setattr(walk.os, 'scandir', lambda path: opened.append(Path(path)) or scandir(path))
+        repo.checkout(second_hash)
+        monkeypatch.undo()
+
+        assert sorted(set(opened)) == [repo.working_dir, repo.working_dir / 'b', repo.working_dir / 'b' / 'deep']
+        assert working_files() == {'top.txt': 'top', 'b/file.txt': 'b', 'b/deep/file.txt': 'deep changed'}
+        assert list(repo.status()) == []
+
+        repo.set_sparse_patterns([])
+        assert working_files()['a/file.txt'] == 'a changed'
@@ -0,0 +1,92 @@
+import os
+import shutil
+import time
+from pathlib import Path
+
+from libcaf import walk
+from libcaf.constants import DEFAULT_REPO_DIR, IGNORE_FILE
+from libcaf.repository import AddedFile, ModifiedFile, RemovedFile, Repository
+
+
+def _objects(repo: Repository) -> list[Path]:
+    return sorted(repo.objects_dir().rglob('*'))
+
+
+class TestStatus:
+    def test_status_without_commits(self, temp_repo):
+        repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+        repo.init()
+
+        (repo.working_dir / "dir").mkdir()
+        (repo.working_dir / "dir" / "file.txt").write_text("content")
+        (repo.working_dir / "top.txt").write_text("content")
+
+        assert list(repo.status()) == [AddedFile("top.txt"), AddedFile("dir/file.txt")]
+
+    def test_clean_working_tree(self, temp_repo):
+        repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+        repo.init()
+
+        (repo.working_dir / "file.txt").write_text("content")
+        repo.create_commit("Tester", "Initial commit")
+
+        assert list(repo.status()) == []
+
+    def test_status_reports_changes_without_writing_objects(self, temp_repo):
+        repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+        repo.init()
+
+        for name in ("kept", "modified", "removed", "replaced"):
+            (repo.working_dir / name).mkdir()
+            (repo.working_dir / name / "file.txt").write_text(name)
+        (repo.working_dir / "file_to_dir").write_text("file")
+        repo.create_commit("Tester", "Initial commit")
+
+        (repo.working_dir / "modified" / "file.txt").write_text("changed")
+        (repo.working_dir / "modified" / "new.txt").write_text("new")
+        shutil.rmtree(repo.working_dir / "removed")
+        shutil.rmtree(repo.working_dir / "replaced")
+        (repo.working_dir / "replaced").write_text("now a file")
+        (repo.working_dir / "file_to_dir").unlink()
+        (repo.working_dir / "file_to_dir").mkdir()
+        (repo.working_dir / "file_to_dir" / "inner.txt").write_text("inner")
+        (repo.working_dir / IGNORE_FILE).write_text("kept/\n")
+        objects = _objects(repo)
+
+        assert list(repo.status()) == [
+            AddedFile(".cafignore"),
+            RemovedFile("file_to_dir"),
+            RemovedFile("replaced/file.txt"),
+            AddedFile("replaced"),
+            RemovedFile("kept/file.txt"),
+            RemovedFile("removed/file.txt"),
+            AddedFile("file_to_dir/inner.txt"),
+            ModifiedFile("modified/file.txt"),
+            AddedFile("modified/new.txt"),
+        ]
+        assert _objects(repo) == objects
+
+    def test_status_skips_unchanged_subtrees(self, temp_repo, monkeypatch):
+        repo = Repository(temp_repo, DEFAULT_REPO_DIR)
+        repo.init()
+
+        for name in ("a", "b"):
+            (repo.working_dir / name).mkdir()
+            (repo.working_dir / name / "file.txt").write_text(name)
+        # Old enough that no stat in the index is racy
+        past = (time.time_ns() - 10**10,) * 2
+        for path in [repo.working_dir / "a" / "file.txt", repo.working_dir / "b" / "file.txt",
+                     repo.working_dir / "a", repo.working_dir / "b", repo.working_dir]:
+            os.utime(path, ns=past)
+        repo.create_commit("Tester", "Initial commit")
+
+        (repo.working_dir / "b" / "file.txt").write_text("changed")
+
+        opened = []
+        scandir = os.scandir
+        monkeypatch.setattr(walk.os, "scandir", lambda path: opened.append(Path(path)) or scandir(path))
+        changes = list(repo.status())
+        monkeypatch.undo()
+
+        assert changes == [ModifiedFile("b/file.txt")]
+        assert sorted(opened) == [repo.working_dir, repo.working_dir / "b"]